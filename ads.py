@@ -5,13 +5,48 @@ from tkinter import ttk
 from PIL import ImageTk, Image, ImageEnhance, ImageFilter
 from tkinter import filedialog
 import os
+from constants import PREVIEW_REDUCE
+from image_loader import open_reduced
+from preview_scheduler import PreviewScheduler
+from recipe import Recipe, execute
 
 # function to display this image
 # and updating the panel widget to show this image
 def displayimage(img):
+    # reuse the current PhotoImage when the size and mode match,
+    # this avoids creating a new Tk image for every frame
+    current = getattr(panel, 'image', None)
+    if current is not None and panel.image_key == (img.size, img.mode):
+        current.paste(img)
+        return
     dispimage = ImageTk.PhotoImage(img)
     panel.configure(image=dispimage)
     panel.image = dispimage
+    panel.image_key = (img.size, img.mode)
+
+# reduced copy of img for the slider previews
+# it is rebuilt only when img itself changes
+preview_cache = [None, None]
+
+def preview_source():
+    if preview_cache[0] is not img:
+        source = img if img.mode in ('RGB', 'RGBA', 'L') else img.convert('RGB')
+        preview_cache[0] = img
+        preview_cache[1] = source.reduce(PREVIEW_REDUCE)
+    return preview_cache[1]
+
+# cheap preview shown while a slider is dragged
+# the reduced copy goes through the planned recipe and is scaled back up
+def preview_enhance(brightness=1.0, contrast=1.0, color=1.0, sharpness=1.0):
+    source = preview_source()
+    recipe = Recipe.adjustments(brightness, contrast, color, sharpness, source.mode)
+    result = execute(recipe, source)
+    displayimage(result.resize(img.size, Image.BILINEAR))
+# the image changed, so the exact slider results on screen are stale
+def image_changed():
+    for scheduler in schedulers:
+        scheduler.invalidate()
+
 # function for brightness slider
 #this function adjusts the brightness of an image
 #and updates outputImage
@@ -55,12 +90,14 @@ def color_callback(Color_pos):
 def rotate():
     global img
     img = img.rotate(90)
+    image_changed()
     displayimage(img)
 # Function to flip the image
 #displays the image using the 'displayimage' function
 def flip():
     global img
     img = img.transpose((Image.FLIP_LEFT_RIGHT))
+    image_changed()
     displayimage(img)
 
 # function to Blur the image 
@@ -70,6 +107,7 @@ def flip():
 def blurr():
     global img
     img = img.filter(ImageFilter.BLUR)
+    image_changed()
     displayimage(img)
 
 # function to emboss the image
@@ -79,6 +117,7 @@ def blurr():
 def emboss():
     global img
     img = img.filter(ImageFilter.EMBOSS)
+    image_changed()
     displayimage(img)
 
 # this function enhances the edges of the image using a filter
@@ -86,6 +125,7 @@ def emboss():
 def edgeEnhance():
     global img
     img = img.filter(ImageFilter.FIND_EDGES)
+    image_changed()
     displayimage(img)
 
 # function to resize the button
@@ -93,12 +133,14 @@ def edgeEnhance():
 def resize():
     global img
     img = img.resize((200, 300))
+    image_changed()
     displayimage(img)
 # updates the img variable 
 #displays the image using the 'displayimage' function
 def crop():
     global img
     img = img.crop((100, 100, 400, 400))
+    image_changed()
     displayimage(img)
 
 # function to reset the button
@@ -113,8 +155,10 @@ def ChangeImg():
     global img
     imgname = filedialog.askopenfilename(title="Change Image")
     if imgname:
-        img = Image.open(imgname)
+        # decode directly at reduced size, the full image is never needed here
+        img = open_reduced(imgname, (600, 600))
         img = img.resize((600, 600))
+        image_changed()
         displayimage(img)
 # function to save the image
 # this function allows user to save the currently displayed image
@@ -148,8 +192,20 @@ mains.title(f"{space}Image Editor")
 mains.configure(bg='#323946')
 
 
+# slider previews are limited to one render per frame
+# the exact callback runs when the slider is released
+schedulers = []
+brightness_scheduler = PreviewScheduler(
+    mains, lambda pos: preview_enhance(brightness=float(pos)), brightness_callback, group=schedulers)
+contrast_scheduler = PreviewScheduler(
+    mains, lambda pos: preview_enhance(contrast=float(pos)), contrast_callback, group=schedulers)
+sharpness_scheduler = PreviewScheduler(
+    mains, lambda pos: preview_enhance(sharpness=float(pos)), sharpen_callback, group=schedulers)
+color_scheduler = PreviewScheduler(
+    mains, lambda pos: preview_enhance(color=float(pos)), color_callback, group=schedulers)
+
 # Default image
-img = Image.open("image.jpg")
+img = open_reduced("image.jpg", (600, 700))
 # "logo.png" image will be available after this code
 # To run this code, this image must be saved in your PC's or you should change 
 # the "logo.png" to your image name in this code.
@@ -164,9 +220,10 @@ displayimage(img)
 #Inside the widget,
 
 brightnessSlider = Scale(mains, label="Brightness", from_=0, to=2, orient=HORIZONTAL, length=200,
-                         resolution=0.1, command=brightness_callback, bg="#1f242d")
+                         resolution=0.1, command=brightness_scheduler.request, bg="#1f242d")
 #initially, color position set to 1
 brightnessSlider.set(1)
+brightnessSlider.bind("<ButtonRelease-1>", brightness_scheduler.finish)
 #setting the font style, font size, weight
 brightnessSlider.configure(font=('poppins',11,'bold'),foreground='white')
 brightnessSlider.place(x=1070,y=15)
@@ -175,16 +232,18 @@ brightnessSlider.place(x=1070,y=15)
 #contrastSlider stores the scale widget
 #length determines the length of the slider
 contrastSlider = Scale(mains, label="Contrast", from_=0, to=2, orient=HORIZONTAL, length=200,
-                       command=contrast_callback, resolution=0.1, bg="#1f242d")
+                       command=contrast_scheduler.request, resolution=0.1, bg="#1f242d")
 #initially, color position set to 1
 contrastSlider.set(1)
+contrastSlider.bind("<ButtonRelease-1>", contrast_scheduler.finish)
 #setting the font style, font size, weight
 contrastSlider.configure(font=('poppins',11,'bold'),foreground='white')
 contrastSlider.place(x=1070,y=90)
 sharpnessSlider = Scale(mains, label="Sharpness", from_=0, to=2, orient=HORIZONTAL, length=200,
-                        command=sharpen_callback, resolution=0.1, bg="#1f242d")
+                        command=sharpness_scheduler.request, resolution=0.1, bg="#1f242d")
 #initially, color position set to 1
 sharpnessSlider.set(1)
+sharpnessSlider.bind("<ButtonRelease-1>", sharpness_scheduler.finish)
 #setting the font style, font size, weight
 sharpnessSlider.configure(font=('poppins',11,'bold'),foreground='white')
 sharpnessSlider.place(x=1070,y=165)
@@ -196,9 +255,10 @@ sharpnessSlider.place(x=1070,y=165)
 #from_ = 0, to = 2 specifies the color range
 #length determines the length of the slider
 colorSlider = Scale(mains, label="Colors", from_=0, to=2, orient=HORIZONTAL, length=200,
-                    command=color_callback, resolution=0.1, bg="#1f242d")
+                    command=color_scheduler.request, resolution=0.1, bg="#1f242d")
 #initially, color position set to 1
 colorSlider.set(1)
+colorSlider.bind("<ButtonRelease-1>", color_scheduler.finish)
 #setting the font style, font size, weight
 colorSlider.configure(font=('poppins',11,'bold'),foreground='white')
 colorSlider.place(x=1070,y=240)
@@ -0,0 +1,184 @@
+# batch.py
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+from PIL import Image
+
+import tile_engine
+from image_loader import open_unlimited
+from morphology import MORPH_OPERATIONS
+from recipe import Recipe, Step, execute
+
+# Расширения файлов, которые обрабатываются в каталоге
+BATCH_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".ppm")
+
+# Форматы, которые не сохраняют альфа-канал
+_OPAQUE_FORMATS = ("JPEG", "BMP", "PPM")
+
+REPORT_FIELDS = ("file", "output", "status", "width", "height", "decode_s", "process_s", "encode_s", "total_s", "error")
+
+
+def _init_worker():
+    # Параллельность даёт пул процессов, потоки внутри процесса только мешали бы друг другу
+    tile_engine.WORKERS = 1
+    cv2.setNumThreads(1)
+
+
+def iter_images(paths, exclude=None):
+    """
+    Файлы изображений из списка файлов и каталогов (каталоги обходятся рекурсивно, лениво).
+    :param exclude: Каталог, который не обходится (например, каталог результатов)
+    :return: Генератор (путь, путь относительно указанного каталога)
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirectories, files in os.walk(path):
+                subdirectories[:] = [
+                    name for name in sorted(subdirectories)
+                    if os.path.abspath(os.path.join(directory, name)) != exclude
+                ]
+                for name in sorted(files):
+                    if name.lower().endswith(BATCH_EXTENSIONS):
+                        yield os.path.join(directory, name), os.path.relpath(os.path.join(directory, name), path)
+        else:
+            yield path, os.path.basename(path)
+
+
+def process_file(source, target, recipe):
+    """
+    Обрабатывает один файл: декодирование -> обработка -> сохранение.
+    Выполняется в процессе пула; ошибки не поднимаются, а попадают в отчёт.
+    :return: Строка отчёта (словарь с полями REPORT_FIELDS)
+    """
+    row = dict.fromkeys(REPORT_FIELDS, "")
+    row.update(file=source, output=target, status="ok")
+    start = time.perf_counter()
+    stage = start
+    try:
+        with open_unlimited(source) as image:
+            image.load()
+            row["width"], row["height"] = image.size
+            now = time.perf_counter()
+            row["decode_s"], stage = round(now - stage, 4), now
+
+            result = execute(recipe, image)
+        now = time.perf_counter()
+        row["process_s"], stage = round(now - stage, 4), now
+
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        image_format = Image.registered_extensions().get(os.path.splitext(target)[1].lower())
+        if image_format in _OPAQUE_FORMATS and result.mode == "RGBA":
+            result = result.convert("RGB")
+        result.save(target, image_format)
+        row["encode_s"] = round(time.perf_counter() - stage, 4)
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["total_s"] = round(time.perf_counter() - start, 4)
+    return row
+
+
+def run_batch(paths, output_dir, recipe, report_path, workers=None, max_in_flight=None, suffix=None):
+    """
+    Выполняет рецепт над файлами пулом процессов и пишет отчёт CSV по мере готовности.
+
+    Одновременно в работе не больше max_in_flight файлов, а список файлов
+    читается лениво, поэтому память не зависит от размера каталога.
+    :param suffix: Новое расширение результата (например, ".png") или None
+    :return: (обработано, с ошибкой)
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    done = failed = 0
+
+    with open(report_path, "w", newline="", encoding="utf-8") as report_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        report = csv.DictWriter(report_file, REPORT_FIELDS)
+        report.writeheader()
+        pending = set()
+
+        def collect(finished):
+            nonlocal done, failed
+            for future in finished:
+                row = future.result()
+                report.writerow(row)
+                done += 1
+                failed += row["status"] != "ok"
+
+        for source, relative in iter_images(paths, exclude=output_dir):
+            if len(pending) >= max_in_flight:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            target = os.path.join(output_dir, relative)
+            if suffix:
+                target = os.path.splitext(target)[0] + suffix
+            pending.add(pool.submit(process_file, source, target, recipe))
+        collect(wait(pending).done)
+    return done, failed
+
+
+def load_recipe(args):
+    """
+    Рецепт из файла --recipe (например, сохранённый в main.py), к которому
+    добавляются шаги из параметров командной строки: коррекция, порог, затем морфология.
+    """
+    recipe = Recipe.load(args.recipe) if args.recipe else Recipe()
+    for name in ("brightness", "contrast", "color", "sharpness"):
+        if getattr(args, name) is not None:
+            recipe = recipe.then(Step(name, factor=getattr(args, name)))
+    if args.grayscale:
+        recipe = recipe.then(Step("mode", mode="L"))
+    if args.threshold is not None:
+        recipe = recipe.then(Step("threshold", level=args.threshold))
+    if args.morph:
+        kernel = [[1] * args.kernel_size for _ in range(args.kernel_size)]
+        if args.kernel:
+            kernel = [[int(value) for value in row.split(",")] for row in args.kernel.split(";")]
+        recipe = recipe.then(Step("morphology", operation=args.morph, kernel=kernel, iterations=args.iterations))
+    return recipe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная обработка изображений без интерфейса")
+    parser.add_argument("inputs", nargs="+", help="Файлы или каталоги с изображениями")
+    parser.add_argument("-o", "--output", required=True, help="Каталог для результатов")
+    parser.add_argument("--recipe", help="Файл рецепта JSON (recipe.py)")
+    parser.add_argument("--brightness", type=float)
+    parser.add_argument("--contrast", type=float)
+    parser.add_argument("--color", type=float)
+    parser.add_argument("--sharpness", type=float)
+    parser.add_argument("--grayscale", action="store_true", help="Перевести в оттенки серого")
+    parser.add_argument("--threshold", type=int, help="Порог яркости 0-255 для перевода в чёрно-белое")
+    parser.add_argument("--morph", choices=("Erosion", "Dilation", *MORPH_OPERATIONS))
+    parser.add_argument("--kernel", help="Ядро морфологии по строкам, например 0,1,0;1,1,1;0,1,0")
+    parser.add_argument("--kernel-size", type=int, default=3, help="Размер ядра из единиц, если --kernel не задан")
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--format", help="Расширение результата, например png (по умолчанию как у исходного)")
+    parser.add_argument("--workers", type=int, help="Число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--max-in-flight", type=int, help="Сколько файлов одновременно в работе")
+    parser.add_argument("--report", help="Файл отчёта CSV (по умолчанию report.csv в каталоге результатов)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    report_path = args.report or os.path.join(args.output, "report.csv")
+    suffix = "." + args.format.lstrip(".").lower() if args.format else None
+
+    start = time.perf_counter()
+    done, failed = run_batch(
+        args.inputs, args.output, load_recipe(args), report_path, args.workers, args.max_in_flight, suffix
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Обработано файлов: {done}, с ошибкой: {failed}, время: {elapsed:.1f} с "
+          f"({done / elapsed if elapsed else 0:.1f} файлов/с). Отчёт: {report_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
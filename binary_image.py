@@ -0,0 +1,303 @@
+# binary_image.py
+
+import numpy as np
+from PIL import Image
+
+from constants import BINARY_BAND_PIXELS, BINARY_BAND_WORDS
+from enhance_engine import _apply_mode
+from morphology import kernel_rectangles, kernel_shape, morph_array, morph_halo
+import tile_engine
+
+# Пикселей в слове упакованной строки
+WORD_BITS = 64
+
+_ONES = np.uint64(0xFFFF_FFFF_FFFF_FFFF)
+_ZERO = np.uint64(0)
+
+# Морфологические операции как последовательности эрозий и дилатаций
+_MORPH_PASSES = {
+    'Erosion': ('Erosion',),
+    'Dilation': ('Dilation',),
+    'Opening': ('Erosion', 'Dilation'),
+    'Closing': ('Dilation', 'Erosion'),
+    'Gradient': ('Dilation', 'Erosion'),
+}
+
+# Байт с обратным порядком бит: PIL хранит режим "1" старшим битом вперёд,
+# а здесь пиксель x - бит x % 64 слова x // 64
+_REVERSE_BITS = np.array([int(f"{value:08b}"[::-1], 2) for value in range(256)], dtype=np.uint8)
+
+
+def _pack_rows(mask):
+    """Строки массива bool (H, W) -> слова uint64 (H, ceil(W / 64))"""
+    height, width = mask.shape
+    words = -(-width // WORD_BITS)
+    packed = np.zeros((height, words * 8), dtype=np.uint8)
+    packed[:, :-(-width // 8)] = np.packbits(mask, axis=1, bitorder="little")
+    return packed.view("<u8")
+
+
+def _padding_mask(width):
+    # Биты последнего слова строки, лежащие за правым краем изображения
+    used = width % WORD_BITS
+    return _ZERO if used == 0 else _ONES << np.uint64(used)
+
+
+def _set_padding(words, width, fill):
+    if fill:
+        words[:, -1] |= _padding_mask(width)
+    else:
+        words[:, -1] &= ~_padding_mask(width)
+    return words
+
+
+def _shift_rows(words, offset, height, fill):
+    """Строки out[y] = words[y + offset] для y < height, за краем - fill"""
+    out = np.full((height, words.shape[1]), fill, dtype=np.uint64)
+    first, last = max(0, -offset), min(height, words.shape[0] - offset)
+    if first < last:
+        out[first:last] = words[first + offset:last + offset]
+    return out
+
+
+def _shift_columns(words, offset, width, fill):
+    """
+    Пиксели out[x] = words[x + offset] для x < width, за краем - fill.
+    Биты words за правым краем должны быть равны fill.
+    """
+    count = -(-width // WORD_BITS)
+    before = max(0, -offset) // WORD_BITS + 1
+    # Со сдвигом на before слов начало окна неотрицательно
+    whole, bits = divmod(offset + before * WORD_BITS, WORD_BITS)
+    after = max(0, whole + count + 1 - before - words.shape[1])
+    extended = np.concatenate((
+        np.full((words.shape[0], before), fill, dtype=np.uint64),
+        words,
+        np.full((words.shape[0], after), fill, dtype=np.uint64),
+    ), axis=1)
+    out = extended[:, whole:whole + count].copy()
+    if bits:
+        out >>= np.uint64(bits)
+        out |= extended[:, whole + 1:whole + 1 + count] << np.uint64(WORD_BITS - bits)
+    return _set_padding(out, width, fill)
+
+
+def _combine_next(words, step, axis, op, fill):
+    """
+    На месте: words[i] = op(words[i], words[i + step]) вдоль оси; за краем - fill,
+    который op не меняет, поэтому последние step строк (пикселей) остаются как есть.
+    """
+    if axis == 0:
+        op(words[:-step], words[step:], out=words[:-step])
+        return words
+    if step >= WORD_BITS:
+        return op(words, _shift_columns(words, step, words.shape[1] * WORD_BITS, fill), out=words)
+    # Короткий сдвиг: хвост каждого слова берётся из начала следующего
+    shifted = words >> np.uint64(step)
+    shifted[:, :-1] |= words[:, 1:] << np.uint64(WORD_BITS - step)
+    if fill:
+        shifted[:, -1] |= _ONES << np.uint64(WORD_BITS - step)
+    return op(words, shifted, out=words)
+
+
+def _line(words, width, length, offset, axis, op, fill):
+    """
+    Отрезок из length пикселей со смещения offset вдоль оси (0 - по столбцам, 1 - по строкам).
+
+    Строки (столбцы) сначала переносятся на смещение в массив длиннее на
+    length - 1, затем отрезок удваивается на каждом шаге: сдвигов - log2(length).
+    """
+    height = words.shape[0]
+    if axis == 0:
+        extended = _shift_rows(words, offset, height + length - 1, fill)
+    else:
+        extended = _shift_columns(words, offset, width + length - 1, fill)
+    span = 1
+    while span < length:
+        step = min(span, length - span)
+        _combine_next(extended, step, axis, op, fill)
+        span += step
+    if axis == 0:
+        return extended[:height]
+    return _set_padding(extended[:, :words.shape[1]].copy(), width, fill)
+
+
+class BinaryImage:
+    def __init__(self, words, width):
+        """
+        Чёрно-белое изображение, 1 бит на пиксель.
+
+        Каждая строка упакована в слова uint64 (пиксель x - бит x % 64 слова
+        x // 64), биты за правым краем строки всегда нулевые. Морфология
+        выполняется сдвигами и побитовыми И / ИЛИ сразу над 64 пикселями.
+        Интерфейс чтения (size, crop, reduce, getpixel) - как у изображения PIL.
+        :param words: Массив uint64 (H, ceil(W / 64))
+        :param width: Ширина изображения в пикселях
+        """
+        self.words = words
+        self.width = width
+        self.height = words.shape[0]
+        self.mode = "1"
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    @classmethod
+    def from_array(cls, array, threshold=128):
+        """
+        Упаковывает массив uint8: пиксели не темнее threshold становятся белыми.
+        :param array: Массив (H, W) яркости или (H, W, C) цвета (сравнивается яркость)
+        """
+        if array.ndim == 3:
+            array = _apply_mode(array[:, :, :3], "L")
+        return cls(_pack_rows(array >= threshold), array.shape[1])
+
+    @classmethod
+    def from_image(cls, image, threshold=128):
+        """
+        Упаковывает изображение PIL полосами строк, не создавая копию всего изображения в uint8.
+        Изображение в режиме "1" упаковывается без порога.
+        """
+        width, height = image.size
+        if image.mode == "1":
+            rows = np.frombuffer(image.tobytes(), dtype=np.uint8).reshape(height, -(-width // 8))
+            packed = np.zeros((height, -(-width // WORD_BITS) * 8), dtype=np.uint8)
+            packed[:, :rows.shape[1]] = _REVERSE_BITS[rows]
+            binary = cls(packed.view("<u8"), width)
+            binary._clear_padding()
+            return binary
+
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        words = np.empty((height, -(-width // WORD_BITS)), dtype=np.uint64)
+        band = max(1, BINARY_BAND_PIXELS // max(1, width))
+        for top in range(0, height, band):
+            bottom = min(height, top + band)
+            words[top:bottom] = cls.from_array(np.asarray(image.crop((0, top, width, bottom))), threshold).words
+        return cls(words, width)
+
+    def _clear_padding(self):
+        _set_padding(self.words, self.width, _ZERO)
+        return self
+
+    def to_array(self, top=0, bottom=None):
+        """Строки top:bottom в виде массива uint8 (0 / 255)"""
+        rows = self.words[top:bottom].view(np.uint8)
+        return np.unpackbits(rows, axis=1, count=self.width, bitorder="little") * np.uint8(255)
+
+    def to_image(self):
+        """Изображение PIL в режиме "1" (PIL хранит его байтом на пиксель)"""
+        rows = _REVERSE_BITS[self.words.view(np.uint8)[:, :-(-self.width // 8)]]
+        return Image.frombytes("1", self.size, rows.tobytes())
+
+    def convert(self, mode):
+        """Изображение PIL в режиме mode, как Image.convert"""
+        return Image.fromarray(self.to_array(), "L").convert(mode) if mode != "1" else self.to_image()
+
+    def crop(self, box):
+        """Часть изображения в виде изображения PIL в режиме "L" (0 / 255)"""
+        left, top, right, bottom = box
+        first, last = left // WORD_BITS, -(-right // WORD_BITS)
+        rows = self.words[max(0, top):min(self.height, bottom), first:last].view(np.uint8)
+        array = np.unpackbits(rows, axis=1, bitorder="little")[:, left - first * WORD_BITS:right - first * WORD_BITS]
+        return Image.fromarray(array * np.uint8(255), "L")
+
+    def reduce(self, factor):
+        """Уменьшение в factor раз усреднением блоков, как Image.reduce: изображение PIL в режиме "L" """
+        band = factor * max(1, BINARY_BAND_PIXELS // max(1, self.width * factor))
+        parts = [
+            np.asarray(Image.fromarray(self.to_array(top, top + band), "L").reduce(factor))
+            for top in range(0, self.height, band)
+        ]
+        return Image.fromarray(np.concatenate(parts), "L")
+
+    def getpixel(self, position):
+        """Значение пикселя, как Image.getpixel для режима "L": 0 или 255"""
+        x, y = position
+        word = self.words[y, x // WORD_BITS]
+        return 255 if (int(word) >> (x % WORD_BITS)) & 1 else 0
+
+    def histogram(self):
+        """Гистограмма яркости (1, 256): белые пиксели в 255, чёрные в 0"""
+        counts = np.zeros((1, 256), dtype=np.int64)
+        white = int(np.unpackbits(self.words.view(np.uint8)).sum(dtype=np.int64))
+        counts[0, 255] = white
+        counts[0, 0] = self.width * self.height - white
+        return counts
+
+    def morph(self, operation, matrix, iterations=1):
+        """
+        Морфологическая операция над упакованными строками.
+        Результат совпадает с morph_array над массивом 0 / 255.
+        :param operation: Erosion, Dilation, Opening, Closing или Gradient
+        :return: Новый BinaryImage
+        """
+        matrix = np.asarray(matrix, dtype=np.uint8)
+        if kernel_shape(matrix) == "empty":
+            # Пустое ядро OpenCV обрабатывает по-своему, поэтому - через массив
+            return BinaryImage.from_array(morph_array(self.to_array(), operation, matrix, iterations))
+
+        if operation not in _MORPH_PASSES:
+            raise ValueError(f"Операция '{operation}' не поддерживается")
+
+        # Полосы строк с перекрытием halo обрабатываются, пока они в кэше процессора
+        halo = morph_halo(operation, matrix, iterations)
+        # (полоса не меньше 4 * halo, иначе перекрытия дают больше работы, чем сама полоса)
+        band = max(4 * halo, BINARY_BAND_WORDS // self.words.shape[1], 1)
+        words = np.empty_like(self.words)
+
+        def run(top):
+            bottom = min(self.height, top + band)
+            outer_top, outer_bottom = max(0, top - halo), min(self.height, bottom + halo)
+            result = _morph_words(self.words[outer_top:outer_bottom], self.width, operation, matrix, iterations)
+            words[top:bottom] = result[top - outer_top:bottom - outer_top]
+
+        tops = range(0, self.height, band)
+        if len(tops) < 2 or tile_engine.WORKERS < 2:
+            for top in tops:
+                run(top)
+        else:
+            # NumPy отпускает GIL, поэтому полосы обрабатываются на всех ядрах
+            list(tile_engine.get_pool().map(run, tops))
+        return BinaryImage(words, self.width)._clear_padding()
+
+
+def _morph_words(words, width, operation, matrix, iterations):
+    erode = lambda array: _morph_pass(array, width, matrix, iterations, np.bitwise_and, _ONES)
+    dilate = lambda array: _morph_pass(array, width, matrix, iterations, np.bitwise_or, _ZERO)
+    if operation == 'Gradient':
+        # У чёрно-белого изображения дилатация не меньше эрозии, разность - дилатация И НЕ эрозия
+        return dilate(words) & ~erode(words)
+    for name in _MORPH_PASSES[operation]:
+        words = erode(words) if name == 'Erosion' else dilate(words)
+    return words
+
+
+def _morph_pass(words, width, matrix, iterations, op, fill):
+    """Эрозия (op=np.bitwise_and, fill - единицы) или дилатация (np.bitwise_or, нули) iterations раз"""
+    if iterations < 1:
+        return words
+    rectangles = kernel_rectangles(matrix)
+    if kernel_shape(matrix) == "rect":
+        # n-кратная эрозия прямоугольником - одна эрозия прямоугольником в n раз больше
+        rectangles = [tuple(iterations * value for value in rectangles[0])]
+        iterations = 1
+
+    # Биты за правым краем участвуют в сдвигах как нейтральные
+    words = _set_padding(words.copy(), width, fill)
+    for _ in range(iterations):
+        # Прямоугольники с одинаковыми столбцами используют общий проход по строкам
+        rows = {}
+        result = None
+        for top, bottom, left, right in rectangles:
+            if (left, right) not in rows:
+                rows[left, right] = _line(words, width, right - left + 1, left, 1, op, fill)
+            part = _line(rows[left, right], width, bottom - top + 1, top, 0, op, fill)
+            result = part if result is None else op(result, part)
+        words = result
+    return words
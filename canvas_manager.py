@@ -1,15 +1,40 @@
 # canvas_manager.py
 
-from PIL import Image, ImageTk, ImageEnhance
+from collections import OrderedDict
+from concurrent.futures import CancelledError
+from PIL import Image, ImageTk
 import tkinter as tk
 import cv2
 import numpy as np
+from binary_image import BinaryImage
+from color_conversion import RGB_ARRAY_INVERSE_CONVERSIONS
+from constants import (
+    CHANNEL_RANGES, MAX_VIEW_SCALE, PHOTO_TILE_CACHE_BYTES, PLANE_CACHE_BYTES, PROXY_EDITING,
+)
+from conversion_pipeline import rgb_to_model_array
+from enhance_engine import FUSED_MODES, fused_enhance, merge_alpha, split_alpha
+from image_buffer import WorkingImage, buffers
+from image_loader import LazyImage
+from histogram import HistogramEngine, measure_histograms
+from history import EditHistory
+from image_pyramid import ImagePyramid
+from morphology import morph_array, morph_halo, morph_pil, proxy_kernel
+from processing_executor import ProcessingExecutor
+from recipe import Recipe, Step, plan_stages
+from stage_cache import StageCache
+from tile_engine import map_tiles
+from tiled_store import TiledStore, enhance_store
+
+# Максимальное количество пикселей для оценки ошибки прямого и обратного преобразования
+ROUND_TRIP_SAMPLE_PIXELS = 1 << 16
 
 class CanvasManager:
     def __init__(self, canvas):
         self.canvas = canvas
-        self.img = None
-        self.original_img = None
+        # Исходный файл; декодируется в полном разрешении только при необходимости
+        self.source = None
+        # Текущее изображение полного разрешения (None - совпадает с исходным)
+        self._img = None
         self.photo = None
         self.original_width = 0
         self.original_height = 0
@@ -22,92 +47,548 @@ class CanvasManager:
         self.color = 1.0
         self.sharpness = 1.0
         self.mode = "RGB"
+        # Правки, которые привели исходный файл к self.img (можно сохранить и повторить в batch.py)
+        self.recipe = Recipe()
+        # Состояния после правок для отмены и повтора (полные копии и разности в пределах объёма)
+        self.history = EditHistory()
+        # Гистограммы исходного изображения и их перенос через правки
+        self.histograms = HistogramEngine()
+        # Номер состояния изображения: меняется при каждой правке self.img
+        self.version = 0
+        # Кэш преобразованных плоскостей: (version, ...) -> массив, LRU по объёму
+        self.plane_cache = StageCache(PLANE_CACHE_BYTES)
+        # Показываемый канал: (модель, номер канала) или None для обычного вида
+        self.channel_view = None
+        # Номер исходного изображения: меняется только при загрузке файла
+        self.source_version = 0
+        # Промежуточные результаты change_image по шагам
+        self.stage_cache = StageCache()
+        # Интерактивная правка на копии размером с холст (proxy)
+        self.proxy_enabled = PROXY_EDITING
+        # Результат интерактивной правки размером с холст; показывается вместо self.img
+        self.display_img = None
+        # Вся обработка пикселей идёт в фоне; задачи выполняются по очереди.
+        # Последние задачи для копии размером с холст и для полного разрешения
+        self.executor = ProcessingExecutor(canvas)
+        self.display_job = None
+        self.full_job = None
+        self.decode_job = None
+        # Масштаб относительно вписанного в холст изображения (1.0 - целиком)
+        self.zoom = 1.0
+        # Пикселей экрана на пиксель изображения и левый верхний видимый пиксель
+        self.view_scale = 1.0
+        self.view_x = 0
+        self.view_y = 0
+        # Пирамида показываемого изображения и готовые плитки PhotoImage (LRU)
+        self.pyramid = None
+        self.tile_cache = OrderedDict()
+        self.tile_cache_bytes = 0
+        self.photos = []
+
+    @property
+    def original_img(self):
+        """Исходное изображение полного разрешения (декодируется при первом обращении)"""
+        return self.source.get() if self.source is not None else None
+
+    @property
+    def img(self):
+        """Текущее изображение полного разрешения"""
+        return self._img if self._img is not None else self.original_img
+
+    @img.setter
+    def img(self, image):
+        self._img = image
+
+    def has_image(self):
+        """Загружено ли изображение (без декодирования)"""
+        return self.source is not None
+
+    def _current_image(self):
+        # Текущее изображение или ещё не декодированный исходный файл
+        return self._img if self._img is not None else self.source
+
+    @staticmethod
+    def _resolve(image):
+        return image.get() if isinstance(image, LazyImage) else image
 
     def load_image(self, file_path):
-        """Загружает изображение и инициализирует обработку"""
-        self.original_img = Image.open(file_path)
-        self.img = self.original_img.copy()
-        self.original_width, self.original_height = self.img.size
-        self.mode = self.img.mode
+        """
+        Открывает изображение и сразу показывает его уменьшенную копию.
+        Размер и режим берутся из заголовка; полное изображение декодируется
+        только для операций, которым нужно полное разрешение.
+        """
+        self.source = LazyImage(file_path)
+        self._img = None
+        self.original_width, self.original_height = self.source.size
+        self.mode = self.source.mode
+        self.recipe = Recipe()
+        source = self.source
+        self.history.reset(self.recipe, self._settings(), lambda image: source.get())
+        self.source_version += 1
+        self.stage_cache.clear()
+        # Промежуточные массивы прежнего размера новому изображению не подойдут
+        buffers.clear()
+        self.cancel_jobs(requests=True)
+        self.zoom = 1.0
+        self.view_x = self.view_y = 0
+        self.display_img = None
+        self.image_changed()
+        if self.source.out_of_core:
+            # Файл раскладывается в хранилище на диске, это долго - копия строится в фоне
+            self._submit_display(lambda base, size: base())
+        else:
+            self.display_img = self.source.preview(self.fit_size())
         self.render()
 
-    def render(self):
-        """Отрисовывает изображение на холсте с сохранением пропорций"""
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
+    def image_changed(self):
+        """Отмечает новое состояние self.img и сбрасывает устаревшие кэши"""
+        self.version += 1
+        self.plane_cache.discard(lambda key: key[0] != self.version)
 
-        if self.original_width == 0 or self.original_height == 0:
+    def cancel_jobs(self, requests=False):
+        """
+        Отменяет ещё не показанную обработку копии и полного разрешения (новые
+        параметры заменяют старые). Запросы submit_with_image (цвет пикселя,
+        гистограмма) остаются в очереди.
+        :param requests: Отменить и запросы (изображение сменилось)
+        """
+        self.executor.cancel(only_replaceable=not requests)
+        self.display_job = None
+        self.full_job = None
+        if requests:
+            self.decode_job = None
+
+    def _settings(self):
+        return self.brightness, self.contrast, self.color, self.sharpness, self.mode
+
+    def _record(self, label, func):
+        """
+        Добавляет правку в историю и запускает её над полным разрешением.
+        :param func: Функция (изображение предыдущего состояния) -> новое изображение;
+                     история повторяет её, если состояние пришлось вытеснить
+        """
+        entry = self.history.push(label, self.recipe, self._settings(), func)
+        self._submit_full(func, entry)
+
+    def _submit_full(self, func, entry=None):
+        """
+        Запускает обработку полного разрешения в фоне.
+        :param func: Функция (текущее изображение полного разрешения) -> новое изображение
+        :param entry: Состояние истории, которое получится; результат сохраняется в истории
+        """
+        previous = self.full_job
+        current = self._current_image()
+
+        def run():
+            # Задачи выполняются по очереди, поэтому previous к этому моменту уже готова
+            return func(previous.result() if previous is not None else self._resolve(current))
+
+        job = self.full_job = self.executor.submit(
+            run, lambda image: self._full_done(job, image, entry), replaceable=True
+        )
+
+    def _full_done(self, job, image, entry=None):
+        if entry is not None:
+            # Разность с предыдущим состоянием считается следующей задачей, не задерживая показ
+            self.executor.submit(lambda: self.history.store(entry, image))
+        if job is not self.full_job:
+            # Промежуточный результат: за ним уже запущена следующая обработка
+            return
+        self.full_job = None
+        self.img = image
+        self.image_changed()
+        if self.display_img is None or self.zoom != 1.0 or self.channel_view is not None:
+            # Копия размером с холст показывается только без увеличения
+            self.render()
+
+    def _submit_display(self, func):
+        """
+        Запускает обработку копии размером с холст и показывает результат.
+        :param func: Функция (получение текущей копии, размер) -> новая копия
+        """
+        previous = self.display_job
+        size = self.fit_size()
+        current = self.display_img if self.display_img is not None and self.display_img.size == size else None
+        image = self._current_image()
+
+        def base():
+            if previous is not None:
+                return previous.result()
+            if current is not None:
+                return current
+            if isinstance(image, LazyImage):
+                return image.preview(size)
+            return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+        job = self.display_job = self.executor.submit(
+            lambda: func(base, size), lambda display: self._display_done(job, display), replaceable=True
+        )
+
+    def _display_done(self, job, display):
+        if job is not self.display_job:
             return
+        self.display_job = None
+        self.display_img = display
+        self.render()
+
+    def submit_with_image(self, func, callback):
+        """
+        Выполняет func над изображением полного разрешения в фоне (после уже
+        запущенной обработки) и передаёт результат в callback в потоке интерфейса.
+        """
+        previous = self.full_job
+        current = self._current_image()
+
+        def image():
+            if previous is None:
+                return self._resolve(current)
+            try:
+                return previous.result()
+            except CancelledError:
+                # Обработку заменили новые параметры: берём последнее готовое изображение
+                return self._resolve(self._current_image())
+
+        return self.executor.submit(lambda: func(image()), callback)
+
+    def histogram_estimate(self):
+        """Гистограммы текущего изображения, выведенные без прохода по пикселям (или None)"""
+        if not self.has_image():
+            return None
+        return self.histograms.derive(self.source_version, self.recipe, self.source.mode)
+
+    def request_histogram(self, callback):
+        """
+        Передаёт в callback гистограммы текущего изображения (HistogramEstimate).
+        Для поточечных правок они выводятся сразу из гистограмм исходного
+        изображения, иначе считаются в фоне (для больших изображений - по выборке).
+        """
+        estimate = self.histogram_estimate()
+        if estimate is not None:
+            callback(estimate)
+            return
+        key, source, recipe, mode = self.source_version, self.source, self.recipe, self.source.mode
+
+        def compute(image):
+            if not self.histograms.has_source(key):
+                self.histograms.measure_source(key, source.get())
+            derived = self.histograms.derive(key, recipe, mode)
+            return derived if derived is not None else measure_histograms(image)
+
+        self.submit_with_image(compute, callback)
+
+    def show_channel(self, model=None, channel=0):
+        """
+        Показывает на холсте один канал модели или, при model=None, само изображение.
+        Плоскости считаются в фоне, до их готовности показывается само изображение.
+        """
+        if model is not None and self.source.out_of_core:
+            print("Просмотр каналов недоступен для изображений, которые не помещаются в память")
+            return
+        self.channel_view = None if model is None else (model, channel)
+        if self.channel_view is not None and self._channel_image() is None:
+            self._submit_channel(model, channel)
+        self.render()
+
+    def _submit_channel(self, model, channel):
+        low, high = CHANNEL_RANGES[model][channel]
+        planes = self.plane_cache.lookup((self.version, model))
+
+        def compute(image):
+            values = planes if planes is not None else rgb_to_model_array(model, np.asarray(image.convert('RGB')))
+            gray = np.clip((values[:, :, channel] - low) * (255 / (high - low)), 0, 255).astype(np.uint8)
+            return image, values, Image.fromarray(gray, 'L')
+
+        def done(result):
+            image, values, gray = result
+            if image is not self.img:
+                # Изображение успело измениться
+                return
+            self.plane_cache.put((self.version, model), values)
+            self.plane_cache.put((self.version, model, channel), gray)
+            if self.channel_view == (model, channel):
+                self.render()
+
+        self.submit_with_image(compute, done)
+
+    def _channel_image(self):
+        """Канал channel_view в оттенках серого в полном разрешении (или None, если ещё не готов)"""
+        model, channel = self.channel_view
+        return self.plane_cache.lookup((self.version, model, channel))
+
+    def get_channel_value(self, img_x, img_y):
+        """Значение показываемого канала в пикселе изображения (или None)"""
+        if self.channel_view is None:
+            return None
+        model, channel = self.channel_view
+        planes = self.plane_cache.lookup((self.version, model))
+        if planes is None:
+            return None
+        return float(planes[img_y, img_x, channel])
+
+    def fit_size(self):
+        """Размер изображения, вписанного в холст с сохранением пропорций"""
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
 
         img_ratio = self.original_width / self.original_height
         canvas_ratio = canvas_width / canvas_height
 
         if img_ratio > canvas_ratio:
-            self.scaled_width = canvas_width
-            self.scaled_height = int(canvas_width / img_ratio)
+            return canvas_width, max(1, int(canvas_width / img_ratio))
+        return max(1, int(canvas_height * img_ratio)), canvas_height
+
+    def get_pyramid(self):
+        """Пирамида показываемого изображения (строится заново при его изменении)"""
+        channel_image = self._channel_image() if self.channel_view is not None else None
+        # Пока канал считается, показывается само изображение
+        key = (self.version, self.channel_view if channel_image is not None else None)
+        if self.pyramid is None or self.pyramid.key != key:
+            image = self.img if channel_image is None else channel_image
+            self.pyramid = ImagePyramid(image, key)
+            self.tile_cache.clear()
+            self.tile_cache_bytes = 0
+        return self.pyramid
+
+    def _update_view(self):
+        """Пересчитывает масштаб, видимую область и положение изображения на холсте"""
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        fit_width, fit_height = self.fit_size()
+        self.view_scale = fit_width / self.original_width * self.zoom
+
+        if self.zoom == 1.0:
+            self.view_x = self.view_y = 0
+            self.scaled_width, self.scaled_height = fit_width, fit_height
         else:
-            self.scaled_height = canvas_height
-            self.scaled_width = int(canvas_height * img_ratio)
+            # Видимая часть не выходит за границы изображения
+            self.view_x = min(max(self.view_x, 0), max(0, self.original_width - canvas_width / self.view_scale))
+            self.view_y = min(max(self.view_y, 0), max(0, self.original_height - canvas_height / self.view_scale))
+            self.scaled_width = min(canvas_width, round((self.original_width - self.view_x) * self.view_scale))
+            self.scaled_height = min(canvas_height, round((self.original_height - self.view_y) * self.view_scale))
+        self.offset_x = max(0, (canvas_width - self.scaled_width) // 2)
+        self.offset_y = max(0, (canvas_height - self.scaled_height) // 2)
+
+    def _tile_photo(self, pyramid, level, tile_x, tile_y, size, visible=None):
+        key = (level, tile_x, tile_y, size, visible)
+        if key in self.tile_cache:
+            self.tile_cache.move_to_end(key)
+            return self.tile_cache[key]
+        photo = ImageTk.PhotoImage(pyramid.tile(level, tile_x, tile_y, size, visible))
+        self.tile_cache[key] = photo
+        self.tile_cache_bytes += photo.width() * photo.height() * 4
+        # Вытесняем самые старые плитки, но последнюю оставляем всегда
+        while self.tile_cache_bytes > PHOTO_TILE_CACHE_BYTES and len(self.tile_cache) > 1:
+            _, old = self.tile_cache.popitem(last=False)
+            self.tile_cache_bytes -= old.width() * old.height() * 4
+        return photo
+
+    def _render_tiles(self):
+        """Собирает видимую часть из плиток ближайшего уровня пирамиды"""
+        pyramid = self.get_pyramid()
+        level = pyramid.level_for_scale(self.view_scale)
+        factor = 1 << level
+        level_scale = self.view_scale * factor
+        columns, rows = pyramid.tile_grid(level)
+        tile = pyramid.tile_size
+
+        # Видимая область в координатах уровня
+        left, top = self.view_x / factor, self.view_y / factor
+        right = left + self.scaled_width / level_scale
+        bottom = top + self.scaled_height / level_scale
+        origin_x = self.offset_x - round(left * level_scale)
+        origin_y = self.offset_y - round(top * level_scale)
+
+        self.photos = []
+        for tile_y in range(int(top) // tile, min(rows, int(bottom) // tile + 1)):
+            for tile_x in range(int(left) // tile, min(columns, int(right) // tile + 1)):
+                box = pyramid.tile_box(level, tile_x, tile_y)
+                # Края плиток округляются одинаково, поэтому между ними нет щелей
+                x0, y0 = round(box[0] * level_scale), round(box[1] * level_scale)
+                x1, y1 = round(box[2] * level_scale), round(box[3] * level_scale)
+                if x1 <= x0 or y1 <= y0:
+                    continue
+                visible = None
+                if level_scale > 1:
+                    # Увеличенная плитка может быть во много раз больше холста:
+                    # PhotoImage строится только для видимой части
+                    visible = (
+                        max(0, self.offset_x - origin_x - x0), max(0, self.offset_y - origin_y - y0),
+                        min(x1, self.offset_x + self.scaled_width - origin_x) - x0,
+                        min(y1, self.offset_y + self.scaled_height - origin_y) - y0,
+                    )
+                    if visible[2] <= visible[0] or visible[3] <= visible[1]:
+                        continue
+                photo = self._tile_photo(pyramid, level, tile_x, tile_y, (x1 - x0, y1 - y0), visible)
+                self.photos.append(photo)
+                left_x, top_y = (x0, y0) if visible is None else (x0 + visible[0], y0 + visible[1])
+                self.canvas.create_image(origin_x + left_x, origin_y + top_y, anchor=tk.NW, image=photo)
+
+    def render(self):
+        """Отрисовывает видимую часть изображения с учётом масштаба и сдвига"""
+        if self.original_width == 0 or self.original_height == 0:
+            return
+
+        self._update_view()
+
+        if self._img is None and not self.source.loaded and not (
+                self.zoom == 1.0 and self.channel_view is None and self.display_img is not None):
+            # Плиткам нужно полное разрешение: декодируем в фоне и рисуем после
+            if self.decode_job is None:
+                self.decode_job = self.executor.submit(self.source.get, lambda image: self._decoded())
+            return
 
-        scaled_image = self.img.resize(
-            (self.scaled_width, self.scaled_height),
-            Image.Resampling.LANCZOS
-        )
-        self.photo = ImageTk.PhotoImage(scaled_image)
-        
         self.canvas.delete("all")
-        self.offset_x = (canvas_width - self.scaled_width) // 2
-        self.offset_y = (canvas_height - self.scaled_height) // 2
-        self.canvas.create_image(
-            self.offset_x, 
-            self.offset_y, 
-            anchor=tk.NW, 
-            image=self.photo
-        )
 
-    def get_pixel_color(self, x, y):
-        """Возвращает цвет пикселя по координатам на холсте"""
-        if self.img and (
+        if (self.channel_view is None and self.zoom == 1.0 and self.display_img is not None
+                and self.display_img.size == (self.scaled_width, self.scaled_height)):
+            # Результат интерактивной правки уже размером с холст
+            self.photo = ImageTk.PhotoImage(self.display_img)
+            self.photos = [self.photo]
+            self.canvas.create_image(self.offset_x, self.offset_y, anchor=tk.NW, image=self.photo)
+            return
+
+        self._render_tiles()
+
+    def _decoded(self):
+        self.decode_job = None
+        self.render()
+
+    def zoom_at(self, factor, x, y):
+        """
+        Меняет масштаб, оставляя на месте точку холста (x, y).
+        :param factor: Во сколько раз увеличить (меньше 1 - уменьшить)
+        """
+        if not self.has_image():
+            return
+        image_x = self.view_x + (x - self.offset_x) / self.view_scale
+        image_y = self.view_y + (y - self.offset_y) / self.view_scale
+
+        fit_scale = self.fit_size()[0] / self.original_width
+        self.zoom = min(max(self.zoom * factor, 1.0), max(1.0, MAX_VIEW_SCALE / fit_scale))
+        # Отступ изображения на холсте зависит от масштаба: берём уже новый
+        self._update_view()
+        self.view_x = image_x - (x - self.offset_x) / self.view_scale
+        self.view_y = image_y - (y - self.offset_y) / self.view_scale
+        self.render()
+
+    def pan(self, dx, dy):
+        """Сдвигает изображение на (dx, dy) пикселей холста"""
+        if not self.has_image() or self.zoom == 1.0:
+            return
+        self.view_x -= dx / self.view_scale
+        self.view_y -= dy / self.view_scale
+        self.render()
+
+    def reset_view(self):
+        """Показывает изображение целиком"""
+        self.zoom = 1.0
+        self.view_x = self.view_y = 0
+        self.render()
+
+    def canvas_to_image(self, x, y):
+        """Переводит координаты на холсте в координаты изображения (или None)"""
+        if self.has_image() and (
             self.offset_x <= x < self.offset_x + self.scaled_width and
             self.offset_y <= y < self.offset_y + self.scaled_height
         ):
-            img_x = int((x - self.offset_x) * (self.original_width / self.scaled_width))
-            img_y = int((y - self.offset_y) * (self.original_height / self.scaled_height))
-            return self.img.getpixel((img_x, img_y))
+            img_x = min(int(self.view_x + (x - self.offset_x) / self.view_scale), self.original_width - 1)
+            img_y = min(int(self.view_y + (y - self.offset_y) / self.view_scale), self.original_height - 1)
+            return img_x, img_y
         return None
+
+    def get_pixel_color(self, x, y, callback):
+        """
+        Передаёт в callback цвет пикселя по координатам на холсте (после уже
+        запущенной обработки) или None, если точка вне изображения.
+        """
+        position = self.canvas_to_image(x, y)
+        if position:
+            self.submit_with_image(lambda image: image.getpixel(position), callback)
+        else:
+            callback(None)
     
-    def change_image(self, brightness: float, contrast: float, color: float, sharpness: float, mode: str):
+    def change_image(self, brightness: float, contrast: float, color: float, sharpness: float, mode: str,
+                     preview=False):
+        """
+        Применяет коррекцию к исходному изображению в фоне.
+        В режиме proxy сначала показывается результат для копии размером с холст,
+        затем считается полное разрешение (при preview=True - не считается).
+        """
         print(f'Change brightness from {self.brightness} to {brightness}')
         self.brightness = brightness
-        self.img = ImageEnhance.Brightness(self.original_img).enhance(brightness)
         print(f'Change contrast from {self.contrast} to {contrast}')
         self.contrast = contrast
-        self.img = ImageEnhance.Contrast(self.img).enhance(contrast)
         print(f'Change color from {self.color} to {color}')
         self.color = color
-        self.img = ImageEnhance.Color(self.img).enhance(color)
         print(f'Change sharpness from {self.sharpness} to {sharpness}')
         self.sharpness = sharpness
-        self.img = ImageEnhance.Sharpness(self.img).enhance(sharpness)
         print(f'Change mode from {self.mode} to {mode}')
         self.mode = mode
-        self.img = self.img.convert(mode)
-        self.render()
+        # Коррекция применяется к исходному файлу, поэтому заменяет весь рецепт
+        self.recipe = Recipe.adjustments(brightness, contrast, color, sharpness, mode)
+        # Результат не зависит от предыдущих правок, поэтому они больше не нужны
+        self.cancel_jobs()
+        params = (brightness, contrast, color, sharpness, mode)
+        # Исходное изображение фиксируется здесь: фоновая задача может
+        # выполняться уже после загрузки другого файла
+        source = (self.source_version, self.source)
+        if self.proxy_enabled:
+            self._submit_display(lambda base, size: self.enhance(*params, proxy_size=size, source=source))
+        if not (self.proxy_enabled and preview):
+            # Правки после прошлой коррекции остаются в истории, их можно вернуть отменой
+            self._record("Коррекция", lambda image: self.enhance(*params, source=source))
 
-    def pil_to_cv2(self):
-        """Конвертирует PIL Image в совместимый с OpenCV формат"""
+    def enhance(self, brightness, contrast, color, sharpness, mode, proxy_size=None, source=None):
+        """
+        Обрабатывает исходное изображение по плану recipe.plan, пересчитывая
+        только шаги после изменённого параметра.
+        Отличие от цепочки ImageEnhance - не больше FUSED_TOLERANCE.
+        :param proxy_size: Обработать копию этого размера вместо полного разрешения
+        :param source: (source_version, LazyImage); по умолчанию текущий исходный файл
+        :return: Изображение в режиме mode: для копии - PIL, для полного разрешения - WorkingImage
+        """
+        source_version, lazy = source or (self.source_version, self.source)
+        # Для копии полное изображение не декодируется
+        original = lazy.preview(proxy_size) if proxy_size is not None else lazy.get()
+        if isinstance(original, TiledStore):
+            # Хранилище на диске обрабатывается по частям, без кэша шагов в памяти
+            return enhance_store(original, brightness, contrast, color, sharpness, mode)
+        if original.mode not in FUSED_MODES:
+            return fused_enhance(original, brightness, contrast, color, sharpness, mode)
+
+        # Кэш общий для копии и полного разрешения, они различаются размером в ключе
+        array, alpha = split_alpha(original)
+        params = ()
+        recipe = Recipe.adjustments(brightness, contrast, color, sharpness, mode)
+        for stage, stage_params, func in plan_stages(recipe, original.mode):
+            # Результат шага зависит от параметров всех предыдущих шагов
+            params += ((stage, stage_params),)
+            array = self.stage_cache.get(
+                (source_version, proxy_size, stage, params),
+                lambda: func(array)
+            )
+        return self.stage_cache.get(
+            (source_version, proxy_size, "image", params),
+            # Полное разрешение остаётся массивом: PIL для него нужен только при показе
+            lambda: merge_alpha(array, alpha, mode) if proxy_size is not None else WorkingImage.merge(array, alpha, mode)
+        )
+
+    def pil_to_cv2(self, image=None):
+        """Конвертирует PIL Image (по умолчанию self.img) в совместимый с OpenCV формат"""
+        if image is None:
+            image = self.img
         try:
             # Конвертируем в RGB для удаления альфа-канала и других специальных режимов
-            if self.img.mode != 'RGB':
-                if self.img.mode == 'L':
+            if image.mode != 'RGB':
+                if image.mode == 'L':
                     # Градации серого
-                    return np.array(self.img)
+                    return np.array(image)
                 else:
-                    rgb_img = self.img.convert('RGB')
+                    rgb_img = image.convert('RGB')
                     return np.array(rgb_img)[:, :, ::-1]
             else:
                 # Стандартный RGB
-                return np.array(self.img)[:, :, ::-1]  # RGB -> BGR
+                return np.array(image)[:, :, ::-1]  # RGB -> BGR
                 
         except Exception as e:
             print(f"Ошибка конвертации: {str(e)}")
@@ -129,29 +610,169 @@ class CanvasManager:
             print(f"Ошибка обратной конвертации: {str(e)}")
             raise
 
+    @staticmethod
+    def _working(image):
+        """
+        Рабочий буфер полного разрешения для правок: изображение PIL копируется
+        в WorkingImage один раз, и для результата заранее выделяется место в пуле.
+        Остальные изображения (WorkingImage, BinaryImage, TiledStore) возвращаются как есть.
+        """
+        if not isinstance(image, Image.Image) or image.mode == "1":
+            return image
+        image = WorkingImage.from_image(image)
+        # Результат морфологии и промежуточный массив размыкания и замыкания
+        buffers.reserve(image.array.shape[:2] + ((3,) if image.mode == "RGBA" else image.array.shape[2:]), count=2)
+        return image
+
+    def morph_image(self, image, operation, kernel, iterations=1):
+        """
+        Применяет морфологическую операцию к изображению PIL, WorkingImage, TiledStore
+        или BinaryImage и возвращает новое того же вида (для PIL и WorkingImage - в режиме L или RGB)
+        """
+        if image.mode == "1" and not isinstance(image, BinaryImage):
+            # Чёрно-белый скан дальше хранится упакованным, бит на пиксель
+            image = BinaryImage.from_image(image)
+        if isinstance(image, (BinaryImage, WorkingImage)):
+            return image.morph(operation, kernel['matrix'], iterations)
+
+        halo = morph_halo(operation, kernel['matrix'], iterations)
+
+        def morph(array):
+            # Плитки с перекрытием halo обрабатываются на всех ядрах
+            return map_tiles(array, lambda tile: morph_array(tile, operation, kernel['matrix'], iterations), halo)
+
+        if isinstance(image, TiledStore):
+            # Хранилище на диске обрабатывается по частям с тем же перекрытием
+            return image.map(morph, halo=halo)
+        return morph_pil(image, operation, kernel['matrix'], iterations)
+
+    def _morph_proxy(self, image, size, operation, kernel, iterations):
+        """Морфология копии размером size: ядро и итерации уменьшаются вместе с изображением"""
+        matrix, count = proxy_kernel(kernel['matrix'], iterations, size[0] / self.original_width)
+        if matrix is None:
+            # На копии операция меньше пикселя - изображение не меняется
+            return image
+        return self.morph_image(image, operation, {'matrix': matrix}, count)
+
     # Обновленный метод apply_morph_operation
     def apply_morph_operation(self, operation, kernel, iterations=1):
-        """Применяет морфологическую операцию"""
-        try:
-            # Конвертация в OpenCV формат
-            cv_image = self.pil_to_cv2()
-            
-            # Применение операции
-            if operation == 'Erosion':
-                result = cv2.erode(cv_image, kernel['matrix'], iterations=iterations)
-            elif operation == 'Dilation':
-                result = cv2.dilate(cv_image, kernel['matrix'], iterations=iterations)
-            elif operation == 'Opening':
-                result = cv2.morphologyEx(cv_image, cv2.MORPH_OPEN, kernel['matrix'], iterations=iterations)
-            elif operation == 'Closing':
-                result = cv2.morphologyEx(cv_image, cv2.MORPH_CLOSE, kernel['matrix'], iterations=iterations)
-            elif operation == 'Gradient':
-                result = cv2.morphologyEx(cv_image, cv2.MORPH_GRADIENT, kernel['matrix'], iterations=iterations)
-
-            # Обратная конвертация
-            self.img = self.cv2_to_pil(result)
-            self.render()
+        """
+        Применяет морфологическую операцию в фоне.
+        В режиме proxy сначала показывается результат для копии размером с холст.
+        """
+        self.recipe = self.recipe.then(Step(
+            "morphology", operation=operation, kernel=kernel['matrix'].tolist(), iterations=iterations
+        ))
+        if self.proxy_enabled:
+            self._submit_display(lambda base, size: self._morph_proxy(base(), size, operation, kernel, iterations))
+        self._record(operation, lambda image: self.morph_image(self._working(image), operation, kernel, iterations))
 
-        except Exception as e:
-            print(f"Ошибка операции: {str(e)}")
-            raise
\ No newline at end of file
+    def binarize(self, level=128):
+        """
+        Переводит изображение в чёрно-белое: пиксели с яркостью не меньше level
+        становятся белыми. Полное изображение хранится упакованным (BinaryImage,
+        бит на пиксель), и морфология дальше выполняется над упакованными строками.
+        """
+        self.recipe = self.recipe.then(Step("threshold", level=level))
+        if self.proxy_enabled:
+            self._submit_display(lambda base, size: BinaryImage.from_image(base(), level).convert("L"))
+        self._record("Бинаризация", lambda image: BinaryImage.from_image(image, level))
+
+    def undo(self):
+        """
+        Отменяет последнюю правку: восстанавливает изображение, рецепт и параметры коррекции.
+        :return: False, если отменять нечего
+        """
+        entry = self.history.undo()
+        if entry is not None:
+            self._restore(entry)
+        return entry is not None
+
+    def redo(self):
+        """Повторяет отменённую правку. :return: False, если повторять нечего"""
+        entry = self.history.redo()
+        if entry is not None:
+            self._restore(entry)
+        return entry is not None
+
+    def _restore(self, entry):
+        self.recipe = entry.recipe
+        self.brightness, self.contrast, self.color, self.sharpness, self.mode = entry.settings
+        # Незаконченные правки больше не нужны: при повторе история пересчитает их сама
+        self.cancel_jobs()
+        self.display_img = None
+        # Состояние строится по истории, а не из текущего изображения: его не нужно декодировать
+        job = self.full_job = self.executor.submit(
+            lambda: self.history.image_at(entry), lambda image: self._full_done(job, image, entry), replaceable=True
+        )
+        self.render()
+
+    def round_trip_error(self, model, rgb, planes):
+        """
+        Оценивает ошибку преобразования RGB -> model -> RGB по выборке пикселей.
+        :param rgb: Исходный массив RGB (H, W, 3)
+        :param planes: Тот же массив в модели model
+        :return: Максимальное отклонение в уровнях 0-255
+        """
+        step = max(1, int((rgb.shape[0] * rgb.shape[1] / ROUND_TRIP_SAMPLE_PIXELS) ** 0.5))
+        restored = RGB_ARRAY_INVERSE_CONVERSIONS[model](planes[::step, ::step])
+        restored = np.clip(np.rint(restored), 0, 255)
+        return float(np.abs(restored - rgb[::step, ::step]).max())
+
+    def _edit_planes(self, image, model, edit):
+        """
+        Правка edit изображения image в модели model.
+        :return: (новое изображение в режиме image, ошибка прямого и обратного преобразования)
+        """
+        rgb = np.asarray(image.convert('RGB'))
+        planes = rgb_to_model_array(model, rgb)
+        error = self.round_trip_error(model, rgb, planes)
+
+        edited = edit(planes)
+        if edited is None:
+            edited = planes
+
+        result = RGB_ARRAY_INVERSE_CONVERSIONS[model](edited)
+        result = np.clip(np.rint(result), 0, 255).astype(np.uint8)
+        result = WorkingImage(result, 'RGB', buffers)
+        if image.mode == 'L':
+            result = WorkingImage.from_image(result.convert('L'))
+        return result, error
+
+    def edit_in_model(self, model, edit, callback=None):
+        """
+        Редактирует изображение в другой цветовой модели и возвращает его в RGB.
+        Правка выполняется в фоне после уже запущенной обработки.
+        :param model: Цветовая модель из RGB_ARRAY_CONVERSIONS
+        :param edit: Функция, получающая массив каналов float32 (H, W, N);
+                     может изменить его на месте или вернуть новый массив
+        :param callback: Получает ошибку прямого и обратного преобразования без правки (0-255);
+                         не вызывается, если правку отменили
+        """
+        if model not in RGB_ARRAY_INVERSE_CONVERSIONS:
+            raise ValueError(f"Модель '{model}' не поддерживается")
+        if self.source.out_of_core:
+            raise ValueError("Цветовые модели недоступны для изображений, которые не помещаются в память")
+
+        errors = []
+
+        def apply(image):
+            image, error = self._edit_planes(image, model, edit)
+            errors.append(error)
+            return image
+
+        # Шаг в рецепте отмечает правку: гистограмма после неё считается по пикселям
+        self.recipe = self.recipe.then(Step("model_edit", model=model))
+        entry = self.history.push(
+            model, self.recipe, self._settings(), lambda image: self._edit_planes(image, model, edit)[0]
+        )
+        self.display_img = None
+        self.display_job = None
+        self._submit_full(apply, entry)
+        if callback is not None:
+            # Запрос выполняется после правки; если её отменили, ошибки нет
+            self.submit_with_image(
+                lambda image: errors[0] if errors else None,
+                lambda error: callback(error) if error is not None else None
+            )
+        self.render()
@@ -0,0 +1,73 @@
+# check_binary_image.py
+
+import argparse
+import sys
+
+import numpy as np
+from PIL import Image
+
+from binary_image import WORD_BITS, BinaryImage
+from check_morphology import OPERATIONS, random_kernel, reference
+
+
+def random_mask(rng):
+    """Случайное чёрно-белое изображение uint8 (0 / 255); ширина часто у границы слова"""
+    width = int(rng.choice([rng.integers(1, 200), WORD_BITS * rng.integers(1, 4) + rng.integers(-1, 2)]))
+    height = int(rng.integers(1, 90))
+    density = rng.uniform(0.1, 0.9)
+    return (rng.random((height, width)) < density).astype(np.uint8) * np.uint8(255)
+
+
+def padding_clear(binary):
+    """Биты за правым краем строки должны оставаться нулевыми"""
+    used = binary.width % WORD_BITS
+    return used == 0 or not (binary.words[:, -1] >> np.uint64(used)).any()
+
+
+def check(rounds, seed):
+    """
+    Сравнивает BinaryImage с OpenCV на случайных ядрах, размерах и итерациях,
+    а упаковку - с исходным массивом и PIL.
+    :return: Число расхождений
+    """
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+    for index in range(rounds):
+        array = random_mask(rng)
+        binary = BinaryImage.from_array(array)
+        packed = {
+            "to_array": binary.to_array(),
+            "to_image": np.asarray(binary.to_image().convert("L")),
+            "from_image 1": BinaryImage.from_image(Image.fromarray(array).convert("1")).to_array(),
+            "from_image L": BinaryImage.from_image(Image.fromarray(array)).to_array(),
+        }
+        for name, result in packed.items():
+            if not np.array_equal(result, array):
+                mismatches += 1
+                print(f"Расхождение ({name}) в раунде {index}: массив {array.shape}")
+
+        matrix = random_kernel(rng)
+        operation = OPERATIONS[rng.integers(0, len(OPERATIONS))]
+        iterations = int(rng.integers(1, 4))
+        result = binary.morph(operation, matrix, iterations)
+        if not padding_clear(result) or not np.array_equal(
+                result.to_array(), reference(array, operation, matrix, iterations)):
+            mismatches += 1
+            print(f"Расхождение (morph) в раунде {index}: {operation}, итераций {iterations}, "
+                  f"массив {array.shape}, ядро {matrix.shape}")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка binary_image.py на совпадение с OpenCV до бита")
+    parser.add_argument("--rounds", type=int, default=2000, help="Число случайных проверок")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches = check(args.rounds, args.seed)
+    print(f"Проверок: {args.rounds}, расхождений: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# check_histogram.py
+
+import argparse
+import sys
+import time
+import tkinter as tk
+
+import numpy as np
+
+from canvas_manager import CanvasManager
+from color_conversion import HSV
+from histogram import measure_histograms
+
+
+def wait(root, manager, results, count, timeout=60):
+    """Обрабатывает события Tk, пока не придут count результатов и обработка не закончится"""
+    end = time.monotonic() + timeout
+    while len(results) < count or manager.executor.busy():
+        if time.monotonic() > end:
+            raise TimeoutError("Обработка не закончилась")
+        root.update()
+        time.sleep(0.01)
+
+
+def compare(root, manager, label):
+    """
+    Сравнивает гистограмму, которую показывает интерфейс (request_histogram),
+    с гистограммой изображения на экране.
+    :return: True, если они совпадают
+    """
+    results = []
+    manager.request_histogram(lambda estimate: results.append(estimate))
+    manager.submit_with_image(measure_histograms, lambda estimate: results.append(estimate))
+    wait(root, manager, results, 2)
+    shown, expected = results
+    difference = np.abs(np.asarray(shown.counts) - np.asarray(expected.counts)).max()
+    print(f"{label}: наибольшее расхождение столбца {difference:g}")
+    return difference == 0
+
+
+def check(file_path):
+    """
+    Гистограмма после поточечной коррекции (выводится из гистограмм исходного
+    изображения) и после правки в цветовой модели (считается по пикселям)
+    должна совпасть с гистограммой получившегося изображения.
+    :return: Число расхождений
+    """
+    root = tk.Tk()
+    root.withdraw()
+    canvas = tk.Canvas(root, width=800, height=600)
+    manager = CanvasManager(canvas)
+    manager.load_image(file_path)
+    mismatches = 0
+
+    manager.change_image(1.3, 0.8, 1.0, 1.0, "RGB")
+    mismatches += not compare(root, manager, "Коррекция")
+
+    def darken(planes):
+        planes[:, :, 2] *= 0.5
+
+    errors = []
+    manager.edit_in_model(HSV, darken, errors.append)
+    wait(root, manager, errors, 1)
+    mismatches += not compare(root, manager, "Правка V в HSV")
+
+    manager.undo()
+    mismatches += not compare(root, manager, "Отмена правки")
+    root.destroy()
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка гистограммы интерфейса после правок")
+    parser.add_argument("image", nargs="?", default="image.jpg", help="Файл изображения")
+    args = parser.parse_args(argv)
+
+    mismatches = check(args.image)
+    print(f"Расхождений: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# check_morphology.py
+
+import argparse
+import sys
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import morphology
+from morphology import MORPH_OPERATIONS, morph_array, morph_pil
+
+# Операции интерфейса и их эталон в OpenCV
+OPERATIONS = ("Erosion", "Dilation", *MORPH_OPERATIONS)
+
+
+def reference(array, operation, matrix, iterations):
+    """Результат OpenCV, с которым должен совпасть morph_array"""
+    if operation == "Erosion":
+        return cv2.erode(array, matrix, iterations=iterations)
+    if operation == "Dilation":
+        return cv2.dilate(array, matrix, iterations=iterations)
+    return cv2.morphologyEx(array, MORPH_OPERATIONS[operation], matrix, iterations=iterations)
+
+
+def random_kernel(rng):
+    """Случайное ядро: готовые формы OpenCV, линии, смещённые прямоугольники и шум"""
+    height, width = rng.integers(1, 16, 2)
+    kind = rng.integers(0, 6)
+    if kind == 0:
+        return np.ones((height, width), dtype=np.uint8)
+    if kind == 1:
+        return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (int(width), int(height)))
+    if kind == 2:
+        return cv2.getStructuringElement(cv2.MORPH_CROSS, (int(width), int(height)))
+    if kind == 3:
+        # Длинная линия - проход ван Херка - Гил - Вермана
+        length = int(rng.integers(2, 80))
+        return np.ones((1, length) if rng.integers(0, 2) else (length, 1), dtype=np.uint8)
+    matrix = np.zeros((height, width), dtype=np.uint8)
+    if kind == 4:
+        # Прямоугольник не в центре ядра
+        top, left = rng.integers(0, height), rng.integers(0, width)
+        matrix[top:rng.integers(top + 1, height + 1), left:rng.integers(left + 1, width + 1)] = 1
+        return matrix
+    return (rng.random((height, width)) < rng.uniform(0.2, 0.8)).astype(np.uint8)
+
+
+def random_array(rng):
+    """Случайный массив uint8 (H, W) или (H, W, C), в том числе меньше ядра"""
+    shape = tuple(int(value) for value in rng.integers(1, 90, 2))
+    channels = rng.choice([0, 1, 3, 4])
+    if channels:
+        shape += (int(channels),)
+    return rng.integers(0, 256, shape, dtype=np.uint8)
+
+
+def check(rounds, seed):
+    """
+    Сравнивает morph_array и morph_pil с OpenCV на случайных ядрах, размерах и итерациях.
+    :return: Число расхождений
+    """
+    rng = np.random.default_rng(seed)
+    vhgw_length = morphology.MORPH_VHGW_LENGTH
+    mismatches = 0
+    try:
+        for index in range(rounds):
+            # Каждый второй раунд ван Херк - Гил - Верман включается и на коротких отрезках
+            morphology.MORPH_VHGW_LENGTH = vhgw_length if index % 2 else 2
+            array, matrix = random_array(rng), random_kernel(rng)
+            operation = OPERATIONS[rng.integers(0, len(OPERATIONS))]
+            iterations = int(rng.integers(1, 4))
+            # OpenCV возвращает (H, W) для массива (H, W, 1)
+            expected = reference(array, operation, matrix, iterations).reshape(array.shape)
+
+            results = {"morph_array": morph_array(array, operation, matrix, iterations)}
+            out = np.empty_like(array)
+            results["out="] = morph_array(array, operation, matrix, iterations, out=out)
+            if results["out="] is not out:
+                results["out="] = None
+            if array.ndim == 2 or array.shape[2] == 3:
+                results["morph_pil"] = np.asarray(morph_pil(Image.fromarray(array), operation, matrix, iterations))
+
+            for name, result in results.items():
+                if result is None or result.shape != expected.shape or not np.array_equal(result, expected):
+                    mismatches += 1
+                    print(f"Расхождение ({name}) в раунде {index}: {operation}, итераций {iterations}, "
+                          f"массив {array.shape}, ядро {matrix.shape}")
+    finally:
+        morphology.MORPH_VHGW_LENGTH = vhgw_length
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка morphology.py на совпадение с OpenCV до бита")
+    parser.add_argument("--rounds", type=int, default=2000, help="Число случайных проверок")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches = check(args.rounds, args.seed)
+    print(f"Проверок: {args.rounds}, расхождений: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# check_recipe.py
+
+import argparse
+import sys
+
+import numpy as np
+from PIL import Image
+
+from recipe import Recipe, Step, execute
+
+# Отклонение оптимизированного плана от пошагового выполнения: перенос и слияние
+# шагов совпадают с исходным порядком с точностью до округления, а следующие шаги
+# с множителем больше 1 это отклонение усиливают (см. _gain)
+TOLERANCE = 2
+
+# Доля значений, которым в рецептах с порогом разрешено отклониться сильнее: порог
+# переводит разницу в одну единицу в 0 / 255, а следующая резкость разносит её по соседям
+THRESHOLD_OUTLIER_SHARE = 0.1
+
+# Множители: 0-1 - без выхода за 0-255 (такие шаги переносятся и сливаются), больше 1 - с обрезкой
+FACTORS = (0.0, 0.3, 0.5, 1.0, 1.4, 2.0)
+
+
+# Рецепты, на которых план раньше ломался: повторные переходы L / RGB
+# (перенос шагов за "L" укорачивал список на ходу) и смена режима после порога
+REGRESSIONS = (
+    Recipe([Step("color", factor=0.5), Step("mode", mode="L"), Step("mode", mode="RGB"), Step("mode", mode="L")]),
+    Recipe([Step("brightness", factor=0.5), Step("color", factor=0.3), Step("mode", mode="L"),
+            Step("mode", mode="RGB"), Step("contrast", factor=0.7), Step("color", factor=0.0),
+            Step("mode", mode="L"), Step("mode", mode="RGB"), Step("mode", mode="L")]),
+    Recipe([Step("threshold", level=100), Step("mode", mode="RGB")]),
+)
+
+
+def random_step(rng):
+    """Случайный шаг коррекции, смены режима или порога; переходы L / RGB - чаще остальных"""
+    kind = rng.choice(("brightness", "contrast", "color", "sharpness", "mode", "mode", "mode", "threshold"))
+    if kind == "mode":
+        return Step("mode", mode=str(rng.choice(("L", "RGB"))))
+    if kind == "threshold":
+        return Step("threshold", level=int(rng.integers(1, 255)))
+    return Step(str(kind), factor=float(rng.choice(FACTORS)))
+
+
+def _gain(recipe):
+    # Во сколько раз шаги рецепта могут усилить ошибку округления
+    gain = 1.0
+    for step in recipe.steps:
+        factor = step.params.get("factor", 1.0)
+        # Резкость добавляет к пикселю (factor - 1) его отличия от размытого
+        gain *= max(1.0, 2 * factor - 1 if step.op == "sharpness" else factor)
+    return gain
+
+
+def step_by_step(recipe, image):
+    """Рецепт, выполненный по одному шагу, без переноса и слияния шагов"""
+    for step in recipe.steps:
+        image = execute(Recipe([step]), image)
+    return image
+
+
+def check(rounds, seed):
+    """
+    Выполняет рецепты REGRESSIONS и случайные рецепты (в том числе с повторными
+    переходами L / RGB) по плану и по шагам и сравнивает результаты.
+    :return: Число расхождений
+    """
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+    for index in range(rounds):
+        shape = (int(rng.integers(1, 60)), int(rng.integers(1, 60)))
+        mode = str(rng.choice(("L", "RGB", "RGBA")))
+        channels = {"L": (), "RGB": (3,), "RGBA": (4,)}[mode]
+        image = Image.fromarray(rng.integers(0, 256, shape + channels, dtype=np.uint8), mode)
+        recipe = Recipe([random_step(rng) for _ in range(rng.integers(1, 9))])
+        if index < len(REGRESSIONS):
+            recipe = REGRESSIONS[index]
+        try:
+            planned = execute(recipe, image)
+        except Exception as error:
+            mismatches += 1
+            print(f"Ошибка в раунде {index} ({mode}): {error!r}\n{recipe}")
+            continue
+        expected = step_by_step(recipe, image)
+        if planned.mode != expected.mode:
+            mismatches += 1
+            print(f"Разные режимы в раунде {index} ({mode} -> {planned.mode} / {expected.mode}):\n{recipe}")
+            continue
+        difference = np.abs(np.asarray(planned, dtype=np.int16) - np.asarray(expected, dtype=np.int16))
+        outliers = int((difference > TOLERANCE * _gain(recipe)).sum())
+        allowed = max(1, THRESHOLD_OUTLIER_SHARE * difference.size) \
+            if any(step.op == "threshold" for step in recipe.steps) else 0
+        if outliers > allowed:
+            mismatches += 1
+            print(f"Расхождение в раунде {index} ({mode}): {outliers} из {difference.size} значений\n{recipe}")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка плана рецепта против пошагового выполнения")
+    parser.add_argument("--rounds", type=int, default=2000, help="Число случайных проверок")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches = check(args.rounds, args.seed)
+    print(f"Проверок: {args.rounds}, расхождений: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
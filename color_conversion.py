@@ -1,5 +1,7 @@
 # color_conversion.py
 
+import numpy as np
+
 RGB = "RGB" 
 HSV = "HSV"
 HSL = "HSL"
@@ -7,6 +9,7 @@ CMY = "CMY"
 CMYK = "CMYK"
 XYZ = "XYZ"
 YCBCR = "YCbCr"
+YCBCR_BT709 = "YCbCr_BT709"
 SRGB = "sRGB"
 HUNTER_LAB = "HUNTER_LAB"
 LAB = "LAB"
@@ -318,4 +321,598 @@ RGB_CONVERSIONS = {
     LAB: rgb_to_cie_lab,
     HUNTER_LAB: rgb_to_hunter_lab,
     YCBCR: rgb_to_ycbcr,
-}
\ No newline at end of file
+}
+
+
+# Векторные версии преобразований для целого изображения.
+# Принимают массив формы (..., 3) со значениями 0 ÷ 255 (обычно HxWx3 uint8)
+# и возвращают массив float32 формы (..., N), где N - число каналов модели.
+# Внутри считаются в float64 теми же формулами и в том же порядке операций,
+# что и скалярные функции выше, поэтому результаты совпадают с ними
+# с точностью до округления в float32.
+
+# Количество пикселей, обрабатываемых за один проход (ограничивает размер
+# временных массивов и держит их в кэше процессора)
+ARRAY_CHUNK_PIXELS = 1 << 18
+
+
+def _map_pixels(kernel, pixels, channels, in_channels=3, float32_uint8=False):
+    """
+    Применяет kernel к массиву пикселей по частям.
+    :param kernel: Функция (R, G, B) -> кортеж из channels плоскостей,
+                   R, G, B - непрерывные float64 (или float32, см. float32_uint8)
+                   массивы одного куска
+    :param pixels: Массив формы (..., in_channels)
+    :param channels: Количество выходных каналов
+    :param in_channels: Количество входных каналов
+    :param float32_uint8: Передавать kernel плоскости float32, если pixels - uint8
+                          (целые 0 ÷ 255 во float32 точны)
+    :return: Массив float32 формы (..., channels)
+    """
+    pixels = np.asarray(pixels)
+    if pixels.shape[-1] != in_channels:
+        raise ValueError(f"Ожидается массив формы (..., {in_channels}), получен {pixels.shape}")
+    dtype = np.float32 if float32_uint8 and pixels.dtype == np.uint8 else np.float64
+
+    flat = pixels.reshape(-1, in_channels)
+    out = np.empty((flat.shape[0], channels), dtype=np.float32)
+    for start in range(0, flat.shape[0], ARRAY_CHUNK_PIXELS):
+        stop = start + ARRAY_CHUNK_PIXELS
+        # Раскладываем кусок по плоскостям: операции над непрерывными
+        # массивами в разы быстрее, чем над столбцами с шагом
+        planes = np.ascontiguousarray(flat[start:stop].T, dtype=dtype)
+        for i, plane in enumerate(kernel(*planes)):
+            out[start:stop, i] = plane
+    return out.reshape(pixels.shape[:-1] + (channels,))
+
+
+# Выбор значений по маскам сделан арифметикой (mask * value), а не np.where:
+# для конечных значений x + 0.0 == x, поэтому результат тот же, а на
+# шумных изображениях это заметно быстрее ветвлений.
+
+def _hue(R, G, B, var_Max, del_Max, is_gray):
+    # Тот же оттенок, что и в rgb_to_hsv / rgb_to_hsl, в единицах 0 ÷ 255:
+    # при максимуме R H = (G - B) / 6Δ, при G - (B - R + 2Δ) / 6Δ, при B - (R - G + 4Δ) / 6Δ.
+    # Числитель выбирается арифметикой на месте (для целых он точен), затем одно деление
+    is_R = R == var_Max
+    is_G = G == var_Max
+    is_G &= ~is_R
+
+    H = R - G
+    H += 4 * del_Max
+    other = B - R
+    other += 2 * del_Max
+    other -= H
+    other *= is_G
+    H += other
+    other = G - B
+    other -= H
+    other *= is_R
+    H += other
+
+    # У серого максимум в R и G - B = 0, поэтому H = 0
+    scale = 6 * del_Max
+    scale += is_gray
+    H /= scale
+    H += H < 0
+    return H
+
+
+# Ядра HSV и HSL работают в единицах 0 ÷ 255 и делят на 255 только результат:
+# так на кусок приходится меньше временных массивов, а для uint8 они считаются во float32
+
+def _rgb_to_hsv_kernel(R, G, B):
+    var_Max = np.maximum(R, G)
+    np.maximum(var_Max, B, out=var_Max)
+    del_Max = np.minimum(R, G)
+    np.minimum(del_Max, B, out=del_Max)
+    np.subtract(var_Max, del_Max, out=del_Max)
+    is_gray = del_Max == 0
+
+    H = _hue(R, G, B, var_Max, del_Max, is_gray)
+    S = del_Max
+    S /= var_Max + is_gray
+    V = var_Max
+    V /= 255
+
+    return H, S, V
+
+
+def _rgb_to_hsl_kernel(R, G, B):
+    var_Max = np.maximum(R, G)
+    np.maximum(var_Max, B, out=var_Max)
+    var_Min = np.minimum(R, G)
+    np.minimum(var_Min, B, out=var_Min)
+    del_Max = var_Max - var_Min
+    is_gray = del_Max == 0
+
+    H = _hue(R, G, B, var_Max, del_Max, is_gray)
+
+    # L < 0.5: S = Δ / (max + min), иначе Δ / (2 - max - min); в единицах 0 ÷ 255 это
+    # деление на меньшее из (max + min) и (510 - max - min)
+    L = var_Max
+    L += var_Min
+    denominator = np.minimum(L, 510 - L)
+    denominator += is_gray
+    S = del_Max
+    S /= denominator
+    L /= 510
+
+    return H, S, L
+
+
+def _rgb_to_cmy_kernel(R, G, B):
+    C = 1 - (R / 255)
+    M = 1 - (G / 255)
+    Y = 1 - (B / 255)
+    return C, M, Y
+
+
+def _cmy_to_cmyk_kernel(C, M, Y):
+    var_K = np.minimum(np.minimum(C, M), Y)
+    is_black = var_K == 1
+    not_black = ~is_black
+    scale = (1 - var_K) + is_black
+
+    C = not_black * ((C - var_K) / scale)
+    M = not_black * ((M - var_K) / scale)
+    Y = not_black * ((Y - var_K) / scale)
+
+    return C, M, Y, var_K
+
+
+def _rgb_to_cmyk_kernel(R, G, B):
+    return _cmy_to_cmyk_kernel(*_rgb_to_cmy_kernel(R, G, B))
+
+
+def _srgb_channel_to_linear(value):
+    # Тот же расчёт, что и в srgb_to_xyz для одного канала (0 ÷ 255 -> 0 ÷ 100)
+    var = value / 255
+    if var > 0.04045:
+        var = ((var + 0.055) / 1.055) ** 2.4
+    else:
+        var = var / 12.92
+    return var * 100
+
+
+# Матрица sRGB -> XYZ из srgb_to_xyz и обратная к ней
+SRGB_TO_XYZ_MATRIX = np.array([
+    [0.4124, 0.3576, 0.1805],
+    [0.2126, 0.7152, 0.0722],
+    [0.0193, 0.1192, 0.9505],
+])
+XYZ_TO_SRGB_MATRIX = np.linalg.inv(SRGB_TO_XYZ_MATRIX)
+
+# Матрицы RGB -> YCbCr из rgb_to_ycbcr и rgb_to_ycbcr_bt709 (без смещения 128)
+YCBCR_BT601_MATRIX = np.array([
+    [0.299, 0.587, 0.114],
+    [-0.168736, -0.331264, 0.5],
+    [0.5, -0.418688, -0.081312],
+])
+YCBCR_BT709_MATRIX = np.array([
+    [0.2126, 0.7152, 0.0722],
+    [-0.114572, -0.385428, 0.5],
+    [0.5, -0.454153, -0.045847],
+])
+
+# Линеаризация sRGB для всех 256 значений канала, вычисляется один раз.
+# Значения побитово совпадают со скалярной srgb_to_xyz.
+SRGB_LINEAR_TABLE = np.array([_srgb_channel_to_linear(value) for value in range(256)])
+
+
+def _srgb_to_xyz_kernel(R, G, B):
+    var_R = SRGB_LINEAR_TABLE[R.astype(np.intp)]
+    var_G = SRGB_LINEAR_TABLE[G.astype(np.intp)]
+    var_B = SRGB_LINEAR_TABLE[B.astype(np.intp)]
+
+    X = var_R * 0.4124 + var_G * 0.3576 + var_B * 0.1805
+    Y = var_R * 0.2126 + var_G * 0.7152 + var_B * 0.0722
+    Z = var_R * 0.0193 + var_G * 0.1192 + var_B * 0.9505
+
+    return X, Y, Z
+
+
+def _xyz_to_lab_kernel(X, Y, Z, Reference_X, Reference_Y, Reference_Z):
+    def f(t):
+        is_linear = t <= 0.008856
+        # abs() только чтобы не получить nan для отрицательных t в неиспользуемой ветке
+        return is_linear * ((7.787 * t) + (16 / 116)) + ~is_linear * (np.abs(t) ** (1 / 3))
+
+    var_X = f(X / Reference_X)
+    var_Y = f(Y / Reference_Y)
+    var_Z = f(Z / Reference_Z)
+
+    CIE_L = (116 * var_Y) - 16
+    CIE_a = 500 * (var_X - var_Y)
+    CIE_b = 200 * (var_Y - var_Z)
+
+    return CIE_L, CIE_a, CIE_b
+
+
+def _xyz_to_hunter_lab_kernel(X, Y, Z, Reference_X, Reference_Y, Reference_Z):
+    var_Ka = (175.0 / 198.04) * (Reference_Y + Reference_X)
+    var_Kb = (70.0 / 218.11) * (Reference_Y + Reference_Z)
+
+    root_Y = (Y / Reference_Y) ** 0.5
+    # Для чёрного (Y = 0) скалярная версия падает с ZeroDivisionError,
+    # здесь в этом случае a = b = 0
+    is_black = root_Y == 0
+    safe_root_Y = root_Y + is_black
+
+    Hunter_L = 100.0 * root_Y
+    Hunter_a = var_Ka * (((X / Reference_X) - (Y / Reference_Y)) / safe_root_Y)
+    Hunter_b = var_Kb * (((Y / Reference_Y) - (Z / Reference_Z)) / safe_root_Y)
+
+    return Hunter_L, Hunter_a * ~is_black, Hunter_b * ~is_black
+
+
+def _clip_ycbcr(Y, Cb, Cr):
+    # Ограничение значений Y, Cb, Cr в диапазоне 0-255 (с усечением, как int())
+    return tuple(np.clip(np.trunc(plane), 0, 255) for plane in (Y, Cb, Cr))
+
+
+def _rgb_to_ycbcr_kernel(R, G, B):
+    Y = 0.299 * R + 0.587 * G + 0.114 * B
+    Cb = -0.168736 * R - 0.331264 * G + 0.5 * B + 128
+    Cr = 0.5 * R - 0.418688 * G - 0.081312 * B + 128
+    return _clip_ycbcr(Y, Cb, Cr)
+
+
+def _rgb_to_ycbcr_bt709_kernel(R, G, B):
+    Y = 0.2126 * R + 0.7152 * G + 0.0722 * B
+    Cb = -0.114572 * R - 0.385428 * G + 0.5 * B + 128
+    Cr = 0.5 * R - 0.454153 * G - 0.045847 * B + 128
+    return _clip_ycbcr(Y, Cb, Cr)
+
+
+def rgb_to_hsv_array(rgb):
+    """
+    Преобразует массив RGB в HSV.
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с H, S, V в диапазоне 0 ÷ 1.0
+    """
+    return _map_pixels(_rgb_to_hsv_kernel, rgb, 3, float32_uint8=True)
+
+
+def rgb_to_hsl_array(rgb):
+    """
+    Преобразует массив RGB в HSL.
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с H, S, L в диапазоне 0 ÷ 1.0
+    """
+    return _map_pixels(_rgb_to_hsl_kernel, rgb, 3, float32_uint8=True)
+
+
+def rgb_to_cmy_array(rgb):
+    """
+    Преобразует массив RGB в CMY.
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с C, M, Y в диапазоне 0 ÷ 1.0
+    """
+    return _map_pixels(_rgb_to_cmy_kernel, rgb, 3)
+
+
+def cmy_to_cmyk_array(cmy):
+    """
+    Преобразует массив CMY в CMYK.
+    :param cmy: Массив формы (..., 3) с C, M, Y в диапазоне 0 ÷ 1.0
+    :return: Массив float32 формы (..., 4) с C, M, Y, K в диапазоне 0 ÷ 1.0
+    """
+    return _map_pixels(_cmy_to_cmyk_kernel, cmy, 4)
+
+
+def rgb_to_cmyk_array(rgb):
+    """
+    Преобразует массив RGB в CMYK.
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 4) с C, M, Y, K в диапазоне 0 ÷ 1.0
+    """
+    return _map_pixels(_rgb_to_cmyk_kernel, rgb, 4)
+
+
+def srgb_to_xyz_array(rgb):
+    """
+    Преобразует массив sRGB в XYZ.
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с X, Y, Z
+    """
+    return _map_pixels(_srgb_to_xyz_kernel, rgb, 3)
+
+
+def xyz_to_lab_array(xyz, Reference_X, Reference_Y, Reference_Z):
+    """
+    Преобразует массив XYZ в CIE Lab.
+    :param xyz: Массив формы (..., 3) с X, Y, Z
+    :return: Массив float32 формы (..., 3) с L, a, b
+    """
+    return _map_pixels(
+        lambda X, Y, Z: _xyz_to_lab_kernel(X, Y, Z, Reference_X, Reference_Y, Reference_Z),
+        xyz, 3)
+
+
+def xyz_to_hunter_lab_array(xyz, Reference_X, Reference_Y, Reference_Z):
+    """
+    Преобразует массив XYZ в Hunter Lab.
+    :param xyz: Массив формы (..., 3) с X, Y, Z
+    :return: Массив float32 формы (..., 3) с L, a, b
+    """
+    return _map_pixels(
+        lambda X, Y, Z: _xyz_to_hunter_lab_kernel(X, Y, Z, Reference_X, Reference_Y, Reference_Z),
+        xyz, 3)
+
+
+def rgb_to_cie_lab_array(rgb):
+    """
+    Преобразует массив RGB в CIE Lab (источник A, наблюдатель 2°).
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с L, a, b
+    """
+    reference = reference_values["A"]["2°"]
+    return _map_pixels(
+        lambda R, G, B: _xyz_to_lab_kernel(*_srgb_to_xyz_kernel(R, G, B),
+                                         reference["X"], reference["Y"], reference["Z"]),
+        rgb, 3)
+
+
+def rgb_to_hunter_lab_array(rgb):
+    """
+    Преобразует массив RGB в Hunter Lab (источник A, наблюдатель 2°).
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с L, a, b
+    """
+    reference = reference_values["A"]["2°"]
+    return _map_pixels(
+        lambda R, G, B: _xyz_to_hunter_lab_kernel(*_srgb_to_xyz_kernel(R, G, B),
+                                                reference["X"], reference["Y"], reference["Z"]),
+        rgb, 3)
+
+
+def rgb_to_ycbcr_array(rgb):
+    """
+    Преобразует массив RGB в YCbCr по стандарту ITU-R BT.601.
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с целыми Y, Cb, Cr в диапазоне 0-255
+    """
+    return _map_pixels(_rgb_to_ycbcr_kernel, rgb, 3)
+
+
+def rgb_to_ycbcr_bt709_array(rgb):
+    """
+    Преобразует массив RGB в YCbCr по стандарту ITU-R BT.709.
+    :param rgb: Массив формы (..., 3) со значениями 0 ÷ 255
+    :return: Массив float32 формы (..., 3) с целыми Y, Cb, Cr в диапазоне 0-255
+    """
+    return _map_pixels(_rgb_to_ycbcr_bt709_kernel, rgb, 3)
+
+
+RGB_ARRAY_CONVERSIONS = {
+    CMYK: rgb_to_cmyk_array,
+    HSL: rgb_to_hsl_array,
+    HSV: rgb_to_hsv_array,
+    LAB: rgb_to_cie_lab_array,
+    HUNTER_LAB: rgb_to_hunter_lab_array,
+    YCBCR: rgb_to_ycbcr_array,
+}
+
+
+# Обратные преобразования в RGB для массивов.
+# Принимают массив float формы (..., N) в тех же единицах, что возвращают
+# прямые *_array функции, и возвращают массив float32 формы (..., 3)
+# с R, G, B в диапазоне 0 ÷ 255 (без округления и ограничения).
+
+def _hsv_to_rgb_kernel(H, S, V):
+    var_h = H * 6
+    var_h = var_h * (var_h != 6)        # H = 1 соответствует H = 0
+    var_i = np.floor(var_h)
+    var_1 = V * (1 - S)
+    var_2 = V * (1 - S * (var_h - var_i))
+    var_3 = V * (1 - S * (1 - (var_h - var_i)))
+
+    sector = np.clip(var_i, 0, 5).astype(np.intp)
+    var_R = np.choose(sector, (V, var_2, var_1, var_1, var_3, V))
+    var_G = np.choose(sector, (var_3, V, V, var_2, var_1, var_1))
+    var_B = np.choose(sector, (var_1, var_1, var_3, V, V, var_2))
+
+    # Если S == 0, это оттенок серого
+    is_gray = S == 0
+    var_R = var_R * ~is_gray + V * is_gray
+    var_G = var_G * ~is_gray + V * is_gray
+    var_B = var_B * ~is_gray + V * is_gray
+
+    return var_R * 255, var_G * 255, var_B * 255
+
+
+def _hue_to_rgb(var_1, var_2, var_H):
+    var_H = var_H % 1
+    result = var_1 + (var_2 - var_1) * ((2 / 3) - var_H) * 6
+    result = np.where(3 * var_H < 2, result, var_1)
+    result = np.where(2 * var_H < 1, var_2, result)
+    return np.where(6 * var_H < 1, var_1 + (var_2 - var_1) * 6 * var_H, result)
+
+
+def _hsl_to_rgb_kernel(H, S, L):
+    var_2 = np.where(L < 0.5, L * (1 + S), (L + S) - (S * L))
+    var_1 = 2 * L - var_2
+
+    is_gray = S == 0
+    R = _hue_to_rgb(var_1, var_2, H + (1 / 3))
+    G = _hue_to_rgb(var_1, var_2, H)
+    B = _hue_to_rgb(var_1, var_2, H - (1 / 3))
+
+    return tuple((plane * ~is_gray + L * is_gray) * 255 for plane in (R, G, B))
+
+
+def _cmy_to_rgb_kernel(C, M, Y):
+    return (1 - C) * 255, (1 - M) * 255, (1 - Y) * 255
+
+
+def _cmyk_to_rgb_kernel(C, M, Y, K):
+    return _cmy_to_rgb_kernel(*(plane * (1 - K) + K for plane in (C, M, Y)))
+
+
+def _xyz_to_srgb_kernel(X, Y, Z):
+    var = [sum(coefficient * value for coefficient, value in zip(row, (X, Y, Z))) / 100
+           for row in XYZ_TO_SRGB_MATRIX]
+
+    def delinearize(v):
+        is_linear = v <= 0.0031308
+        return is_linear * (12.92 * v) + ~is_linear * (1.055 * np.abs(v) ** (1 / 2.4) - 0.055)
+
+    return tuple(delinearize(v) * 255 for v in var)
+
+
+def _lab_to_xyz_kernel(CIE_L, CIE_a, CIE_b, Reference_X, Reference_Y, Reference_Z):
+    var_Y = (CIE_L + 16) / 116
+    var_X = CIE_a / 500 + var_Y
+    var_Z = var_Y - CIE_b / 200
+
+    def f_inverse(t):
+        cube = t ** 3
+        return np.where(cube > 0.008856, cube, (t - 16 / 116) / 7.787)
+
+    return (f_inverse(var_X) * Reference_X,
+            f_inverse(var_Y) * Reference_Y,
+            f_inverse(var_Z) * Reference_Z)
+
+
+def _hunter_lab_to_xyz_kernel(Hunter_L, Hunter_a, Hunter_b, Reference_X, Reference_Y, Reference_Z):
+    var_Ka = (175.0 / 198.04) * (Reference_Y + Reference_X)
+    var_Kb = (70.0 / 218.11) * (Reference_Y + Reference_Z)
+
+    root_Y = Hunter_L / 100.0
+    var_Y = root_Y ** 2
+    var_X = Hunter_a * root_Y / var_Ka + var_Y
+    var_Z = var_Y - Hunter_b * root_Y / var_Kb
+
+    return var_X * Reference_X, var_Y * Reference_Y, var_Z * Reference_Z
+
+
+def _ycbcr_to_rgb_kernel(matrix):
+    inverse = np.linalg.inv(matrix)
+
+    def kernel(Y, Cb, Cr):
+        planes = (Y, Cb - 128, Cr - 128)
+        return tuple(sum(coefficient * value for coefficient, value in zip(row, planes))
+                     for row in inverse)
+    return kernel
+
+
+def hsv_to_rgb_array(hsv):
+    """
+    Преобразует массив HSV в RGB.
+    :param hsv: Массив формы (..., 3) с H, S, V в диапазоне 0 ÷ 1.0
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    return _map_pixels(_hsv_to_rgb_kernel, hsv, 3)
+
+
+def hsl_to_rgb_array(hsl):
+    """
+    Преобразует массив HSL в RGB.
+    :param hsl: Массив формы (..., 3) с H, S, L в диапазоне 0 ÷ 1.0
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    return _map_pixels(_hsl_to_rgb_kernel, hsl, 3)
+
+
+def cmy_to_rgb_array(cmy):
+    """
+    Преобразует массив CMY в RGB.
+    :param cmy: Массив формы (..., 3) с C, M, Y в диапазоне 0 ÷ 1.0
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    return _map_pixels(_cmy_to_rgb_kernel, cmy, 3)
+
+
+def cmyk_to_rgb_array(cmyk):
+    """
+    Преобразует массив CMYK в RGB.
+    :param cmyk: Массив формы (..., 4) с C, M, Y, K в диапазоне 0 ÷ 1.0
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    return _map_pixels(_cmyk_to_rgb_kernel, cmyk, 3, in_channels=4)
+
+
+def xyz_to_srgb_array(xyz):
+    """
+    Преобразует массив XYZ в sRGB.
+    :param xyz: Массив формы (..., 3) с X, Y, Z
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    return _map_pixels(_xyz_to_srgb_kernel, xyz, 3)
+
+
+def lab_to_xyz_array(lab, Reference_X, Reference_Y, Reference_Z):
+    """
+    Преобразует массив CIE Lab в XYZ.
+    :param lab: Массив формы (..., 3) с L, a, b
+    :return: Массив float32 формы (..., 3) с X, Y, Z
+    """
+    return _map_pixels(
+        lambda L, a, b: _lab_to_xyz_kernel(L, a, b, Reference_X, Reference_Y, Reference_Z),
+        lab, 3)
+
+
+def hunter_lab_to_xyz_array(lab, Reference_X, Reference_Y, Reference_Z):
+    """
+    Преобразует массив Hunter Lab в XYZ.
+    :param lab: Массив формы (..., 3) с L, a, b
+    :return: Массив float32 формы (..., 3) с X, Y, Z
+    """
+    return _map_pixels(
+        lambda L, a, b: _hunter_lab_to_xyz_kernel(L, a, b, Reference_X, Reference_Y, Reference_Z),
+        lab, 3)
+
+
+def cie_lab_to_rgb_array(lab):
+    """
+    Преобразует массив CIE Lab (источник A, наблюдатель 2°) в RGB.
+    :param lab: Массив формы (..., 3) с L, a, b
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    reference = reference_values["A"]["2°"]
+    return _map_pixels(
+        lambda L, a, b: _xyz_to_srgb_kernel(*_lab_to_xyz_kernel(
+            L, a, b, reference["X"], reference["Y"], reference["Z"])),
+        lab, 3)
+
+
+def hunter_lab_to_rgb_array(lab):
+    """
+    Преобразует массив Hunter Lab (источник A, наблюдатель 2°) в RGB.
+    :param lab: Массив формы (..., 3) с L, a, b
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    reference = reference_values["A"]["2°"]
+    return _map_pixels(
+        lambda L, a, b: _xyz_to_srgb_kernel(*_hunter_lab_to_xyz_kernel(
+            L, a, b, reference["X"], reference["Y"], reference["Z"])),
+        lab, 3)
+
+
+def ycbcr_to_rgb_array(ycbcr):
+    """
+    Преобразует массив YCbCr (ITU-R BT.601) в RGB.
+    :param ycbcr: Массив формы (..., 3) с Y, Cb, Cr в диапазоне 0-255
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    return _map_pixels(_ycbcr_to_rgb_kernel(YCBCR_BT601_MATRIX), ycbcr, 3)
+
+
+def ycbcr_bt709_to_rgb_array(ycbcr):
+    """
+    Преобразует массив YCbCr (ITU-R BT.709) в RGB.
+    :param ycbcr: Массив формы (..., 3) с Y, Cb, Cr в диапазоне 0-255
+    :return: Массив float32 формы (..., 3) со значениями 0 ÷ 255
+    """
+    return _map_pixels(_ycbcr_to_rgb_kernel(YCBCR_BT709_MATRIX), ycbcr, 3)
+
+
+RGB_ARRAY_INVERSE_CONVERSIONS = {
+    CMYK: cmyk_to_rgb_array,
+    HSL: hsl_to_rgb_array,
+    HSV: hsv_to_rgb_array,
+    LAB: cie_lab_to_rgb_array,
+    HUNTER_LAB: hunter_lab_to_rgb_array,
+    YCBCR: ycbcr_to_rgb_array,
+}
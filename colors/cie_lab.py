@@ -1,4 +1,10 @@
+from colors.color_array import ColorArray
+from color_conversion import cie_lab_to_rgb_array
+
+
 class CieLab:
+    __slots__ = ("L", "A", "B")
+
     def __init__(self, L, A, B):
         """
         Инициализация класса CieLab
@@ -8,4 +14,18 @@ class CieLab:
         self.B = B
 
     def __str__(self):
-        return f"CieLab(L={self.L}, A={self.A}, B={self.B})"
\ No newline at end of file
+        return f"CieLab(L={self.L}, A={self.A}, B={self.B})"
+
+
+class CieLabArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("L", "A", "B")
+    SCALAR = CieLab
+
+    def to_rgb(self):
+        """
+        Преобразует CIE Lab (источник A, наблюдатель 2°) в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(cie_lab_to_rgb_array(self.data))
@@ -1,7 +1,11 @@
-from colors.cmyk import CMYK
+from colors.cmyk import CMYK, CMYKArray
+from colors.color_array import ColorArray
+from color_conversion import cmy_to_cmyk_array, cmy_to_rgb_array
 
 
 class CMY:
+    __slots__ = ("C", "M", "Y")
+
     def __init__(self, C, M, Y):
         """
         Инициализация класса CMY.
@@ -40,4 +44,25 @@ class CMY:
         return CMYK(C, M, Y, K)
 
     def __str__(self):
-        return f"CMY(C={self.C}, M={self.M}, Y={self.Y})"
\ No newline at end of file
+        return f"CMY(C={self.C}, M={self.M}, Y={self.Y})"
+
+
+class CMYArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("C", "M", "Y")
+    SCALAR = CMY
+
+    def to_cmyk(self):
+        """
+        Преобразует CMY в CMYK.
+        :return: Объект класса CMYKArray
+        """
+        return CMYKArray(cmy_to_cmyk_array(self.data))
+
+    def to_rgb(self):
+        """
+        Преобразует CMY в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(cmy_to_rgb_array(self.data))
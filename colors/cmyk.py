@@ -1,4 +1,10 @@
+from colors.color_array import ColorArray
+from color_conversion import cmyk_to_rgb_array
+
+
 class CMYK:
+    __slots__ = ("C", "M", "Y", "K")
+
     def __init__(self, C, M, Y, K):
         """
         Инициализация класса CMYK.
@@ -13,4 +19,18 @@ class CMYK:
         self.K = K
 
     def __str__(self):
-        return f"CMYK(C={self.C}, M={self.M}, Y={self.Y}, K={self.K})"
\ No newline at end of file
+        return f"CMYK(C={self.C}, M={self.M}, Y={self.Y}, K={self.K})"
+
+
+class CMYKArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("C", "M", "Y", "K")
+    SCALAR = CMYK
+
+    def to_rgb(self):
+        """
+        Преобразует CMYK в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(cmyk_to_rgb_array(self.data))
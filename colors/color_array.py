@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class ColorArray:
+    """
+    Базовый класс для массивов цветов.
+
+    Цвета хранятся в одном массиве NumPy формы (..., N), где последняя ось -
+    каналы модели (в том же виде, что возвращают функции *_array из
+    color_conversion). Каналы доступны по именам как представления без
+    копирования: rgb.R, hsv.V и т.д.
+    """
+    __slots__ = ("data",)
+
+    # Названия каналов в порядке последней оси
+    CHANNELS = ()
+    # Класс для одного цвета
+    SCALAR = None
+
+    def __init__(self, data):
+        """
+        Инициализация массива цветов.
+        :param data: Массив формы (..., N), где N = len(CHANNELS); не копируется
+        """
+        data = np.asarray(data)
+        if data.shape[-1:] != (len(self.CHANNELS),):
+            raise ValueError(
+                f"{type(self).__name__}: ожидается массив формы (..., {len(self.CHANNELS)}), получен {data.shape}"
+            )
+        object.__setattr__(self, "data", data)
+
+    @classmethod
+    def from_channels(cls, *channels):
+        """Собирает массив из отдельных плоскостей каналов"""
+        return cls(np.stack(channels, axis=-1))
+
+    @property
+    def shape(self):
+        return self.data.shape[:-1]
+
+    def __getattr__(self, name):
+        channels = type(self).CHANNELS
+        if name in channels:
+            return self.data[..., channels.index(name)]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __setattr__(self, name, value):
+        channels = type(self).CHANNELS
+        if name in channels:
+            self.data[..., channels.index(name)] = value
+        else:
+            object.__setattr__(self, name, value)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, index):
+        item = self.data[index]
+        if item.ndim == 1 and item.shape[0] == len(self.CHANNELS) and self.SCALAR is not None:
+            return self.SCALAR(*item.tolist())
+        return type(self)(item)
+
+    def __str__(self):
+        return f"{type(self).__name__}(shape={self.shape}, dtype={self.data.dtype})"
@@ -1,4 +1,10 @@
+from colors.color_array import ColorArray
+from color_conversion import hsl_to_rgb_array
+
+
 class HSL:
+    __slots__ = ("H", "S", "L")
+
     def __init__(self, H, S, L):
         """
         Инициализация класса HSL.
@@ -11,4 +17,18 @@ class HSL:
         self.L = L
 
     def __str__(self):
-        return f"HSL(H={self.H}, S={self.S}, L={self.L})"
\ No newline at end of file
+        return f"HSL(H={self.H}, S={self.S}, L={self.L})"
+
+
+class HSLArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("H", "S", "L")
+    SCALAR = HSL
+
+    def to_rgb(self):
+        """
+        Преобразует HSL в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(hsl_to_rgb_array(self.data))
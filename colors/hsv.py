@@ -1,4 +1,10 @@
+from colors.color_array import ColorArray
+from color_conversion import hsv_to_rgb_array
+
+
 class HSV:
+    __slots__ = ("H", "S", "V")
+
     def __init__(self, H, S, V):
         """
         Инициализация класса HSV.
@@ -11,4 +17,18 @@ class HSV:
         self.V = V
 
     def __str__(self):
-        return f"HSV(H={self.H}, S={self.S}, V={self.V})"
\ No newline at end of file
+        return f"HSV(H={self.H}, S={self.S}, V={self.V})"
+
+
+class HSVArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("H", "S", "V")
+    SCALAR = HSV
+
+    def to_rgb(self):
+        """
+        Преобразует HSV в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(hsv_to_rgb_array(self.data))
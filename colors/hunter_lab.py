@@ -1,4 +1,10 @@
+from colors.color_array import ColorArray
+from color_conversion import hunter_lab_to_rgb_array
+
+
 class HunterLab:
+    __slots__ = ("L", "A", "B")
+
     def __init__(self, L, A, B):
         """
         Инициализация класса CieLab
@@ -8,4 +14,18 @@ class HunterLab:
         self.B = B
 
     def __str__(self):
-        return f"HunterLab(L={self.L}, A={self.A}, B={self.B})"
\ No newline at end of file
+        return f"HunterLab(L={self.L}, A={self.A}, B={self.B})"
+
+
+class HunterLabArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("L", "A", "B")
+    SCALAR = HunterLab
+
+    def to_rgb(self):
+        """
+        Преобразует Hunter Lab (источник A, наблюдатель 2°) в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(hunter_lab_to_rgb_array(self.data))
@@ -1,10 +1,21 @@
-from colors.cmy import CMY
-from colors.hsl import HSL
-from colors.hsv import HSV
-from colors.ycbcr import YCbCr
+import numpy as np
+
+from colors.cmy import CMY, CMYArray
+from colors.cmyk import CMYKArray
+from colors.color_array import ColorArray
+from colors.hsl import HSL, HSLArray
+from colors.hsv import HSV, HSVArray
+from colors.xyz import XYZArray
+from colors.ycbcr import YCbCr, YCbCrArray, YCbCrBT709Array
+from color_conversion import (
+    rgb_to_cmy_array, rgb_to_cmyk_array, rgb_to_hsl_array, rgb_to_hsv_array,
+    rgb_to_ycbcr_array, rgb_to_ycbcr_bt709_array, srgb_to_xyz_array,
+)
 
 
 class RGB:
+    __slots__ = ("R", "G", "B")
+
     def __init__(self, R, G, B):
         """
         Инициализация класса RGB.
@@ -149,4 +160,68 @@ class RGB:
         return YCbCr(Y, Cb, Cr)
 
     def __str__(self):
-        return f"RGB(R={self.R}, G={self.G}, B={self.B})"
\ No newline at end of file
+        return f"RGB(R={self.R}, G={self.G}, B={self.B})"
+
+
+class RGBArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("R", "G", "B")
+    SCALAR = RGB
+
+    @classmethod
+    def from_image(cls, image):
+        """
+        Создаёт массив из изображения PIL.
+        :param image: Изображение PIL
+        :return: Объект класса RGBArray (uint8, форма (H, W, 3))
+        """
+        return cls(np.asarray(image.convert("RGB")))
+
+    def to_hsv(self):
+        """
+        Преобразует RGB в HSV.
+        :return: Объект класса HSVArray
+        """
+        return HSVArray(rgb_to_hsv_array(self.data))
+
+    def to_cmy(self):
+        """
+        Преобразует RGB в CMY.
+        :return: Объект класса CMYArray
+        """
+        return CMYArray(rgb_to_cmy_array(self.data))
+
+    def to_cmyk(self):
+        """
+        Преобразует RGB в CMYK.
+        :return: Объект класса CMYKArray
+        """
+        return CMYKArray(rgb_to_cmyk_array(self.data))
+
+    def to_hsl(self):
+        """
+        Преобразует RGB в HSL.
+        :return: Объект класса HSLArray
+        """
+        return HSLArray(rgb_to_hsl_array(self.data))
+
+    def to_ycbcr(self):
+        """
+        Преобразует RGB в YCbCr по стандарту ITU-R BT.601.
+        :return: Объект класса YCbCrArray
+        """
+        return YCbCrArray(rgb_to_ycbcr_array(self.data))
+
+    def to_ycbcr_bt709(self):
+        """
+        Преобразует RGB в YCbCr по стандарту ITU-R BT.709.
+        :return: Объект класса YCbCrBT709Array
+        """
+        return YCbCrBT709Array(rgb_to_ycbcr_bt709_array(self.data))
+
+    def to_xyz(self):
+        """
+        Преобразует sRGB в XYZ.
+        :return: Объект класса XYZArray
+        """
+        return XYZArray(srgb_to_xyz_array(self.data))
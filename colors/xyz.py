@@ -1,5 +1,8 @@
 # Эталонные значения для различных источников освещения и углов наблюдения
-from colors.cie_lab import CieLab
+from colors.cie_lab import CieLab, CieLabArray
+from colors.color_array import ColorArray
+from colors.hunter_lab import HunterLabArray
+from color_conversion import xyz_to_hunter_lab_array, xyz_to_lab_array, xyz_to_srgb_array
 
 
 reference_values = {
@@ -86,6 +89,8 @@ reference_values = {
 }
 
 class XYZ:
+    __slots__ = ("X", "Y", "Z")
+
     def __init__(self, X, Y, Z):
         """
         Инициализация класса XYZ
@@ -129,4 +134,32 @@ class XYZ:
         Hunter_a = var_Ka * (((self.X / Reference_X) - (self.Y / Reference_Y)) / (self.Y / Reference_Y) ** 0.5)
         Hunter_b = var_Kb * (((self.Y / Reference_Y) - (self.Z / Reference_Z)) / (self.Y / Reference_Y) ** 0.5)
 
-        return Hunter_L, Hunter_a, Hunter_b
\ No newline at end of file
+        return Hunter_L, Hunter_a, Hunter_b
+
+
+class XYZArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("X", "Y", "Z")
+    SCALAR = XYZ
+
+    def to_cie_lab(self, Reference_X, Reference_Y, Reference_Z):
+        """
+        Преобразует XYZ в CIE Lab.
+        :return: Объект класса CieLabArray
+        """
+        return CieLabArray(xyz_to_lab_array(self.data, Reference_X, Reference_Y, Reference_Z))
+
+    def to_hunter_lab(self, Reference_X, Reference_Y, Reference_Z):
+        """
+        Преобразует XYZ в Hunter Lab.
+        :return: Объект класса HunterLabArray
+        """
+        return HunterLabArray(xyz_to_hunter_lab_array(self.data, Reference_X, Reference_Y, Reference_Z))
+
+    def to_rgb(self):
+        """
+        Преобразует XYZ в sRGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(xyz_to_srgb_array(self.data))
@@ -1,4 +1,10 @@
+from colors.color_array import ColorArray
+from color_conversion import ycbcr_bt709_to_rgb_array, ycbcr_to_rgb_array
+
+
 class YCbCr:
+    __slots__ = ("Y", "Cb", "Cr")
+
     def __init__(self, Y, Cb, Cr):
         """
         Инициализация класса YCbCr
@@ -8,4 +14,31 @@ class YCbCr:
         self.Cr = Cr
 
     def __str__(self):
-        return f"YCbCr(Y={self.Y}, Cb={self.Cb}, Cr={self.Cr})"
\ No newline at end of file
+        return f"YCbCr(Y={self.Y}, Cb={self.Cb}, Cr={self.Cr})"
+
+
+class YCbCrArray(ColorArray):
+    __slots__ = ()
+    CHANNELS = ("Y", "Cb", "Cr")
+    SCALAR = YCbCr
+
+    def to_rgb(self):
+        """
+        Преобразует YCbCr (ITU-R BT.601) в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(ycbcr_to_rgb_array(self.data))
+
+
+class YCbCrBT709Array(YCbCrArray):
+    """Массив YCbCr по стандарту ITU-R BT.709 (из RGBArray.to_ycbcr_bt709)"""
+    __slots__ = ()
+
+    def to_rgb(self):
+        """
+        Преобразует YCbCr (ITU-R BT.709) в RGB.
+        :return: Объект класса RGBArray (float32, 0 ÷ 255)
+        """
+        from colors.rgb import RGBArray
+        return RGBArray(ycbcr_bt709_to_rgb_array(self.data))
@@ -1,7 +1,8 @@
 # constants.py
 
 # Размеры для уменьшения изображения (thumbnail)
-from color_conversion import CMYK, HSL, LAB, HSV, YCBCR
+import os
+from color_conversion import CMYK, HSL, LAB, HSV, YCBCR, HUNTER_LAB
 
 
 THUMBNAIL_SIZE = (720, 480)
@@ -9,6 +10,12 @@ THUMBNAIL_SIZE = (720, 480)
 # Путь к файлу с функциями преобразования цветов
 COLOR_CONVERSION_FILE = "color_conversion.py"
 
+# Каталог для полных таблиц преобразования RGB -> модель (conversion_tables.py)
+CONVERSION_TABLES_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image-processing", "tables")
+# Изображения от этого числа пикселей переводятся в модель выборкой из полной таблицы
+# (таблица строится при первом использовании); None - таблицы не используются
+CONVERSION_TABLE_MIN_PIXELS = 8_000_000
+
 # Форматы изображений, которые можно загружать
 SUPPORTED_IMAGE_FORMATS = [
     ("JPEG files", "*.jpg"),
@@ -30,4 +37,112 @@ COLOR_MODELS = [
     LAB,
     HSV,
     YCBCR,
-]
\ No newline at end of file
+]
+
+# Названия каналов цветовых моделей
+CHANNEL_NAMES = {
+    CMYK: ("C", "M", "Y", "K"),
+    HSL: ("H", "S", "L"),
+    LAB: ("L*", "a*", "b*"),
+    HSV: ("H", "S", "V"),
+    YCBCR: ("Y", "Cb", "Cr"),
+    HUNTER_LAB: ("L", "a", "b"),
+}
+
+# Диапазоны каналов для отображения в оттенках серого (значения за
+# пределами диапазона обрезаются)
+CHANNEL_RANGES = {
+    CMYK: ((0, 1), (0, 1), (0, 1), (0, 1)),
+    HSL: ((0, 1), (0, 1), (0, 1)),
+    LAB: ((0, 100), (-128, 127), (-128, 127)),
+    HSV: ((0, 1), (0, 1), (0, 1)),
+    YCBCR: ((0, 255), (0, 255), (0, 255)),
+    HUNTER_LAB: ((0, 100), (-100, 100), (-100, 100)),
+}
+
+# Максимальный объём кэша преобразованных плоскостей в CanvasManager
+PLANE_CACHE_BYTES = 1 << 30
+
+# Максимальный объём кэша промежуточных шагов обработки (stage_cache.py)
+STAGE_CACHE_BYTES = 512 << 20
+
+# Интерактивная обработка на копии размером с холст, полное разрешение - в фоне
+PROXY_EDITING = True
+
+# Период проверки готовности фоновой обработки (мс), processing_executor.py
+EXECUTOR_POLL_MS = 30
+
+# Размер плитки пирамиды изображения (image_pyramid.py)
+TILE_SIZE = 256
+
+# Объём плиток PhotoImage (4 байта на пиксель), которые CanvasManager хранит для быстрой прокрутки
+PHOTO_TILE_CACHE_BYTES = 128 << 20
+
+# Шаг и предел увеличения (пикселей экрана на пиксель изображения)
+ZOOM_STEP = 1.25
+MAX_VIEW_SCALE = 16
+
+# Предпросмотр при перетаскивании ползунков (preview_scheduler.py):
+# интервал кадра, пауза до точного результата и уменьшение копии для предпросмотра
+PREVIEW_FRAME_MS = 16
+PREVIEW_SETTLE_MS = 300
+PREVIEW_REDUCE = 2
+
+# Изображения от этого числа пикселей хранятся на диске плитками (tiled_store.py)
+OUT_OF_CORE_PIXELS = 250_000_000
+
+# Объём данных, обрабатываемых за раз при работе с хранилищем на диске
+OUT_OF_CORE_BUDGET = 256 << 20
+
+# Каталог хранилищ изображений на диске; используется повторно между сеансами
+TILED_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "image-processing", "tiles")
+# Сколько места на диске могут занимать хранилища и через сколько секунд без
+# использования хранилище удаляется
+TILED_STORE_CACHE_BYTES = 16 << 30
+TILED_STORE_MAX_AGE = 30 * 24 * 3600
+
+# Обработка окрестностей пикселя по плиткам на всех ядрах (tile_engine.py):
+# размер плитки и минимальный размер изображения, который имеет смысл делить
+PARALLEL_TILE_SIZE = 512
+PARALLEL_MIN_PIXELS = 1 << 20
+
+# Полоса строк, которую histogram.py считает за раз (не больше 2^24 пикселей)
+HISTOGRAM_BAND_PIXELS = 1 << 20
+
+# Изображения больше этого числа пикселей histogram.py оценивает по выборке
+# HISTOGRAM_SAMPLES пикселей; граница ошибки - с вероятностью HISTOGRAM_CONFIDENCE
+HISTOGRAM_SAMPLE_PIXELS = 50_000_000
+HISTOGRAM_SAMPLES = 1 << 20
+HISTOGRAM_CONFIDENCE = 0.99
+
+# Морфология (morphology.py): отрезки ядра от этой длины проходятся алгоритмом
+# ван Херка - Гил - Вермана (цена не зависит от длины), более короткие - OpenCV.
+# MORPH_PART_COST - цена объединения ещё одного прямоугольника разложения ядра
+# в сравнениях на пиксель
+MORPH_VHGW_LENGTH = 128
+MORPH_PART_COST = 40
+
+# Наибольший размер ядра и число повторов в редакторе морфологии
+MORPH_MAX_KERNEL_SIZE = 101
+MORPH_MAX_ITERATIONS = 20
+
+# Сторона редактора ядра морфологии в пикселях
+KERNEL_EDITOR_PIXELS = 330
+
+# Полоса строк (в пикселях), которую binary_image.py упаковывает или распаковывает за раз,
+BINARY_BAND_PIXELS = 1 << 22
+# и число слов uint64 в полосе строк для морфологии над упакованным изображением
+BINARY_BAND_WORDS = 1 << 17
+
+# Сколько байт свободных промежуточных массивов держит пул image_buffer.py
+IMAGE_BUFFER_POOL_BYTES = 256 << 20
+
+# История правок (history.py): объём полных копий и сжатых разностей, которые
+# она держит в памяти, и через сколько правок сохраняется полная копия
+HISTORY_MEMORY_BYTES = 512 << 20
+HISTORY_SNAPSHOT_INTERVAL = 8
+# Сторона плитки разностей и уровень сжатия zlib (1 - быстрее всего)
+HISTORY_TILE_SIZE = 512
+HISTORY_ZLIB_LEVEL = 1
+# Цена повтора правки при восстановлении состояния относительно применения одной разности
+HISTORY_RECOMPUTE_COST = 16
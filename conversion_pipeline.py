@@ -0,0 +1,264 @@
+# conversion_pipeline.py
+
+from functools import lru_cache
+
+import numpy as np
+
+from color_conversion import (
+    ARRAY_CHUNK_PIXELS, CMY, CMYK, HSL, HSV, HUNTER_LAB, LAB, RGB, SRGB, XYZ, YCBCR, YCBCR_BT709,
+    SRGB_LINEAR_TABLE, SRGB_TO_XYZ_MATRIX, YCBCR_BT601_MATRIX, YCBCR_BT709_MATRIX, reference_values,
+    _clip_ycbcr, _cmy_to_cmyk_kernel, _rgb_to_hsl_kernel, _rgb_to_hsv_kernel, _srgb_channel_to_linear,
+    _xyz_to_hunter_lab_kernel, _xyz_to_lab_kernel,
+)
+from constants import CONVERSION_TABLE_MIN_PIXELS
+from conversion_tables import get_conversion_table
+from lab_engine import SRGB_LINEAR_TABLE_F32, get_lab_converter
+
+
+class LinearStage:
+    def __init__(self, name, matrix, offset=None):
+        """
+        Линейный (аффинный) шаг: out = matrix @ in + offset.
+        :param name: Название шага
+        :param matrix: Матрица формы (выходные каналы, входные каналы)
+        :param offset: Смещение для каждого выходного канала
+        """
+        self.name = name
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.offset = np.zeros(self.matrix.shape[0]) if offset is None else np.asarray(offset, dtype=np.float64)
+
+    def then(self, other):
+        """Объединяет два последовательных линейных шага в один"""
+        return LinearStage(
+            f"{self.name} + {other.name}",
+            other.matrix @ self.matrix,
+            other.matrix @ self.offset + other.offset,
+        )
+
+    def __call__(self, *planes):
+        result = []
+        for row, offset in zip(self.matrix, self.offset):
+            # Смещение добавляется последним, как в скалярных формулах
+            plane = np.zeros(planes[0].shape)
+            for coefficient, value in zip(row, planes):
+                if coefficient != 0:
+                    plane += coefficient * value
+            if offset != 0:
+                plane += offset
+            result.append(plane)
+        return tuple(result)
+
+
+class TableStage:
+    def __init__(self, name, table, func):
+        """
+        Поканальное преобразование по таблице на 256 значений.
+        Для нецелого входа используется func.
+        :param name: Название шага
+        :param table: Значения для входов 0 ÷ 255 (тип значений сохраняется)
+        :param func: Та же функция для произвольных значений
+        """
+        self.name = name
+        self.table = np.asarray(table)
+        self.func = func
+
+    def __call__(self, *planes, integer_input=False):
+        if integer_input:
+            return tuple(self.table[plane.astype(np.intp)] for plane in planes)
+        return tuple(self.func(plane) for plane in planes)
+
+
+class FunctionStage:
+    def __init__(self, name, func, float32_uint8=False):
+        """
+        Нелинейный шаг над плоскостями.
+        :param name: Название шага
+        :param func: Функция (*planes) -> кортеж плоскостей
+        :param float32_uint8: func точна на целых 0 ÷ 255 во float32 (как в _map_pixels)
+        """
+        self.name = name
+        self.func = func
+        self.float32_uint8 = float32_uint8
+
+    def __call__(self, *planes):
+        return self.func(*planes)
+
+
+def _fuse(stages):
+    """Сливает подряд идущие линейные шаги в одну матрицу"""
+    fused = []
+    for stage in stages:
+        if fused and isinstance(stage, LinearStage) and isinstance(fused[-1], LinearStage):
+            fused[-1] = fused[-1].then(stage)
+        else:
+            fused.append(stage)
+    return fused
+
+
+class CompiledConverter:
+    def __init__(self, source, target, stages):
+        """
+        Готовая цепочка преобразования source -> target.
+        Все константы уже вычислены, линейные шаги слиты.
+        """
+        self.source = source
+        self.target = target
+        self.stages = _fuse(stages)
+        # Цепочка из шагов, точных во float32 для целых входов, получает uint8 как float32
+        self.float32_uint8 = all(getattr(stage, "float32_uint8", False) for stage in self.stages)
+        probe = self._run(np.zeros((3, 1)), integer_input=False)
+        self.channels = len(probe)
+
+    def _run(self, planes, integer_input):
+        for index, stage in enumerate(self.stages):
+            if isinstance(stage, TableStage):
+                # Таблица применима только к исходным целым значениям
+                planes = stage(*planes, integer_input=integer_input and index == 0)
+            else:
+                planes = stage(*planes)
+        return planes
+
+    def __call__(self, pixels):
+        """
+        Преобразует массив пикселей.
+        :param pixels: Массив формы (..., 3)
+        :return: Массив float32 формы (..., channels)
+        """
+        pixels = np.asarray(pixels)
+        if pixels.shape[-1] != 3:
+            raise ValueError(f"Ожидается массив формы (..., 3), получен {pixels.shape}")
+
+        integer_input = pixels.dtype == np.uint8
+        dtype = np.float32 if integer_input and self.float32_uint8 else np.float64
+        flat = pixels.reshape(-1, 3)
+        out = np.empty((flat.shape[0], self.channels), dtype=np.float32)
+        for start in range(0, flat.shape[0], ARRAY_CHUNK_PIXELS):
+            stop = start + ARRAY_CHUNK_PIXELS
+            planes = np.ascontiguousarray(flat[start:stop].T, dtype=dtype)
+            for i, plane in enumerate(self._run(planes, integer_input)):
+                out[start:stop, i] = plane
+        return out.reshape(pixels.shape[:-1] + (self.channels,))
+
+    def convert_color(self, *values):
+        """Преобразует один цвет, возвращает кортеж float"""
+        planes = self._run(np.array(values, dtype=np.float64).reshape(3, 1), integer_input=False)
+        return tuple(float(plane[0]) for plane in planes)
+
+    def __repr__(self):
+        chain = " -> ".join(stage.name for stage in self.stages)
+        return f"CompiledConverter({self.source} -> {self.target}: {chain})"
+
+
+_srgb_to_linear = np.vectorize(_srgb_channel_to_linear, otypes=[float])
+
+
+def _rgb_to_xyz_stages():
+    return [
+        TableStage("линеаризация sRGB", SRGB_LINEAR_TABLE, _srgb_to_linear),
+        LinearStage("RGB -> XYZ", SRGB_TO_XYZ_MATRIX),
+    ]
+
+
+def _rgb_to_lab_stages(lab, name, kernel):
+    # LabConverter: деление на опорный белый уже встроено в матрицу, расчёт во float32
+    return [
+        TableStage("линеаризация sRGB (float32)", SRGB_LINEAR_TABLE_F32, _srgb_to_linear),
+        FunctionStage(f"{name} ({lab.illuminant} {lab.observer})", kernel),
+    ]
+
+
+def _xyz_to_lab_stages(white):
+    return [FunctionStage("XYZ -> Lab", lambda X, Y, Z: _xyz_to_lab_kernel(X, Y, Z, *white))]
+
+
+def _xyz_to_hunter_lab_stages(white):
+    return [FunctionStage("XYZ -> Hunter Lab", lambda X, Y, Z: _xyz_to_hunter_lab_kernel(X, Y, Z, *white))]
+
+
+def _rgb_to_ycbcr_stages(matrix):
+    return [
+        LinearStage("RGB -> YCbCr", matrix, [0, 128, 128]),
+        FunctionStage("ограничение 0-255", _clip_ycbcr),
+    ]
+
+
+def _rgb_to_cmy_stages():
+    return [LinearStage("RGB -> CMY", -np.eye(3) / 255, [1, 1, 1])]
+
+
+def _route(source, target, lab):
+    """
+    Список шагов source -> target.
+    :param lab: LabConverter для выбранного источника освещения и угла наблюдения
+    """
+    white = lab.white
+    if source == SRGB:
+        source = RGB
+
+    if source == RGB:
+        if target == XYZ:
+            return _rgb_to_xyz_stages()
+        if target == LAB:
+            return _rgb_to_lab_stages(lab, "sRGB -> Lab", lab._lab_kernel)
+        if target == HUNTER_LAB:
+            return _rgb_to_lab_stages(lab, "sRGB -> Hunter Lab", lab._hunter_lab_kernel)
+        if target == YCBCR:
+            return _rgb_to_ycbcr_stages(YCBCR_BT601_MATRIX)
+        if target == YCBCR_BT709:
+            return _rgb_to_ycbcr_stages(YCBCR_BT709_MATRIX)
+        if target == CMY:
+            return _rgb_to_cmy_stages()
+        if target == CMYK:
+            return _rgb_to_cmy_stages() + [FunctionStage("CMY -> CMYK", _cmy_to_cmyk_kernel)]
+        if target == HSV:
+            return [FunctionStage("RGB -> HSV", _rgb_to_hsv_kernel, float32_uint8=True)]
+        if target == HSL:
+            return [FunctionStage("RGB -> HSL", _rgb_to_hsl_kernel, float32_uint8=True)]
+
+    if source == XYZ:
+        if target == LAB:
+            return _xyz_to_lab_stages(white)
+        if target == HUNTER_LAB:
+            return _xyz_to_hunter_lab_stages(white)
+
+    if source == CMY and target == CMYK:
+        return [FunctionStage("CMY -> CMYK", _cmy_to_cmyk_kernel)]
+
+    raise ValueError(f"Преобразование {source} -> {target} не поддерживается")
+
+
+@lru_cache(maxsize=None)
+def compile_converter(source, target, illuminant="A", observer="2°"):
+    """
+    Собирает преобразование source -> target.
+    :param source: Исходная модель (RGB, sRGB, XYZ, CMY)
+    :param target: Целевая модель
+    :param illuminant: Источник освещения из reference_values (для Lab и Hunter Lab)
+    :param observer: Угол наблюдения ("2°" или "10°")
+    :return: CompiledConverter
+    """
+    if observer not in reference_values.get(illuminant, {}):
+        raise ValueError(f"Нет эталонных значений для {illuminant} {observer}")
+    return CompiledConverter(source, target, _route(source, target, get_lab_converter(illuminant, observer)))
+
+
+def rgb_to_model_array(model, rgb):
+    """
+    Преобразование RGB -> model, которое используют просмотр каналов и правка
+    в цветовой модели (источник A, наблюдатель 2°, как RGB_ARRAY_CONVERSIONS).
+    Lab и Hunter Lab считаются через LabConverter с отклонением не больше
+    LAB_ERROR_BOUND / HUNTER_LAB_ERROR_BOUND. Изображения от
+    CONVERSION_TABLE_MIN_PIXELS пикселей переводятся выборкой из полной таблицы.
+    :param model: Цветовая модель из RGB_ARRAY_CONVERSIONS
+    :param rgb: Массив формы (..., 3) uint8
+    :return: Массив float32 формы (..., channels)
+    """
+    rgb = np.asarray(rgb)
+    if (CONVERSION_TABLE_MIN_PIXELS is not None and rgb.dtype == np.uint8
+            and rgb.size // 3 >= CONVERSION_TABLE_MIN_PIXELS):
+        try:
+            return get_conversion_table(model).convert(rgb)
+        except OSError as error:
+            # Нет места или прав на запись: считаем без таблицы
+            print(f"Таблица преобразования {model} недоступна: {error}")
+    return compile_converter(RGB, model)(rgb)
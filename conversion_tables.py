@@ -0,0 +1,186 @@
+# conversion_tables.py
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from color_conversion import ARRAY_CHUNK_PIXELS, HUNTER_LAB, RGB_ARRAY_CONVERSIONS, RGB_CONVERSIONS
+from constants import CONVERSION_TABLES_DIR
+
+# Версия формата таблиц. Увеличивается при любом изменении формул
+# преобразования или раскладки файла - старые таблицы будут перестроены.
+TABLE_FORMAT_VERSION = 2
+
+# Количество случайных цветов для проверки таблицы по скалярным функциям
+VALIDATION_SAMPLES = 20000
+
+# Допустимое отклонение от скалярных функций (таблица хранится во float32)
+VALIDATION_TOLERANCE = 1e-5
+
+_RGB_COLORS = 1 << 24
+
+
+def _table_paths(model, directory):
+    name = f"{model.lower()}_v{TABLE_FORMAT_VERSION}"
+    return os.path.join(directory, name + ".npy"), os.path.join(directory, name + ".json")
+
+
+def _reference(model, rgb):
+    try:
+        return RGB_CONVERSIONS[model](*rgb)
+    except ZeroDivisionError:
+        # rgb_to_hunter_lab не определена для чёрного, массивная версия даёт (0, 0, 0)
+        if model == HUNTER_LAB:
+            return 0.0, 0.0, 0.0
+        raise
+
+
+def _validation_colors(samples):
+    rng = np.random.default_rng(TABLE_FORMAT_VERSION)
+    colors = rng.integers(0, 256, size=(samples, 3))
+    # Углы куба и серые - там ветвления в формулах
+    corners = np.array([[r, g, b] for r in (0, 255) for g in (0, 255) for b in (0, 255)])
+    grays = np.repeat(np.arange(0, 256, 17)[:, None], 3, axis=1)
+    return np.concatenate([corners, grays, colors]).astype(np.uint8)
+
+
+def _color_indices(rgb):
+    rgb = np.asarray(rgb)
+    return (rgb[..., 0].astype(np.intp) << 16) | (rgb[..., 1].astype(np.intp) << 8) | rgb[..., 2]
+
+
+class ConversionTable:
+    def __init__(self, model, directory=CONVERSION_TABLES_DIR):
+        """
+        Полная таблица RGB -> model для всех 16.7 млн цветов uint8.
+
+        Таблица хранится в файле .npy и открывается через memory map,
+        поэтому несколько процессов используют одни и те же страницы
+        из кэша ОС, а преобразование изображения сводится к одной выборке.
+        :param model: Цветовая модель из RGB_ARRAY_CONVERSIONS
+        :param directory: Каталог для файлов таблиц
+        """
+        if model not in RGB_ARRAY_CONVERSIONS:
+            raise ValueError(f"Модель '{model}' не поддерживается")
+        self.model = model
+        self.directory = directory
+        self.path, self.meta_path = _table_paths(model, directory)
+        self.table = None
+
+    def exists(self):
+        """Проверяет, что на диске есть таблица текущей версии"""
+        if not (os.path.exists(self.path) and os.path.exists(self.meta_path)):
+            return False
+        with open(self.meta_path, encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        return meta.get("version") == TABLE_FORMAT_VERSION and meta.get("model") == self.model
+
+    def build(self):
+        """Строит таблицу и атомарно сохраняет её на диск"""
+        os.makedirs(self.directory, exist_ok=True)
+        convert = RGB_ARRAY_CONVERSIONS[self.model]
+        channels = convert(np.zeros((1, 3), dtype=np.uint8)).shape[-1]
+
+        # Пишем во временный файл, чтобы параллельные процессы
+        # не открыли недостроенную таблицу
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        tmp_meta_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        try:
+            table = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=np.float32, shape=(256, 256, 256, channels)
+            )
+            gb = np.stack(np.meshgrid(np.arange(256), np.arange(256), indexing="ij"), axis=-1)
+            rgb = np.empty((256, 256, 3), dtype=np.uint8)
+            rgb[..., 1:] = gb
+            for red in range(256):
+                rgb[..., 0] = red
+                table[red] = convert(rgb)
+            table.flush()
+            del table
+
+            max_error = self._validate(np.load(tmp_path, mmap_mode="r").reshape(_RGB_COLORS, -1))
+            os.replace(tmp_path, self.path)
+
+            meta = {
+                "version": TABLE_FORMAT_VERSION,
+                "model": self.model,
+                "channels": channels,
+                "dtype": "float32",
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "max_error": max_error,
+            }
+            # Описание тоже подменяется целиком: exists() не должен прочитать половину файла
+            with open(tmp_meta_path, "w", encoding="utf-8") as meta_file:
+                json.dump(meta, meta_file, indent=2)
+            os.replace(tmp_meta_path, self.meta_path)
+        finally:
+            # После ошибки или прерывания не оставляем недостроенные файлы
+            for path in (tmp_path, tmp_meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def open(self, build=True):
+        """
+        Открывает таблицу через memory map (только чтение).
+        :param build: Построить таблицу, если её нет или версия устарела
+        :return: self
+        """
+        if self.table is None:
+            if not self.exists():
+                if not build:
+                    raise FileNotFoundError(f"Таблица {self.path} не найдена")
+                self.build()
+            self.table = np.load(self.path, mmap_mode="r").reshape(_RGB_COLORS, -1)
+        return self
+
+    def _validate(self, table, samples=VALIDATION_SAMPLES):
+        colors = _validation_colors(samples)
+        expected = np.array([_reference(self.model, tuple(map(int, rgb))) for rgb in colors], dtype=np.float32)
+        actual = np.asarray(table[_color_indices(colors)])
+        max_error = float(np.abs(actual - expected).max())
+        if max_error > VALIDATION_TOLERANCE:
+            raise ValueError(f"Таблица {self.model} расходится со скалярными функциями: {max_error}")
+        return max_error
+
+    def validate(self, samples=VALIDATION_SAMPLES):
+        """
+        Сверяет таблицу со скалярными функциями из RGB_CONVERSIONS.
+        :return: Максимальное отклонение
+        """
+        return self._validate(self.open(build=False).table, samples)
+
+    def convert(self, rgb):
+        """
+        Преобразует массив RGB выборкой из таблицы.
+        :param rgb: Массив формы (..., 3) uint8
+        :return: Массив float32 формы (..., channels)
+        """
+        rgb = np.asarray(rgb)
+        if rgb.shape[-1] != 3:
+            raise ValueError(f"Ожидается массив формы (..., 3), получен {rgb.shape}")
+
+        table = self.open().table
+        flat = rgb.reshape(-1, 3)
+        out = np.empty((flat.shape[0], table.shape[1]), dtype=np.float32)
+        for start in range(0, flat.shape[0], ARRAY_CHUNK_PIXELS):
+            stop = start + ARRAY_CHUNK_PIXELS
+            np.take(table, _color_indices(flat[start:stop]), axis=0, out=out[start:stop])
+        return out.reshape(rgb.shape[:-1] + (table.shape[1],))
+
+
+_tables = {}
+# Таблицы открываются из фоновых потоков обработки; временный файл build() назван
+# по номеру процесса, поэтому два потока не должны строить одну таблицу одновременно
+_tables_lock = threading.Lock()
+
+
+def get_conversion_table(model, directory=CONVERSION_TABLES_DIR):
+    """Возвращает открытую таблицу модели, общую для всего процесса"""
+    key = (model, directory)
+    with _tables_lock:
+        if key not in _tables:
+            _tables[key] = ConversionTable(model, directory).open()
+        return _tables[key]
@@ -0,0 +1,231 @@
+# enhance_engine.py
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from tile_engine import map_tiles
+
+# Веса PIL для convert("L"): L = (R * 19595 + G * 38470 + B * 7471 + 0x8000) >> 16
+LUMA_WEIGHTS = np.array([19595, 38470, 7471], dtype=np.float64) / 65536
+
+# Ядро ImageFilter.SMOOTH, которое использует ImageEnhance.Sharpness
+SMOOTH_KERNEL = np.array([
+    [1, 1, 1],
+    [1, 5, 1],
+    [1, 1, 1],
+], dtype=np.float64) / 13
+
+# Максимальное отличие fused_enhance от цепочки ImageEnhance (в уровнях 0-255).
+# PIL усекает результат после каждого из восьми blend, объединённый проход -
+# только после таблицы, матрицы и ядра; на фотографиях при множителях 0 ÷ 2 (RGB, RGBA и L) расхождение
+# не больше 3 уровней и у подавляющего большинства пикселей равно 0 или 1.
+FUSED_TOLERANCE = 3
+
+# Режимы исходного изображения, которые обрабатывает fused_enhance
+FUSED_MODES = ("RGB", "RGBA", "L")
+
+# Смещение перед округлением OpenCV, чтобы получить усечение, как в Image.blend
+_TRUNCATE = -0.49
+
+
+def enhance_reference(image, brightness, contrast, color, sharpness, mode):
+    """
+    Исходная цепочка ImageEnhance: яркость, контраст, насыщенность, резкость и смена режима.
+    Каждый шаг создаёт промежуточное изображение полного размера.
+    """
+    result = ImageEnhance.Brightness(image).enhance(brightness)
+    result = ImageEnhance.Contrast(result).enhance(contrast)
+    result = ImageEnhance.Color(result).enhance(color)
+    result = ImageEnhance.Sharpness(result).enhance(sharpness)
+    return result.convert(mode)
+
+
+def _blend_lut(factor, base):
+    """
+    Таблица Image.blend(base, value, factor) для всех 256 значений канала.
+    :param factor: Множитель blend
+    :param base: Значение вырожденного изображения (0 для яркости, среднее для контраста)
+    """
+    values = np.arange(256, dtype=np.float32)
+    result = np.float32(base) + np.float32(factor) * (values - np.float32(base))
+    return np.clip(np.trunc(result), 0, 255).astype(np.uint8)
+
+
+def tone_lut(array, brightness, contrast):
+    """
+    Поканальная таблица яркости и контраста.
+
+    Контраст в PIL смешивает с серым цветом, равным среднему яркости (L)
+    изображения после шага яркости. Это среднее считается без второго
+    прохода: по гистограммам каналов и таблице яркости.
+    :return: Таблица uint8 на 256 значений или None, если оба множителя равны 1
+    """
+    if brightness == 1.0 and contrast == 1.0:
+        return None
+    histograms = None
+    if contrast != 1.0:
+        histograms = [
+            cv2.calcHist([array], [channel], None, [256], [0, 256]).ravel()
+            for channel in range(1 if array.ndim == 2 else array.shape[2])
+        ]
+    return tone_lut_from_histograms(histograms, brightness, contrast)
+
+
+def tone_lut_from_histograms(histograms, brightness, contrast):
+    """
+    Таблица яркости и контраста по уже посчитанным гистограммам каналов
+    (для изображений, которые обрабатываются по частям).
+    :param histograms: Гистограммы каналов цвета (без альфа-канала) на 256 значений
+    """
+    if contrast == 1.0:
+        return _blend_lut(brightness, 0)
+    return chain_tone_lut(histograms, [("brightness", brightness), ("contrast", contrast)])
+
+
+def chain_tone_lut(histograms, steps):
+    """
+    Одна таблица для цепочки шагов яркости и контраста в любом порядке.
+    Среднее для каждого шага контраста считается по гистограммам,
+    пропущенным через таблицу предыдущих шагов.
+    :param histograms: Гистограммы каналов цвета входа цепочки (нужны только для контраста)
+    :param steps: Список ("brightness" или "contrast", множитель)
+    """
+    lut = np.arange(256, dtype=np.uint8)
+    for kind, factor in steps:
+        if kind == "brightness":
+            step_lut = _blend_lut(factor, 0)
+        else:
+            means = np.array([histogram @ lut / histogram.sum() for histogram in histograms])
+            mean_l = means[0] if len(means) == 1 else means @ LUMA_WEIGHTS
+            step_lut = _blend_lut(factor, int(mean_l + 0.5))
+        lut = step_lut[lut]
+    return lut
+
+
+def color_matrix(color):
+    """
+    Матрица 3x3 насыщенности: blend(серый, цвет, color) = color * I + (1 - color) * серый.
+    :return: Матрица или None для color == 1
+    """
+    if color == 1.0:
+        return None
+    return color * np.eye(3) + (1 - color) * np.tile(LUMA_WEIGHTS, (3, 1))
+
+
+def apply_matrix(array, matrix, truncate=True):
+    """Применяет матрицу цвета к каждому пикселю за один проход"""
+    offset = np.full((matrix.shape[0], 1), _TRUNCATE if truncate else 0)
+    result = cv2.transform(array, np.hstack([matrix, offset]))
+    if result.ndim == 3 and result.shape[2] == 1:
+        result = result[:, :, 0]
+    return result
+
+
+def sharpen_kernel(sharpness):
+    """Ядро 3x3 blend(SMOOTH(x), x, sharpness) или None для sharpness == 1"""
+    if sharpness == 1.0:
+        return None
+    identity = np.zeros((3, 3))
+    identity[1, 1] = 1
+    return sharpness * identity + (1 - sharpness) * SMOOTH_KERNEL
+
+
+def apply_sharpen(array, kernel):
+    """Применяет ядро резкости; крайние пиксели остаются как есть, как в ImageFilter"""
+    result = cv2.filter2D(array, -1, kernel, delta=_TRUNCATE, borderType=cv2.BORDER_REPLICATE)
+    result[0], result[-1] = array[0], array[-1]
+    result[:, 0], result[:, -1] = array[:, 0], array[:, -1]
+    return result
+
+
+def split_alpha(image):
+    """
+    Разделяет изображение RGB, RGBA или L на массив цвета и альфа-канал.
+    :return: (массив uint8, альфа-канал или None)
+    """
+    array = np.asarray(image)
+    if image.mode == "RGBA":
+        return array[:, :, :3], array[:, :, 3]
+    return array, None
+
+
+def _apply_tone(array, brightness, contrast, histograms=None):
+    if histograms is None:
+        lut = tone_lut(array, brightness, contrast)
+    else:
+        lut = tone_lut_from_histograms(histograms, brightness, contrast)
+    return cv2.LUT(array, lut)
+
+
+def _apply_color(array, color):
+    if array.ndim == 2:
+        return array
+    return apply_matrix(array, color_matrix(color))
+
+
+def _apply_mode(array, mode):
+    # Переход в "L" нельзя перенести раньше: PIL ограничивает каналы 0-255
+    # после насыщенности и резкости, и на насыщенных цветах это заметно
+    if mode == "L" and array.ndim == 3:
+        return apply_matrix(array, LUMA_WEIGHTS[None, :], truncate=False)
+    return array
+
+
+def _apply_sharpness(array, sharpness):
+    # Ядру 3x3 нужен один соседний пиксель; большие изображения делятся на плитки
+    kernel = sharpen_kernel(sharpness)
+    return map_tiles(array, lambda tile: apply_sharpen(tile, kernel), halo=1)
+
+
+def enhance_stages(brightness, contrast, color, sharpness, mode, histograms=None):
+    """
+    Шаги объединённой обработки по порядку.
+    :param histograms: Гистограммы каналов всего изображения, если шаги
+                       применяются к его частям (иначе считаются по массиву)
+    :return: Список (название, параметры шага, функция array -> array или None,
+             если шаг ничего не меняет)
+    """
+    return [
+        ("tone", (brightness, contrast),
+         None if brightness == 1.0 and contrast == 1.0
+         else lambda array: _apply_tone(array, brightness, contrast, histograms)),
+        ("color", (color,),
+         None if color == 1.0 else lambda array: _apply_color(array, color)),
+        ("sharpen", (sharpness,),
+         None if sharpness == 1.0 else lambda array: _apply_sharpness(array, sharpness)),
+        ("mode", (mode,),
+         None if mode != "L" else lambda array: _apply_mode(array, mode)),
+    ]
+
+
+def merge_alpha(array, alpha, mode):
+    """Собирает изображение PIL в режиме mode из массива цвета и альфа-канала"""
+    result = Image.fromarray(np.ascontiguousarray(array), "L" if array.ndim == 2 else "RGB")
+    if alpha is not None and result.mode == "RGB":
+        result.putalpha(Image.fromarray(alpha, "L"))
+    if result.mode != mode:
+        result = result.convert(mode)
+    return result
+
+
+def fused_enhance(image, brightness, contrast, color, sharpness, mode):
+    """
+    Яркость, контраст, насыщенность, резкость и смена режима за один проход по каждому шагу.
+
+    Яркость и контраст объединены в одну таблицу на канал (без отдельного
+    перевода в "L" для среднего), насыщенность - в одну матрицу цвета,
+    резкость - в одно ядро 3x3, переход в "L" - в одну строку матрицы.
+    Шаги с множителем 1.0 пропускаются. Результат отличается от
+    enhance_reference не более чем на FUSED_TOLERANCE уровней.
+    :param image: Изображение PIL в режиме RGB, RGBA или L
+    :return: Изображение PIL в режиме mode
+    """
+    if image.mode not in FUSED_MODES:
+        return enhance_reference(image, brightness, contrast, color, sharpness, mode)
+
+    array, alpha = split_alpha(image)
+    for _, _, func in enhance_stages(brightness, contrast, color, sharpness, mode):
+        if func is not None:
+            array = func(array)
+    return merge_alpha(array, alpha, mode)
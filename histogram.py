@@ -0,0 +1,287 @@
+# histogram.py
+
+import math
+
+import cv2
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.figure import Figure
+
+from binary_image import BinaryImage
+from constants import HISTOGRAM_BAND_PIXELS, HISTOGRAM_CONFIDENCE, HISTOGRAM_SAMPLE_PIXELS, HISTOGRAM_SAMPLES
+from enhance_engine import FUSED_MODES, _apply_mode, chain_tone_lut
+from recipe import plan
+from tiled_store import TiledStore
+import tile_engine
+
+# Цвета графиков каналов
+CHANNEL_COLORS = {
+    1: ("black",),
+    3: ("r", "g", "b"),
+}
+
+
+def _band_histograms(band, channels):
+    # calcHist считает во float32; на полосе меньше 2^24 пикселей счёт ещё точный
+    return np.array([
+        cv2.calcHist([band], [channel], None, [256], [0, 256]).ravel() for channel in range(channels)
+    ], dtype=np.int64)
+
+
+def channel_histograms(array, band_pixels=HISTOGRAM_BAND_PIXELS):
+    """
+    Гистограммы каналов массива uint8 целочисленным счётом.
+
+    Массив делится на полосы строк; каждая полоса, пока она в кэше процессора,
+    считается сразу для всех каналов, а полосы распределяются по ядрам.
+    :param array: Массив (H, W) или (H, W, C) uint8
+    :return: Массив int64 формы (C, 256)
+    """
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    rows = max(1, band_pixels // max(1, array.shape[1]))
+    bands = [array[top:top + rows] for top in range(0, array.shape[0], rows)]
+    if len(bands) < 2 or tile_engine.WORKERS < 2:
+        results = [_band_histograms(band, channels) for band in bands]
+    else:
+        results = list(tile_engine.get_pool().map(lambda band: _band_histograms(band, channels), bands))
+    return np.sum(results, axis=0) if results else np.zeros((channels, 256), dtype=np.int64)
+
+
+def image_histograms(image):
+    """
+    Гистограммы каналов цвета изображения PIL или TiledStore (без альфа-канала).
+    :return: Массив int64 формы (1 или 3, 256)
+    """
+    channels = 1 if image.mode == "L" else 3
+    if isinstance(image, TiledStore):
+        # Изображение на диске считается по частям
+        return image.histogram()[:channels]
+    if image.mode not in ("L", "RGB", "RGBA"):
+        image = image.convert("RGB")
+    return channel_histograms(np.asarray(image))[:channels]
+
+
+def histogram_series(histograms):
+    """Пары (цвет, гистограмма) для HistogramView"""
+    return list(zip(CHANNEL_COLORS[len(histograms)], histograms))
+
+
+def remap_histogram(histogram, lut):
+    """Гистограмма после поточечной таблицы lut: значение v переходит в lut[v]"""
+    return np.bincount(lut, weights=histogram, minlength=256)
+
+
+def dkw_bound(samples, confidence=HISTOGRAM_CONFIDENCE):
+    """
+    Граница Дворецкого - Кифера - Вольфовица: с вероятностью confidence
+    доля пикселей не больше любого значения отличается от оценки по выборке
+    из samples независимых точек не больше чем на возвращаемую величину.
+    """
+    return math.sqrt(math.log(2 / (1 - confidence)) / (2 * samples))
+
+
+class HistogramEstimate:
+    def __init__(self, counts, samples=None, confidence=HISTOGRAM_CONFIDENCE):
+        """
+        Гистограммы каналов, посчитанные точно или оценённые по выборке.
+        :param counts: Массив (C, 256) - число пикселей (для выборки - в пересчёте на всё изображение)
+        :param samples: Размер выборки или None для точного счёта
+        """
+        self.counts = counts
+        self.samples = samples
+        self.confidence = confidence
+        self.error_bound = 0.0 if samples is None else dkw_bound(samples, confidence)
+
+    @property
+    def exact(self):
+        return self.samples is None
+
+    def series(self):
+        return histogram_series(self.counts)
+
+    def describe(self):
+        """Подпись к графику: пусто для точной гистограммы, иначе размер выборки и граница ошибки"""
+        if self.exact:
+            return ""
+        return (f"Оценка по {self.samples} пикселям: отклонение доли "
+                f"≤ {self.error_bound:.2%} (вероятность {self.confidence:.0%})")
+
+
+def stratified_sample(image, samples=HISTOGRAM_SAMPLES, seed=0):
+    """
+    Стратифицированная выборка пикселей: изображение делится на квадраты,
+    в каждом независимо берётся один случайный пиксель. У каждого пикселя
+    одинаковая вероятность попасть в выборку, а выборка равномерно покрывает
+    изображение. Точки разных квадратов независимы, поэтому граница dkw_bound
+    к выборке применима (стратификация только уменьшает разброс оценки).
+
+    Изображение читается по рядам квадратов сверху вниз, TiledStore - по рядам плиток.
+    :param image: Изображение PIL или TiledStore
+    :return: Массив (N, C) значений пикселей
+    """
+    width, height = image.size
+    cell = max(1, int(math.sqrt(width * height / samples)))
+    columns, rows = -(-width // cell), -(-height // cell)
+    rng = np.random.default_rng(seed)
+    ys = np.arange(rows)[:, None] * cell + rng.integers(0, cell, (rows, columns))
+    xs = np.arange(columns) * cell + rng.integers(0, cell, (rows, columns))
+    # Точки за краем неполных квадратов отбрасываются, чтобы не завысить вес краёв
+    inside = (xs < width) & (ys < height)
+    if isinstance(image, TiledStore):
+        values = image.sample(xs[inside], ys[inside])
+        return values.reshape(len(values), -1)
+    values = []
+    for top, band_xs, band_ys, band_inside in zip(range(0, height, cell), xs, ys, inside):
+        band = np.asarray(image.crop((0, top, width, min(top + cell, height))))
+        values.append(band[band_ys[band_inside] - top, band_xs[band_inside]].reshape(int(band_inside.sum()), -1))
+    return np.concatenate(values)
+
+
+def _color_image(image):
+    if image.mode not in FUSED_MODES:
+        return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    return image
+
+
+def measure_histograms(image, luma=False, sample_pixels=HISTOGRAM_SAMPLE_PIXELS, samples=HISTOGRAM_SAMPLES):
+    """
+    Гистограммы каналов цвета: точно или, для изображений больше sample_pixels,
+    по стратифицированной выборке с границей ошибки.
+    :param luma: Вернуть ещё и гистограмму яркости (перехода в "L")
+    :return: HistogramEstimate или (HistogramEstimate каналов, HistogramEstimate яркости)
+    """
+    if isinstance(image, BinaryImage):
+        # У чёрно-белого изображения только два значения, счёт - по упакованным битам
+        result = HistogramEstimate(image.histogram())
+        return (result, result) if luma else result
+    image = _color_image(image)
+    channels = 1 if image.mode == "L" else 3
+    width, height = image.size
+    if width * height > sample_pixels:
+        values = stratified_sample(image, samples)[:, :channels]
+        scale = width * height / len(values)
+        counts = np.array([np.bincount(values[:, channel], minlength=256) for channel in range(channels)]) * scale
+        result = HistogramEstimate(counts, len(values))
+        if not luma:
+            return result
+        gray = values[:, 0] if channels == 1 else _apply_mode(np.ascontiguousarray(values[:, None, :]), "L").ravel()
+        return result, HistogramEstimate(np.bincount(gray, minlength=256)[None, :] * scale, len(values))
+
+    result = HistogramEstimate(image_histograms(image))
+    if not luma:
+        return result
+    if channels == 1:
+        return result, result
+    gray = _apply_mode(np.asarray(image)[:, :, :3], "L")
+    return result, HistogramEstimate(channel_histograms(gray))
+
+
+class HistogramEngine:
+    def __init__(self):
+        """
+        Гистограммы текущего изображения без повторного прохода по пикселям.
+
+        Гистограммы исходного изображения (каналы и яркость) считаются один
+        раз. Если план рецепта состоит только из таблиц яркости и контраста,
+        перехода в "L" / RGB и порога, гистограмма результата получается
+        переносом 256 значений через таблицы.
+        """
+        # (ключ исходного изображения, оценка каналов, оценка яркости)
+        self.source = None
+
+    def has_source(self, key):
+        source = self.source
+        return source is not None and source[0] == key
+
+    def measure_source(self, key, image):
+        """Считает и запоминает гистограммы исходного изображения (в фоновом потоке)"""
+        channels, luma = measure_histograms(image, luma=True)
+        self.source = (key, channels, luma)
+
+    def derive(self, key, recipe, mode):
+        """
+        Гистограммы результата рецепта по гистограммам исходного изображения.
+        :param key: Ключ исходного изображения
+        :param mode: Режим исходного изображения
+        :return: HistogramEstimate или None, если план содержит шаги, меняющие гистограмму иначе
+        """
+        source = self.source
+        if source is None or source[0] != key:
+            return None
+        _, channels, luma = source
+        if mode not in FUSED_MODES:
+            mode = "RGB"
+        counts = list(channels.counts)
+        initial = True
+        for step in plan(recipe, mode)[0]:
+            if step.name == "tone":
+                lut = chain_tone_lut([np.asarray(c, dtype=np.float64) for c in counts], step.params)
+                counts = [remap_histogram(c, lut) for c in counts]
+            elif step.name == "threshold" or (step.name == "mode" and step.params[0] == "L"):
+                if len(counts) > 1:
+                    if not initial:
+                        # Яркость после правок каналов не выводится из их гистограмм
+                        return None
+                    counts = list(luma.counts)
+                if step.name == "threshold":
+                    lut = ((np.arange(256) >= step.params[0]) * 255).astype(np.intp)
+                    counts = [remap_histogram(counts[0], lut)]
+            elif step.name == "mode":
+                counts = counts * 3 if len(counts) == 1 else counts
+            else:
+                return None
+            initial = False
+        return HistogramEstimate(np.array(counts), channels.samples, channels.confidence)
+
+
+class HistogramView:
+    def __init__(self, master, figsize=(4, 3), dpi=100):
+        """
+        График гистограммы, который создаётся один раз и обновляется на месте.
+
+        Для каждого цвета есть заливка и контур (StepPatch); при обновлении
+        меняются только их данные и предел по оси Y, а фигура, холст
+        и панель инструментов остаются прежними.
+        :param master: Виджет Tk, в котором размещается график
+        """
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_xlim(0, 256)
+        self.edges = np.arange(257)
+        self.artists = {}
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, master)
+        self.toolbar.update()
+        self.canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+        self.canvas.draw()
+
+    def _artists(self, color):
+        if color not in self.artists:
+            zeros = np.zeros(256)
+            self.artists[color] = (
+                self.ax.stairs(zeros, self.edges, fill=True, color=color, alpha=0.35),
+                self.ax.stairs(zeros, self.edges, color=color, linewidth=0.8),
+            )
+        return self.artists[color]
+
+    def update(self, series, title=None):
+        """
+        Показывает гистограммы.
+        :param series: Список (цвет, гистограмма на 256 значений) или None, чтобы очистить график
+        :param title: Подпись над графиком (например, граница ошибки оценки)
+        """
+        series = series or []
+        shown = {color for color, _ in series}
+        for color, (bar, step) in self.artists.items():
+            bar.set_visible(color in shown)
+            step.set_visible(color in shown)
+
+        peak = 0
+        for color, counts in series:
+            bar, step = self._artists(color)
+            bar.set_data(counts)
+            step.set_data(counts)
+            peak = max(peak, float(np.max(counts)))
+        self.ax.set_ylim(0, peak * 1.05 if peak else 1)
+        self.ax.set_title(title or "", fontsize=8)
+        self.canvas.draw_idle()
@@ -0,0 +1,271 @@
+# history.py
+
+import threading
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from binary_image import BinaryImage
+from constants import (
+    HISTORY_MEMORY_BYTES, HISTORY_RECOMPUTE_COST, HISTORY_SNAPSHOT_INTERVAL, HISTORY_TILE_SIZE, HISTORY_ZLIB_LEVEL
+)
+from image_buffer import WorkingImage, buffers
+import tile_engine
+
+
+def _pixels(image):
+    """Массив пикселей изображения, по которому считаются разности, или None"""
+    if isinstance(image, BinaryImage):
+        return image.words
+    if isinstance(image, WorkingImage):
+        return image.array
+    if isinstance(image, Image.Image) and image.mode in ("L", "RGB", "RGBA"):
+        return np.asarray(image)
+    # TiledStore и особые режимы PIL только пересчитываются
+    return None
+
+
+def _rebuild(image, pixels):
+    """Изображение того же вида, что image, из массива pixels"""
+    if isinstance(image, BinaryImage):
+        return BinaryImage(pixels, image.width)
+    return WorkingImage(pixels, image.mode, buffers)
+
+
+def _map(func, items):
+    # zlib и XOR NumPy отпускают GIL, поэтому плитки обрабатываются на всех ядрах
+    if len(items) < 2 or tile_engine.WORKERS < 2:
+        return [func(item) for item in items]
+    return list(tile_engine.get_pool().map(func, items))
+
+
+class TileDelta:
+    def __init__(self, before, after, tile_size=HISTORY_TILE_SIZE, level=HISTORY_ZLIB_LEVEL):
+        """
+        Разность двух состояний изображения: плитки, в которых они различаются,
+        хранятся как XOR старых и новых пикселей, сжатый zlib.
+        XOR симметричен, поэтому одна разность переводит изображение
+        и из старого состояния в новое, и обратно.
+        :param before: Массив пикселей до правки
+        :param after: Массив той же формы после правки
+        """
+        self.key = (after.shape, after.dtype)
+        height, width = after.shape[:2]
+        boxes = [
+            (top, left) for top in range(0, height, tile_size) for left in range(0, width, tile_size)
+        ]
+
+        def compress(box):
+            top, left = box
+            diff = np.bitwise_xor(
+                before[top:top + tile_size, left:left + tile_size], after[top:top + tile_size, left:left + tile_size]
+            )
+            return (top, left, diff.shape, zlib.compress(diff, level)) if diff.any() else None
+
+        self.tiles = [tile for tile in _map(compress, boxes) if tile is not None]
+        self.nbytes = sum(len(data) for _, _, _, data in self.tiles)
+
+    def apply(self, pixels):
+        """Переводит массив pixels в соседнее состояние на месте"""
+
+        def restore(tile):
+            top, left, shape, data = tile
+            diff = np.frombuffer(zlib.decompress(data), dtype=pixels.dtype).reshape(shape)
+            region = pixels[top:top + shape[0], left:left + shape[1]]
+            np.bitwise_xor(region, diff, out=region)
+
+        _map(restore, self.tiles)
+
+
+class HistoryEntry:
+    def __init__(self, label, recipe, settings, apply):
+        """
+        Состояние изображения после одной правки.
+        :param label: Название правки для интерфейса
+        :param recipe: Рецепт, который приводит исходный файл к этому состоянию
+        :param settings: Параметры коррекции CanvasManager в этом состоянии
+        :param apply: Функция (изображение предыдущего состояния) -> изображение этого состояния
+        """
+        self.label = label
+        self.recipe = recipe
+        self.settings = settings
+        self.apply = apply
+        # Полная копия состояния и разность с предыдущим (любое из них может отсутствовать)
+        self.snapshot = None
+        self.delta = None
+        # Сохранено ли состояние (чтобы не считать разность повторно после отмены)
+        self.stored = False
+
+    @property
+    def snapshot_bytes(self):
+        return _pixels(self.snapshot).nbytes if self.snapshot is not None else 0
+
+    @property
+    def delta_bytes(self):
+        return self.delta.nbytes if self.delta is not None else 0
+
+    @property
+    def nbytes(self):
+        return self.snapshot_bytes + self.delta_bytes
+
+
+class EditHistory:
+    def __init__(self, max_bytes=HISTORY_MEMORY_BYTES, snapshot_interval=HISTORY_SNAPSHOT_INTERVAL,
+                 recompute_cost=HISTORY_RECOMPUTE_COST):
+        """
+        История правок с отменой и повтором в пределах объёма памяти.
+
+        Для каждого состояния запоминаются правка и её параметры и сжатая
+        разность по плиткам с предыдущим состоянием. Каждое snapshot_interval-е
+        состояние (и состояние после смены формы изображения) хранится ещё
+        и полной копией. Если объём больше max_bytes, вытесняются сначала
+        старые копии, затем старые разности; такие состояния восстанавливаются
+        повтором правок от ближайшего сохранённого.
+        :param recompute_cost: Цена повтора правки относительно применения одной разности
+        """
+        self.max_bytes = max_bytes
+        self.snapshot_interval = snapshot_interval
+        self.recompute_cost = recompute_cost
+        self.entries = []
+        self.index = -1
+        # Последнее сохранённое состояние (HistoryEntry, изображение) - от него считаются разности
+        self.last = None
+        self.lock = threading.Lock()
+
+    def reset(self, recipe, settings, apply):
+        """Начинает историю заново; apply возвращает исходное изображение"""
+        with self.lock:
+            self.entries = [HistoryEntry("Исходное изображение", recipe, settings, apply)]
+            self.entries[0].stored = True
+            self.index = 0
+            self.last = None
+
+    @property
+    def current(self):
+        return self.entries[self.index] if self.entries else None
+
+    def can_undo(self):
+        return self.index > 0
+
+    def can_redo(self):
+        return self.index < len(self.entries) - 1
+
+    def push(self, label, recipe, settings, apply):
+        """
+        Добавляет состояние после текущего (отменённые правки после него забываются).
+        :return: HistoryEntry
+        """
+        entry = HistoryEntry(label, recipe, settings, apply)
+        with self.lock:
+            del self.entries[self.index + 1:]
+            self.entries.append(entry)
+            self.index = len(self.entries) - 1
+        return entry
+
+    def undo(self):
+        """Переходит на предыдущее состояние и возвращает его (или None)"""
+        with self.lock:
+            if self.index <= 0:
+                return None
+            self.index -= 1
+            return self.entries[self.index]
+
+    def redo(self):
+        """Переходит на следующее отменённое состояние и возвращает его (или None)"""
+        with self.lock:
+            if self.index >= len(self.entries) - 1:
+                return None
+            self.index += 1
+            return self.entries[self.index]
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self.entries)
+
+    def store(self, entry, image):
+        """
+        Сохраняет изображение состояния entry (в фоновом потоке): разностью
+        с предыдущим состоянием и/или копией; изображения без массива пикселей
+        (TiledStore) не сохраняются и при отмене пересчитываются.
+        """
+        with self.lock:
+            if entry not in self.entries:
+                # Состояние уже забыто новой правкой после отмены
+                return
+            position = self.entries.index(entry)
+            previous = self.last if self.last is not None and position > 0 and \
+                self.entries[position - 1] is self.last[0] else None
+            self.last = (entry, image)
+            if entry.stored:
+                return
+            entry.stored = True
+
+        pixels = _pixels(image)
+        if pixels is None:
+            return
+        before = _pixels(previous[1]) if previous is not None else None
+        if before is not None and before.shape == pixels.shape and before.dtype == pixels.dtype:
+            entry.delta = TileDelta(before, pixels)
+        if entry.delta is None or position % self.snapshot_interval == 0:
+            # Копировать не нужно: изображения состояний после правки не меняются
+            entry.snapshot = image
+        self._evict()
+
+    def _evict(self):
+        with self.lock:
+            total = sum(entry.nbytes for entry in self.entries)
+            # Сначала старые полные копии, потом старые разности
+            for attribute in ("snapshot", "delta"):
+                for entry in self.entries:
+                    if total <= self.max_bytes:
+                        return
+                    total -= getattr(entry, attribute + "_bytes")
+                    setattr(entry, attribute, None)
+
+    def _path_cost(self, entries, start, target):
+        # Цена перехода из состояния start в target: назад - только по разностям
+        if start > target:
+            steps = entries[target + 1:start + 1]
+            return len(steps) if all(entry.delta is not None for entry in steps) else None
+        return sum(1 if entry.delta is not None else self.recompute_cost for entry in entries[start + 1:target + 1])
+
+    def image_at(self, entry):
+        """
+        Изображение состояния entry (в фоновом потоке): от ближайшего по цене
+        сохранённого состояния - копии, последнего сохранённого или исходного -
+        по разностям, а где их нет, повтором правок.
+        """
+        with self.lock:
+            entries = list(self.entries)
+            target = entries.index(entry)
+            anchors = {0: None}
+            anchors.update((position, item.snapshot) for position, item in enumerate(entries)
+                           if item.snapshot is not None)
+            if self.last is not None and self.last[0] in entries:
+                anchors[entries.index(self.last[0])] = self.last[1]
+
+        costs = [(self._path_cost(entries, start, target), start) for start in anchors]
+        cost, start = min((cost, start) for cost, start in costs if cost is not None)
+        image = anchors[start] if anchors[start] is not None else entries[0].apply(None)
+        pixels = None
+        steps = range(start, target, -1) if start > target else range(start + 1, target + 1)
+        for position in steps:
+            delta = entries[position].delta
+            if delta is not None and (pixels is not None or self._matches(image, delta)):
+                if pixels is None:
+                    # Разности применяются к копии, изображения состояний не меняются
+                    source = _pixels(image)
+                    pixels = buffers.take(source.shape, source.dtype)
+                    np.copyto(pixels, source)
+                delta.apply(pixels)
+                continue
+            if pixels is not None:
+                image, pixels = _rebuild(image, pixels), None
+            image = entries[position].apply(image)
+        return _rebuild(image, pixels) if pixels is not None else image
+
+    @staticmethod
+    def _matches(image, delta):
+        pixels = _pixels(image)
+        return pixels is not None and (pixels.shape, pixels.dtype) == delta.key
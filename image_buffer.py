@@ -0,0 +1,225 @@
+# image_buffer.py
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from constants import IMAGE_BUFFER_POOL_BYTES
+from enhance_engine import merge_alpha
+from tile_engine import map_tiles, tiles_enabled
+
+# Режимы, пиксели которых читаются в массив без преобразования
+PIXEL_MODES = ("L", "RGB", "RGBA")
+
+
+class BufferPool:
+    def __init__(self, max_bytes=IMAGE_BUFFER_POOL_BYTES):
+        """
+        Свободные непрерывные массивы, которые используются повторно между вызовами.
+        Массивы, которые не помещаются в max_bytes, вытесняются начиная с самых старых.
+        """
+        self.max_bytes = max_bytes
+        self.free = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def take(self, shape, dtype=np.uint8):
+        """Массив формы shape (содержимое не определено): из пула или новый"""
+        key = (tuple(shape), np.dtype(dtype))
+        with self.lock:
+            arrays = self.free.get(key)
+            if arrays:
+                array = arrays.pop()
+                if not arrays:
+                    del self.free[key]
+                self.bytes -= array.nbytes
+                return array
+        return np.empty(shape, dtype=dtype)
+
+    def give(self, array):
+        """Возвращает массив в пул; после этого массив использовать нельзя"""
+        if array.nbytes > self.max_bytes or not array.flags.c_contiguous or not array.flags.owndata:
+            return
+        key = (array.shape, array.dtype)
+        with self.lock:
+            self.free.setdefault(key, []).append(array)
+            self.free.move_to_end(key)
+            self.bytes += array.nbytes
+            while self.bytes > self.max_bytes:
+                oldest, arrays = next(iter(self.free.items()))
+                self.bytes -= arrays.pop(0).nbytes
+                if not arrays:
+                    del self.free[oldest]
+
+    def reserve(self, shape, dtype=np.uint8, count=1):
+        """Заранее выделяет count массивов формы shape, если их ещё нет в пуле"""
+        key = (tuple(shape), np.dtype(dtype))
+        with self.lock:
+            missing = count - len(self.free.get(key, ()))
+        for _ in range(missing):
+            self.give(np.empty(shape, dtype=dtype))
+
+    def clear(self):
+        with self.lock:
+            self.free.clear()
+            self.bytes = 0
+
+
+# Общий пул для промежуточных массивов обработки
+buffers = BufferPool()
+
+
+def map_pixels(array, mode):
+    """
+    Изображение PIL, которое использует память массива, без копии.
+    Изображение только для чтения: операции PIL над ним создают новые изображения.
+    :param array: Непрерывный массив uint8 (H, W) для L или (H, W, 4) для RGBA
+    """
+    height, width = array.shape[:2]
+    return Image.frombuffer(mode, (width, height), array, "raw", mode, 0, 1)
+
+
+def read_pixels(image):
+    """
+    Пиксели изображения PIL (L, RGB или RGBA) в виде непрерывного массива
+    (H, W) или (H, W, C) в том же порядке каналов, что у PIL (без перестановки в BGR).
+    Пиксели копируются один раз (Image.tobytes); массив только для чтения.
+    """
+    return np.asarray(image)
+
+
+def wrap_pixels(array, mode):
+    """
+    Изображение PIL в режиме mode из результата обработки.
+    L и RGBA используют память массива без копии, RGB копируется один раз
+    (PIL хранит его в своей раскладке).
+    :param array: Массив uint8 (H, W), (H, W, 3) или (H, W, 4); для RGB четвёртый канал отбрасывается
+    """
+    array = np.ascontiguousarray(array)
+    height, width = array.shape[:2]
+    if mode == "RGB":
+        rawmode = "RGB" if array.shape[2] == 3 else "RGBX"
+        return Image.frombytes("RGB", (width, height), array, "raw", rawmode)
+    return map_pixels(array, mode)
+
+
+# Названия каналов рабочего буфера, как Image.getbands
+_BANDS = {"L": ("L",), "RGB": ("R", "G", "B"), "RGBA": ("R", "G", "B", "A")}
+
+
+class WorkingImage:
+    def __init__(self, array, mode, pool=None):
+        """
+        Изображение полного разрешения в виде непрерывного массива NumPy:
+        (H, W) для L, (H, W, 3) для RGB, (H, W, 4) для RGBA.
+
+        Правки пишут результат в массивы из пула (out=) вместо создания
+        изображений PIL; PIL создаётся только для показа и выгрузки (crop,
+        reduce, resize, to_pil). Интерфейс чтения - как у изображения PIL.
+        :param pool: Пул, из которого взят массив: когда изображение больше
+                     никому не нужно, массив возвращается туда. None - массив
+                     чужой (например, из кэша шагов) и не переиспользуется.
+        """
+        self.array = np.ascontiguousarray(array)
+        self.mode = mode
+        self.height, self.width = self.array.shape[:2]
+        if pool is not None:
+            weakref.finalize(self, pool.give, self.array)
+
+    @classmethod
+    def from_image(cls, image):
+        """Копирует изображение PIL (другие режимы приводятся к RGB или RGBA)"""
+        if image.mode not in PIXEL_MODES:
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        return cls(read_pixels(image), image.mode)
+
+    @classmethod
+    def merge(cls, array, alpha, mode, pool=buffers):
+        """
+        Рабочее изображение из массива цвета и альфа-канала, как merge_alpha.
+        Массив цвета используется без копии и не переиспользуется.
+        """
+        if mode == "L" and array.ndim == 2 or mode == "RGB" and array.ndim == 3:
+            return cls(array, mode)
+        if mode == "RGBA" and array.ndim == 3 and alpha is not None:
+            out = pool.take(array.shape[:2] + (4,))
+            out[:, :, :3] = array
+            out[:, :, 3] = alpha
+            return cls(out, mode, pool)
+        return cls.from_image(merge_alpha(array, alpha, mode))
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    @property
+    def __array_interface__(self):
+        # np.asarray(image) - вид на массив только для чтения; он держит само
+        # изображение, поэтому массив не вернётся в пул, пока вид используется
+        interface = dict(self.array.__array_interface__)
+        interface["data"] = (interface["data"][0], True)
+        return interface
+
+    def getbands(self):
+        return _BANDS[self.mode]
+
+    def _pil_view(self):
+        # Изображение PIL на время одной операции: L и RGBA - поверх массива, RGB - копия
+        if self.mode == "RGB":
+            return wrap_pixels(self.array, "RGB")
+        return map_pixels(self.array, self.mode)
+
+    def to_pil(self):
+        """Независимая копия в виде изображения PIL (для выгрузки)"""
+        return Image.frombytes(self.mode, self.size, self.array)
+
+    def crop(self, box):
+        """Часть изображения в виде изображения PIL"""
+        left, top, right, bottom = box
+        return Image.fromarray(self.array[top:bottom, left:right].copy(), self.mode)
+
+    def reduce(self, factor):
+        return self._pil_view().reduce(factor)
+
+    def resize(self, size, *args, **kwargs):
+        return self._pil_view().resize(size, *args, **kwargs)
+
+    def convert(self, mode):
+        return self._pil_view().convert(mode)
+
+    def getpixel(self, position):
+        """Значение пикселя, как Image.getpixel"""
+        x, y = position
+        value = self.array[y, x]
+        return int(value) if self.array.ndim == 2 else tuple(int(v) for v in value)
+
+    def morph(self, operation, matrix, iterations=1, pool=buffers):
+        """
+        Морфологическая операция с записью результата в массив из пула.
+        Как и для изображений PIL, альфа-канал отбрасывается.
+        :return: Новый WorkingImage в режиме L или RGB
+        """
+        # morphology.py сам использует этот модуль для чтения изображений PIL
+        from morphology import morph_array, morph_halo
+
+        source, scratch = self.array, None
+        if self.mode == "RGBA":
+            scratch = cv2.cvtColor(source, cv2.COLOR_RGBA2RGB, dst=pool.take(source.shape[:2] + (3,)))
+            source = scratch
+        out = pool.take(source.shape)
+        halo = morph_halo(operation, matrix, iterations)
+        if tiles_enabled(source, halo):
+            map_tiles(source, lambda tile: morph_array(tile, operation, matrix, iterations), halo, out=out)
+        else:
+            morph_array(source, operation, matrix, iterations, out=out)
+        if scratch is not None:
+            pool.give(scratch)
+        return WorkingImage(out, "L" if out.ndim == 2 else "RGB", pool)
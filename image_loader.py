@@ -0,0 +1,103 @@
+# image_loader.py
+
+import threading
+
+from PIL import Image
+
+from constants import OUT_OF_CORE_PIXELS
+
+# Режимы, которые декодер JPEG умеет выдавать при уменьшенном декодировании
+DRAFT_MODES = ("RGB", "L")
+
+# Image.MAX_IMAGE_PIXELS - общий для процесса, а файлы открываются и в потоке
+# интерфейса, и в фоновых: без блокировки два вызова open_unlimited вперемешку
+# оставили бы проверку выключенной навсегда
+_limit_lock = threading.Lock()
+
+
+def open_unlimited(file_path):
+    """
+    Открывает изображение без ограничения Image.MAX_IMAGE_PIXELS.
+    Файлы выбирает сам пользователь, а сканы в гигапиксели - обычный случай.
+    Ограничение проверяется только в Image.open (чтение заголовка), поэтому
+    оно снимается лишь на это время.
+    """
+    with _limit_lock:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(file_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+
+def open_reduced(file_path, size):
+    """
+    Открывает изображение сразу в уменьшенном виде.
+
+    Для JPEG используется масштабирование декодера (draft: 1/2, 1/4, 1/8),
+    поэтому полное изображение не декодируется. Для остальных форматов
+    изображение декодируется целиком и уменьшается через reduce.
+    :param size: Нужный размер; результат не меньше его (дальше нужен resize)
+    :return: Изображение PIL
+    """
+    image = open_unlimited(file_path)
+    if image.mode in DRAFT_MODES:
+        image.draft(image.mode, size)
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor > 1 and image.mode in ("L", "RGB", "RGBA"):
+        return image.reduce(factor)
+    image.load()
+    return image
+
+
+class LazyImage:
+    def __init__(self, file_path):
+        """
+        Изображение, которое декодируется только при первом обращении к пикселям.
+
+        Размер, режим и формат берутся из заголовка файла. Изображения от
+        OUT_OF_CORE_PIXELS пикселей не декодируются в память, а раскладываются
+        в TiledStore на диске (см. tiled_store.py).
+        :param file_path: Путь к файлу
+        """
+        self.path = file_path
+        with open_unlimited(file_path) as header:
+            self.size = header.size
+            self.mode = header.mode
+            self.format = header.format
+        self.image = None
+        self.previews = {}
+        self.lock = threading.Lock()
+        self.out_of_core = self.size[0] * self.size[1] >= OUT_OF_CORE_PIXELS
+
+    @property
+    def loaded(self):
+        """Декодировано ли изображение полного разрешения"""
+        return self.image is not None
+
+    def get(self):
+        """Изображение полного разрешения (декодируется один раз, из любого потока)"""
+        with self.lock:
+            if self.image is None:
+                if self.out_of_core:
+                    from tiled_store import TiledStore
+                    self.image = TiledStore.from_file(self.path)
+                else:
+                    image = open_unlimited(self.path)
+                    image.load()
+                    self.image = image
+            return self.image
+
+    def preview(self, size):
+        """
+        Изображение, уменьшенное до size (один раз на размер).
+        Если полное изображение ещё не декодировано, используется open_reduced.
+        """
+        if self.out_of_core:
+            return self.get().preview(size)
+        with self.lock:
+            if size not in self.previews:
+                source = self.image if self.image is not None else open_reduced(self.path, size)
+                self.previews[size] = source.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            return self.previews[size]
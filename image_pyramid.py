@@ -0,0 +1,85 @@
+# image_pyramid.py
+
+from PIL import Image
+
+from binary_image import BinaryImage
+from constants import TILE_SIZE
+
+# Режимы, которые умеют уменьшать Image.reduce и показывать ImageTk
+PYRAMID_MODES = ("L", "RGB", "RGBA")
+
+
+class ImagePyramid:
+    def __init__(self, image, key=None, tile_size=TILE_SIZE):
+        """
+        Пирамида уменьшенных копий изображения, разбитых на плитки.
+
+        Уровень 0 - само изображение, каждый следующий уменьшен вдвое.
+        Уровни строятся только при первом обращении, поэтому для показа
+        части изображения не нужно пересчитывать всё изображение целиком.
+        :param image: Изображение PIL или BinaryImage (уровень 0 остаётся упакованным,
+                      плитки и уменьшенные уровни получаются в "L")
+        :param key: Ключ состояния изображения (для кэшей плиток)
+        :param tile_size: Размер стороны плитки в пикселях
+        """
+        if image.mode not in PYRAMID_MODES and not isinstance(image, BinaryImage):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        self.key = key
+        self.tile_size = tile_size
+        self.levels = [image]
+
+    @property
+    def max_level(self):
+        """Номер уровня, на котором изображение помещается в одну плитку"""
+        width, height = self.levels[0].size
+        level = 0
+        while max(width, height) > self.tile_size:
+            width, height = (width + 1) // 2, (height + 1) // 2
+            level += 1
+        return level
+
+    def level(self, index):
+        """Изображение уровня index (строится при первом обращении)"""
+        while len(self.levels) <= index:
+            self.levels.append(self.levels[-1].reduce(2))
+        return self.levels[index]
+
+    def level_for_scale(self, scale):
+        """
+        Ближайший уровень не меньше нужного масштаба.
+        :param scale: Масштаб показа (пикселей экрана на пиксель изображения)
+        """
+        level = 0
+        while level < self.max_level and scale * (1 << (level + 1)) <= 1:
+            level += 1
+        return level
+
+    def tile_grid(self, index):
+        """Количество плиток уровня по горизонтали и вертикали"""
+        width, height = self.level(index).size
+        return -(-width // self.tile_size), -(-height // self.tile_size)
+
+    def tile_box(self, index, tile_x, tile_y):
+        """Границы плитки (left, top, right, bottom) в координатах уровня"""
+        width, height = self.level(index).size
+        left, top = tile_x * self.tile_size, tile_y * self.tile_size
+        return left, top, min(left + self.tile_size, width), min(top + self.tile_size, height)
+
+    def tile(self, index, tile_x, tile_y, size=None, visible=None):
+        """
+        Плитка уровня index.
+        :param size: Размер на экране; при увеличении используются ближайшие пиксели
+        :param visible: Видимая часть плитки на экране (left, top, right, bottom)
+                        в координатах size; увеличивается только она
+        """
+        tile = self.level(index).crop(self.tile_box(index, tile_x, tile_y))
+        if size is None or size == tile.size and visible is None:
+            return tile
+        resample = Image.Resampling.NEAREST if size[0] > tile.width else Image.Resampling.BILINEAR
+        if visible is None:
+            return tile.resize(size, resample)
+        left, top, right, bottom = visible
+        scale_x, scale_y = tile.width / size[0], tile.height / size[1]
+        # Та же сетка, что и у всей плитки, поэтому части соседних кадров совпадают
+        box = (left * scale_x, top * scale_y, right * scale_x, bottom * scale_y)
+        return tile.resize((right - left, bottom - top), resample, box=box)
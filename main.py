@@ -4,11 +4,13 @@ import tkinter as tk
 from tkinter import filedialog, ttk
 import os
 from color_conversion import RGB_CONVERSIONS
-from constants import THUMBNAIL_SIZE, SUPPORTED_IMAGE_FORMATS, COLOR_DEPTH, COLOR_MODELS
+from constants import (
+    THUMBNAIL_SIZE, SUPPORTED_IMAGE_FORMATS, COLOR_DEPTH, COLOR_MODELS, CHANNEL_NAMES, ZOOM_STEP,
+    KERNEL_EDITOR_PIXELS, MORPH_MAX_ITERATIONS, MORPH_MAX_KERNEL_SIZE,
+)
 from canvas_manager import CanvasManager
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.figure import Figure
+from histogram import HistogramView
+import cv2
 import numpy as np
 
 # Глобальные переменные
@@ -36,18 +38,31 @@ def load_image():
             file_size = os.path.getsize(file_path)
             file_size_kb = file_size / 1024
             file_size_mb = file_size_kb / 1024
-            file_format = canvas_manager.original_img.format
-            depth = COLOR_DEPTH.get(canvas_manager.img.mode, "Неизвестно")
-            color_model = canvas_manager.img.mode
+            # Формат, размер и режим - из заголовка файла, без полного декодирования
+            file_format = canvas_manager.source.format
+            depth = COLOR_DEPTH.get(canvas_manager.mode, "Неизвестно")
+            color_model = canvas_manager.mode
             current_model = color_model
 
             update_image_info(canvas_manager.original_width, canvas_manager.original_height, 
                              file_size_kb, file_size_mb, file_format, depth, color_model)
             reset_pixel_selection()
-            plot_histogram(canvas_manager.img)
+            request_histogram()
     except Exception as e:
         print(f"Ошибка при загрузке изображения: {e}")
 
+def save_recipe():
+    """Сохраняет правки текущего изображения в файл для batch.py --recipe"""
+    if not canvas_manager.has_image():
+        print("Сначала загрузите изображение")
+        return
+    try:
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Recipe", "*.json")])
+        if file_path:
+            canvas_manager.recipe.save(file_path)
+    except Exception as e:
+        print(f"Ошибка при сохранении рецепта: {e}")
+
 def update_image_info(width, height, size_kb, size_mb, format, depth, color_model):
     info_text = (
         f"Размер: {width}x{height} пикселей\n"
@@ -59,21 +74,26 @@ def update_image_info(width, height, size_kb, size_mb, format, depth, color_mode
     info_label.config(text=info_text)
 
 def select_pixel(event):
-    global current_pixel
-    if canvas_manager.img:
-        x, y = event.x, event.y
-        if (canvas_manager.offset_x <= x < canvas_manager.offset_x + canvas_manager.scaled_width and
-            canvas_manager.offset_y <= y < canvas_manager.offset_y + canvas_manager.scaled_height):
-            img_x = int((x - canvas_manager.offset_x) * (canvas_manager.original_width / canvas_manager.scaled_width))
-            img_y = int((y - canvas_manager.offset_y) * (canvas_manager.original_height / canvas_manager.scaled_height))
-            rgb = canvas_manager.img.getpixel((img_x, img_y))
-            current_pixel = rgb
-            pixel_info.config(text=f"X: {img_x}, Y: {img_y}\nRGB: {rgb}")
-            update_color_display(rgb)
-            convert_color(rgb)
+    if canvas_manager.has_image():
+        # Координаты пересчитываются с учётом масштаба и сдвига
+        position = canvas_manager.canvas_to_image(event.x, event.y)
+        if position:
+            # Цвет берётся после завершения уже запущенной обработки
+            canvas_manager.submit_with_image(
+                lambda image: image.getpixel(position),
+                lambda rgb: show_pixel(position, rgb)
+            )
         else:
             pixel_info.config(text="X: -, Y: -\nRGB: (-, -, -)")
 
+def show_pixel(position, rgb):
+    global current_pixel
+    img_x, img_y = position
+    current_pixel = rgb
+    pixel_info.config(text=f"X: {img_x}, Y: {img_y}\nRGB: {rgb}")
+    update_color_display(rgb)
+    convert_color(rgb)
+
 def update_color_display(rgb):
     hex_color = "#{:02x}{:02x}{:02x}".format(*rgb)
     color_display.config(bg=hex_color)
@@ -95,35 +115,67 @@ def convert_color(rgb):
         print(f"Операция '{model}' не поддерживается")
 
 def on_model_change(*args):
+    channel_menu.config(values=CHANNEL_NAMES[model_var.get()])
+    channel_var.set(CHANNEL_NAMES[model_var.get()][0])
     if current_pixel:
         convert_color(current_pixel)
 
+def update_channel_view(*args):
+    if not canvas_manager.has_image():
+        return
+    if channel_view_var.get():
+        canvas_manager.show_channel(model_var.get(), max(channel_menu.current(), 0))
+    else:
+        canvas_manager.show_channel(None)
+        channel_value_label.config(text="")
+
+def show_channel_value(event):
+    # Значение берётся из закэшированных плоскостей, без пересчёта
+    if canvas_manager.channel_view is None:
+        return
+    position = canvas_manager.canvas_to_image(event.x, event.y)
+    if position:
+        value = canvas_manager.get_channel_value(*position)
+        if value is not None:
+            channel_value_label.config(text=f"{channel_var.get()}: {value:.3f}")
+
+def zoom_canvas(event):
+    # Колесо мыши: event.delta в Windows и macOS, кнопки 4 и 5 в Linux
+    factor = 1 / ZOOM_STEP if event.num == 5 or event.delta < 0 else ZOOM_STEP
+    canvas_manager.zoom_at(factor, event.x, event.y)
+
+pan_start = None
+
+def start_pan(event):
+    global pan_start
+    pan_start = (event.x, event.y)
+
+def pan_canvas(event):
+    global pan_start
+    if pan_start:
+        canvas_manager.pan(event.x - pan_start[0], event.y - pan_start[1])
+        pan_start = (event.x, event.y)
+
 def apply_transformations():
     canvas_manager.change_image(current_brightness, current_contrast, current_color, current_sharpness, current_model)
-    # plot_histogram(canvas_manager.img)
+    request_histogram()
 
-def plot_histogram(image):
-    fig = Figure(figsize=(4, 3), dpi=100)
-    ax = fig.add_subplot(111)
-
-    if image is not None:
-        if image.mode == "L":
-         ax.hist(np.array(image).ravel(), bins=256, color='black', alpha=0.75)
-        else:
-            colors = ("r", "g", "b")
-            for i, color in enumerate(colors):
-                ax.hist(np.array(image)[:, :, i].ravel(), bins=256, color=color, alpha=0.75) 
-
-    for widget in histogram_frame.winfo_children():
-        widget.destroy()
+def show_busy(busy):
+    if busy:
+        busy_label.config(text="Обработка...")
+        busy_bar.start(10)
+    else:
+        busy_label.config(text="")
+        busy_bar.stop()
 
-    canvas = FigureCanvasTkAgg(fig, master=histogram_frame)
-    canvas.draw()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+def request_histogram():
+    # После поточечных правок гистограмма выводится сразу, без прохода по пикселям
+    if canvas_manager.has_image():
+        canvas_manager.request_histogram(plot_histogram)
 
-    toolbar = NavigationToolbar2Tk(canvas, histogram_frame)
-    toolbar.update()
-    canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+def plot_histogram(estimate):
+    # График создан один раз, обновляются только данные
+    histogram_view.update(estimate.series(), estimate.describe())
 
 def update_brightness(scale):
     global current_brightness
@@ -161,11 +213,12 @@ def create_kernel_grid(size):
     if kernel_editor:
         kernel_editor.destroy()
     
-    kernel_editor = tk.Canvas(kernel_editor_frame, width=size*30, height=size*30)
+    # Большие ядра рисуются мелкими клетками, чтобы редактор не выходил за панель
+    cell_size = max(3, KERNEL_EDITOR_PIXELS // size)
+    kernel_editor = tk.Canvas(kernel_editor_frame, width=size*cell_size, height=size*cell_size)
     kernel_editor.pack(pady=5)
     
     kernel_matrix = []
-    cell_size = 30
     for i in range(size):
         row = []
         for j in range(size):
@@ -188,6 +241,21 @@ def toggle_cell(i, j):
         kernel_matrix[i][j] = 0
     kernel_editor.itemconfig(i*current_kernel_size + j + 1, fill=color)
 
+def set_kernel_shape(shape):
+    """
+    Заполняет редактор ядра готовой формой.
+    :param shape: Константа cv2.MORPH_RECT / MORPH_CROSS / MORPH_ELLIPSE или None, чтобы очистить
+    """
+    size = current_kernel_size
+    if shape is None:
+        matrix = np.zeros((size, size), dtype=np.uint8)
+    else:
+        matrix = cv2.getStructuringElement(shape, (size, size))
+    for i in range(size):
+        for j in range(size):
+            kernel_matrix[i][j] = int(matrix[i, j])
+            kernel_editor.itemconfig(i*size + j + 1, fill="black" if matrix[i, j] else "white")
+
 def update_kernel_size():
     global current_kernel_size
     current_kernel_size = kernel_size_var.get()
@@ -197,7 +265,7 @@ def get_kernel_matrix():
     return np.array(kernel_matrix, dtype=np.uint8)
 
 def apply_morphology():
-    if canvas_manager.img:
+    if canvas_manager.has_image():
         try:
             kernel = {
                 "matrix": get_kernel_matrix(),
@@ -206,13 +274,45 @@ def apply_morphology():
             canvas_manager.apply_morph_operation(
                 operation=operation_var.get(),
                 kernel=kernel,
-                iterations=1
+                iterations=iterations_var.get()
             )
+            request_histogram()
         except Exception as e:
             print(f"Ошибка: {str(e)}")
     else:
         print("Сначала загрузите изображение")
 
+def binarize():
+    if canvas_manager.has_image():
+        try:
+            canvas_manager.binarize(threshold_var.get())
+            request_histogram()
+        except Exception as e:
+            print(f"Ошибка: {str(e)}")
+    else:
+        print("Сначала загрузите изображение")
+
+def undo(event=None):
+    restore_history(canvas_manager.undo, "Нечего отменять")
+
+def redo(event=None):
+    restore_history(canvas_manager.redo, "Нечего повторять")
+
+def restore_history(step, message):
+    global current_brightness, current_contrast, current_color, current_sharpness, current_model
+    if not canvas_manager.has_image():
+        return
+    if not step():
+        print(message)
+        return
+    # Ползунки показывают параметры коррекции восстановленного состояния
+    current_brightness, current_contrast = canvas_manager.brightness, canvas_manager.contrast
+    current_color, current_sharpness = canvas_manager.color, canvas_manager.sharpness
+    current_model = canvas_manager.mode
+    for scale, value in zip(adjust_scales, (current_brightness, current_contrast, current_color, current_sharpness)):
+        scale.set(value)
+    request_histogram()
+
 # style = ttk.Style()
 # style.configure('TFrame', background='#f0f0f0')
 # style.configure('TButton', padding=3)
@@ -230,6 +330,27 @@ toolbar_frame.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
 load_button = ttk.Button(toolbar_frame, text="Загрузить изображение", command=load_image)
 load_button.pack(side=tk.LEFT, padx=5, pady=2)
 
+# Индикатор фоновой обработки
+busy_bar = ttk.Progressbar(toolbar_frame, mode="indeterminate", length=80)
+busy_bar.pack(side=tk.RIGHT, padx=5, pady=2)
+busy_label = tk.Label(toolbar_frame, text="")
+busy_label.pack(side=tk.RIGHT, padx=5)
+
+# Показ изображения целиком (колесо мыши - масштаб, правая кнопка - сдвиг)
+fit_button = ttk.Button(toolbar_frame, text="Вписать", command=lambda: canvas_manager.reset_view())
+fit_button.pack(side=tk.LEFT, padx=5, pady=2)
+
+recipe_button = ttk.Button(toolbar_frame, text="Сохранить рецепт", command=save_recipe)
+recipe_button.pack(side=tk.LEFT, padx=5, pady=2)
+
+# Отмена и повтор правок (Ctrl+Z, Ctrl+Y)
+undo_button = ttk.Button(toolbar_frame, text="Отменить", command=undo)
+undo_button.pack(side=tk.LEFT, padx=5, pady=2)
+redo_button = ttk.Button(toolbar_frame, text="Повторить", command=redo)
+redo_button.pack(side=tk.LEFT, padx=5, pady=2)
+root.bind("<Control-z>", undo)
+root.bind("<Control-y>", redo)
+
 # Левая панель (только холст)
 left_frame = tk.Frame(root)
 left_frame.grid(row=1, column=0, padx=5, pady=5)
@@ -288,8 +409,24 @@ model_menu = ttk.Combobox(convert_frame, textvariable=model_var, values=COLOR_MO
 model_menu.pack(pady=5, padx=5, fill=tk.X)
 result_label = tk.Label(convert_frame, text="Результат: ", anchor='w')
 result_label.pack(pady=5, padx=5, fill=tk.X)
+
+# Просмотр отдельного канала модели по всему изображению
+channel_frame = tk.Frame(convert_frame)
+channel_frame.pack(pady=5, padx=5, fill=tk.X)
+channel_view_var = tk.BooleanVar(value=False)
+ttk.Checkbutton(channel_frame, text="Показать канал", variable=channel_view_var,
+                command=update_channel_view).pack(side=tk.LEFT)
+channel_var = tk.StringVar(value=CHANNEL_NAMES[COLOR_MODELS[0]][0])
+channel_menu = ttk.Combobox(channel_frame, textvariable=channel_var,
+                            values=CHANNEL_NAMES[COLOR_MODELS[0]], state="readonly", width=6)
+channel_menu.pack(side=tk.LEFT, padx=5)
+channel_value_label = tk.Label(channel_frame, text="", anchor='w')
+channel_value_label.pack(side=tk.LEFT, padx=5)
+
 # Привязываем событие изменения модели
 model_var.trace("w", on_model_change)
+model_var.trace("w", update_channel_view)
+channel_var.trace("w", update_channel_view)
 
 # Блок настроек изображения
 adjust_frame = tk.Frame(scrollable_frame, borderwidth=2, relief="groove")
@@ -305,6 +442,7 @@ controls = [
     ("Резкость", update_sharpness)
 ]
 i = 0
+adjust_scales = []
 for text, callback in controls:
     frame = tk.Frame(adjust_frame)
     frame.pack(pady=2, fill=tk.X)
@@ -313,6 +451,7 @@ for text, callback in controls:
     scale.set(1.0)
     scale.bind("<ButtonRelease-1>", lambda e, v=scale, cb=callback: cb(v.get()))
     scale.grid(row=i, column=1)
+    adjust_scales.append(scale)
     i+=1
 
 grayscale_button = ttk.Button(adjust_frame, text="Градации серого", command=apply_grayscale)
@@ -323,6 +462,14 @@ morph_frame = tk.Frame(scrollable_frame, borderwidth=2, relief="groove")
 morph_frame.pack(pady=10, fill=tk.X, padx=5)
 tk.Label(morph_frame, text="Морфологические операции", font=('Arial', 10, 'bold')).pack(pady=5)
 
+# Перевод в чёрно-белое (изображение хранится бит на пиксель)
+threshold_frame = tk.Frame(morph_frame)
+threshold_frame.pack(fill=tk.X, padx=5, pady=2)
+ttk.Label(threshold_frame, text="Порог:").pack(side=tk.LEFT)
+threshold_var = tk.IntVar(value=128)
+ttk.Spinbox(threshold_frame, from_=0, to=255, textvariable=threshold_var, width=5).pack(side=tk.LEFT, padx=5)
+ttk.Button(threshold_frame, text="Бинаризация", command=binarize).pack(side=tk.LEFT, padx=5)
+
 # Выбор операции
 operation_var = tk.StringVar(value="Erosion")
 operations = ["Erosion", "Dilation", "Opening", "Closing", "Gradient"]
@@ -343,7 +490,7 @@ kernel_size_var = tk.IntVar(value=3)
 size_spin = ttk.Spinbox(
     size_frame, 
     from_=3, 
-    to=11, 
+    to=MORPH_MAX_KERNEL_SIZE, 
     increment=2, 
     textvariable=kernel_size_var, 
     width=5,
@@ -351,6 +498,19 @@ size_spin = ttk.Spinbox(
 )
 size_spin.pack(side=tk.LEFT, padx=5)
 
+ttk.Label(size_frame, text="Повторов:").pack(side=tk.LEFT)
+iterations_var = tk.IntVar(value=1)
+iterations_spin = ttk.Spinbox(size_frame, from_=1, to=MORPH_MAX_ITERATIONS, textvariable=iterations_var, width=4)
+iterations_spin.pack(side=tk.LEFT, padx=5)
+
+# Готовые формы ядра
+shape_frame = tk.Frame(morph_frame)
+shape_frame.pack(fill=tk.X, padx=5, pady=2)
+for text, shape in (("Квадрат", cv2.MORPH_RECT), ("Крест", cv2.MORPH_CROSS),
+                    ("Круг", cv2.MORPH_ELLIPSE), ("Очистить", None)):
+    ttk.Button(shape_frame, text=text, width=8,
+               command=lambda shape=shape: set_kernel_shape(shape)).pack(side=tk.LEFT, padx=1)
+
 # Отдельный фрейм для кнопки
 btn_frame = tk.Frame(morph_frame)
 btn_frame.pack(fill=tk.X, pady=5)
@@ -388,13 +548,20 @@ tk.Label(hist_header, text="Гистограмма", font=('Arial', 10, 'bold'))
 histogram_frame = tk.Frame(hist_frame)
 histogram_frame.pack(fill=tk.BOTH, expand=True)
 
-hist_button = ttk.Button(hist_frame, text="Обновить", command=lambda: plot_histogram(canvas_manager.img))
+hist_button = ttk.Button(hist_frame, text="Обновить", command=request_histogram)
 hist_button.pack(pady=5)
 
-plot_histogram(None)
+histogram_view = HistogramView(histogram_frame)
 
 # Инициализация менеджера
 canvas_manager = CanvasManager(canvas)
+canvas_manager.executor.on_busy = show_busy
 canvas.bind("<Button-1>", select_pixel)
+canvas.bind("<Motion>", show_channel_value)
+canvas.bind("<MouseWheel>", zoom_canvas)
+canvas.bind("<Button-4>", zoom_canvas)
+canvas.bind("<Button-5>", zoom_canvas)
+canvas.bind("<ButtonPress-3>", start_pan)
+canvas.bind("<B3-Motion>", pan_canvas)
 
 root.mainloop()
\ No newline at end of file
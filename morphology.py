@@ -0,0 +1,342 @@
+# morphology.py
+
+import cv2
+import numpy as np
+
+from constants import MORPH_PART_COST, MORPH_VHGW_LENGTH
+from image_buffer import buffers, read_pixels, wrap_pixels
+from tile_engine import map_tiles
+
+# Операции cv2.morphologyEx по названиям из интерфейса
+MORPH_OPERATIONS = {
+    'Opening': cv2.MORPH_OPEN,
+    'Closing': cv2.MORPH_CLOSE,
+    'Gradient': cv2.MORPH_GRADIENT,
+}
+
+# Сколько раз ядро проходит по изображению за одну итерацию операции
+_KERNEL_PASSES = {
+    'Erosion': 1,
+    'Dilation': 1,
+    'Opening': 2,
+    'Closing': 2,
+    'Gradient': 1,
+}
+
+
+def _neutral(dtype, op):
+    # Значение, которое не влияет на минимум (эрозия) или максимум (дилатация)
+    limits = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+    return limits.max if op is np.minimum else limits.min
+
+
+def _shift(array, offset, axis, fill):
+    """Сдвиг вдоль оси: out[i] = array[i + offset], за краем - fill"""
+    if offset == 0:
+        return array
+    out = np.full_like(array, fill)
+    length = array.shape[axis]
+    if abs(offset) < length:
+        source = [slice(None)] * array.ndim
+        target = [slice(None)] * array.ndim
+        source[axis] = slice(max(0, offset), length + min(0, offset))
+        target[axis] = slice(max(0, -offset), length - max(0, offset))
+        out[tuple(target)] = array[tuple(source)]
+    return out
+
+
+def _transpose(array):
+    if array.ndim == 2 or array.shape[2] <= 4:
+        return cv2.transpose(array).reshape((array.shape[1], array.shape[0]) + array.shape[2:])
+    return np.ascontiguousarray(np.swapaxes(array, 0, 1))
+
+
+def _vhgw_rows(array, length, offset, op):
+    """
+    Минимум (максимум) по окну строк [i + offset, i + offset + length - 1]
+    алгоритмом ван Херка - Гил - Вермана: три сравнения на пиксель при любой длине окна.
+
+    Массив делится на блоки по length строк; в каждом блоке считаются
+    накопленные значения сверху вниз (forward) и снизу вверх (backward). Любое
+    окно длины length задевает не больше двух соседних блоков и равно
+    op(backward[начало], forward[конец]).
+    """
+    height = array.shape[0]
+    fill = _neutral(array.dtype, op)
+    size = -(-(height + length - 1) // length) * length
+    padded = np.full((size,) + array.shape[1:], fill, array.dtype)
+    # padded[j] = array[j + offset]
+    first, last = max(0, -offset), min(size, height - offset)
+    if first < last:
+        padded[first:last] = array[first + offset:last + offset]
+
+    # Строка row во всех блоках сразу: (блок, строка в блоке, ...)
+    blocks = padded.reshape((size // length, length) + array.shape[1:])
+    forward = blocks.copy()
+    for row in range(1, length):
+        op(forward[:, row - 1], forward[:, row], out=forward[:, row])
+    backward = blocks
+    for row in range(length - 2, -1, -1):
+        op(backward[:, row + 1], backward[:, row], out=backward[:, row])
+    forward, backward = forward.reshape(padded.shape), backward.reshape(padded.shape)
+    return op(backward[:height], forward[length - 1:length - 1 + height])
+
+
+def _line(array, length, offset, axis, op):
+    """
+    Проход одномерным отрезком из length единиц, начинающимся со смещения offset
+    относительно пикселя, вдоль оси axis (0 - по столбцам, 1 - по строкам).
+    """
+    if length == 1:
+        return _shift(array, offset, axis, _neutral(array.dtype, op))
+    if length >= MORPH_VHGW_LENGTH:
+        if axis == 0:
+            return _vhgw_rows(array, length, offset, op)
+        return _transpose(_vhgw_rows(_transpose(array), length, offset, op))
+
+    # Короткие отрезки быстрее проходит OpenCV (векторизованный проход по строкам).
+    # Если отрезок не накрывает пиксель, точка привязки ставится на его край, а результат сдвигается.
+    anchor = min(max(-offset, 0), length - 1)
+    kernel = np.ones((length, 1) if axis == 0 else (1, length), np.uint8)
+    point = (0, anchor) if axis == 0 else (anchor, 0)
+    cv2_op = cv2.erode if op is np.minimum else cv2.dilate
+    result = cv2_op(array, kernel, anchor=point)
+    if result.ndim < array.ndim:
+        result = result.reshape(array.shape)
+    return _shift(result, offset + anchor, axis, _neutral(array.dtype, op))
+
+
+def _line_cost(length):
+    return min(length, MORPH_VHGW_LENGTH) if length > 1 else 0
+
+
+def kernel_rectangles(matrix):
+    """
+    Разбивает структурный элемент на прямоугольники из единиц.
+
+    Одинаковые отрезки единиц в соседних строках объединяются в один
+    прямоугольник, поэтому прямоугольник, линия и крест дают один или два
+    прямоугольника, а круг - по прямоугольнику на каждую ступеньку контура.
+    :param matrix: Структурный элемент
+    :return: Список (top, bottom, left, right) - смещения строк и столбцов
+             относительно центра ядра (как у OpenCV, центр - shape // 2), включительно
+    """
+    mask = np.asarray(matrix) != 0
+    center_y, center_x = mask.shape[0] // 2, mask.shape[1] // 2
+    open_runs = {}
+    rectangles = []
+    for y in range(mask.shape[0] + 1):
+        runs = set()
+        if y < mask.shape[0]:
+            row = np.concatenate(([False], mask[y], [False])).astype(np.int8)
+            edges = np.flatnonzero(np.diff(row))
+            runs = {(int(left), int(right) - 1) for left, right in zip(edges[::2], edges[1::2])}
+        for run in list(open_runs):
+            if run not in runs:
+                left, right = run
+                rectangles.append((open_runs.pop(run) - center_y, y - 1 - center_y, left - center_x, right - center_x))
+        for run in runs:
+            open_runs.setdefault(run, y)
+    return rectangles
+
+
+def kernel_shape(matrix):
+    """
+    Вид структурного элемента: "rect" (прямоугольник или линия),
+    "cross" (крест из горизонтального и вертикального отрезков),
+    "general" (любая другая форма) или "empty".
+    """
+    rectangles = kernel_rectangles(matrix)
+    if not rectangles:
+        return "empty"
+    if len(rectangles) == 1:
+        return "rect"
+    if len(rectangles) == 3:
+        # Крест разбивается на верх вертикали, горизонталь и низ вертикали
+        upper, middle, lower = sorted(rectangles)
+        if upper[2:] == lower[2:] and upper[1] + 1 == middle[0] and middle[1] + 1 == lower[0] \
+                and middle[2] <= upper[2] and upper[3] <= middle[3]:
+            return "cross"
+    return "general"
+
+
+class _Decomposition:
+    def __init__(self, matrix):
+        """
+        Структурный элемент в виде объединения прямоугольников, каждый из
+        которых проходится двумя одномерными отрезками: эрозия (дилатация)
+        по объединению - минимум (максимум) результатов по частям.
+        """
+        self.shape = kernel_shape(matrix)
+        self.rectangles = kernel_rectangles(matrix)
+        if self.shape == "cross":
+            # Крест - горизонтальный и вертикальный отрезки
+            upper, middle, lower = sorted(self.rectangles)
+            self.rectangles = [middle, (upper[0], lower[1], upper[2], upper[3])]
+        self.area = int(np.count_nonzero(matrix))
+
+    def cost(self, iterations):
+        """Число сравнений на пиксель для разложения и для прохода OpenCV ядром целиком"""
+        if self.shape == "rect":
+            # Прямоугольник OpenCV тоже проходит двумя отрезками, но их цена растёт с размером
+            top, bottom, left, right = self.rectangles[0]
+            width, height = iterations * (right - left) + 1, iterations * (bottom - top) + 1
+            return _line_cost(width) + _line_cost(height), width + height
+        columns = {(left, right) for _, _, left, right in self.rectangles}
+        parts = sum(_line_cost(right - left + 1) for left, right in columns) + sum(
+            _line_cost(bottom - top + 1) + MORPH_PART_COST for top, bottom, _, _ in self.rectangles
+        )
+        return iterations * parts, iterations * self.area
+
+    def apply(self, array, op, iterations):
+        if self.shape == "rect":
+            # n-кратная эрозия прямоугольником - одна эрозия прямоугольником в n раз больше
+            top, bottom, left, right = (iterations * value for value in self.rectangles[0])
+            iterations = 1
+            rectangles = [(top, bottom, left, right)]
+        else:
+            rectangles = self.rectangles
+        if len(rectangles) == 1:
+            return _rectangle(array, rectangles[0], op)
+        for _ in range(iterations):
+            # Прямоугольники с одинаковыми столбцами (верх и низ круга) используют общий проход по строкам
+            rows = {}
+            result = None
+            for top, bottom, left, right in rectangles:
+                if (left, right) not in rows:
+                    rows[left, right] = _line(array, right - left + 1, left, 1, op)
+                part = _line(rows[left, right], bottom - top + 1, top, 0, op)
+                result = part if result is None else op(result, part)
+            array = result
+        return array
+
+
+def _rectangle(array, rectangle, op):
+    """Проход прямоугольником (top, bottom, left, right): отрезок по строкам, затем по столбцам"""
+    top, bottom, left, right = rectangle
+    width, height = right - left + 1, bottom - top + 1
+    if top <= 0 <= bottom and left <= 0 <= right and max(width, height) < MORPH_VHGW_LENGTH:
+        # Небольшой прямоугольник вокруг пикселя OpenCV проходит за один вызов
+        cv2_op = cv2.erode if op is np.minimum else cv2.dilate
+        return cv2_op(array, np.ones((height, width), np.uint8), anchor=(-left, -top)).reshape(array.shape)
+    return _line(_line(array, width, left, 1, op), height, top, 0, op)
+
+
+def _into(result, out):
+    # Результат в out, если он задан (часть путей пишет туда сразу)
+    if out is None or result is out:
+        return result
+    np.copyto(out, result.reshape(out.shape))
+    return out
+
+
+def _morph_pass(array, op, matrix, iterations, out=None):
+    """Эрозия (op=np.minimum) или дилатация (np.maximum) iterations раз"""
+    if iterations < 1:
+        return _into(array, out)
+    decomposition = _Decomposition(matrix)
+    if decomposition.shape != "empty":
+        decomposed, direct = decomposition.cost(iterations)
+        if decomposed <= direct:
+            return _into(decomposition.apply(array, op, iterations), out)
+    cv2_op = cv2.erode if op is np.minimum else cv2.dilate
+    return _into(cv2_op(array, matrix, iterations=iterations, dst=out).reshape(array.shape), out)
+
+
+def morph_array(array, operation, matrix, iterations=1, out=None):
+    """
+    Применяет морфологическую операцию к массиву uint8 (H, W) или (H, W, C).
+    Операция выполняется для каждого канала отдельно.
+
+    Прямоугольники, линии и кресты (и другие ядра, если так дешевле)
+    раскладываются на одномерные отрезки; длинные отрезки проходятся
+    алгоритмом ван Херка - Гил - Вермана, время которого не зависит от
+    размера ядра. Результат совпадает с cv2.erode / cv2.dilate /
+    cv2.morphologyEx до бита.
+    :param operation: Erosion, Dilation, Opening, Closing или Gradient
+    :param matrix: Структурный элемент (uint8)
+    :param out: Массив для результата той же формы (не array); по умолчанию - новый
+    """
+    matrix = np.asarray(matrix, dtype=np.uint8)
+    if operation == 'Erosion':
+        return _morph_pass(array, np.minimum, matrix, iterations, out)
+    if operation == 'Dilation':
+        return _morph_pass(array, np.maximum, matrix, iterations, out)
+    if operation not in ('Opening', 'Closing', 'Gradient'):
+        raise ValueError(f"Операция '{operation}' не поддерживается")
+
+    # Промежуточный результат - во временном массиве из пула
+    scratch = buffers.take(array.shape)
+    try:
+        if operation == 'Opening':
+            first = _morph_pass(array, np.minimum, matrix, iterations, scratch)
+            return _morph_pass(first, np.maximum, matrix, iterations, out)
+        if operation == 'Closing':
+            first = _morph_pass(array, np.maximum, matrix, iterations, scratch)
+            return _morph_pass(first, np.minimum, matrix, iterations, out)
+        dilated = _morph_pass(array, np.maximum, matrix, iterations, out)
+        eroded = _morph_pass(array, np.minimum, matrix, iterations, scratch)
+        result = cv2.subtract(dilated, eroded, dst=out)
+        return _into(result, out) if out is not None else result.reshape(array.shape)
+    finally:
+        buffers.give(scratch)
+
+
+def morph_halo(operation, matrix, iterations=1):
+    """
+    Ширина полосы соседних пикселей, от которых зависит результат в пикселе.
+    Нужна для обработки изображения по частям без швов.
+    """
+    radius = max(matrix.shape) // 2
+    return radius * iterations * _KERNEL_PASSES[operation]
+
+
+def proxy_kernel(matrix, iterations, factor):
+    """
+    Ядро для копии изображения, уменьшенной в factor раз по сравнению с оригиналом.
+
+    Итерации ядра matrix складываются в одно ядро (сумму Минковского) - его
+    охват совпадает с охватом всех итераций - и оно уменьшается тем же
+    масштабом, что и изображение. Так результат на копии показывает ту же
+    область влияния, что и результат полного разрешения.
+    :return: (ядро, число итераций) или (None, 0), если ядро меньше пикселя копии
+    """
+    matrix = np.asarray(matrix, dtype=np.uint8)
+    if not matrix.any():
+        return matrix, iterations
+    height, width = matrix.shape
+    footprint = matrix
+    for _ in range(iterations - 1):
+        # Каждая итерация расширяет охват на размер ядра без одного пикселя
+        padded = cv2.copyMakeBorder(
+            footprint, height // 2, (height - 1) // 2, width // 2, (width - 1) // 2, cv2.BORDER_CONSTANT, value=0
+        )
+        footprint = cv2.dilate(padded, matrix, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    # Нечётный размер - чтобы центр уменьшенного ядра совпадал с пикселем
+    size = tuple(2 * round((length - 1) * factor / 2) + 1 for length in footprint.shape[::-1])
+    if size == (1, 1):
+        return None, 0
+    scaled = cv2.resize(footprint.astype(np.float32), size, interpolation=cv2.INTER_AREA) >= 0.5
+    if not scaled.any():
+        # Тонкая форма при уменьшении пропадает целиком: оставляем центр
+        scaled[size[1] // 2, size[0] // 2] = True
+    return scaled.astype(np.uint8), 1
+
+
+def morph_pil(image, operation, matrix, iterations=1):
+    """
+    Морфологическая операция над изображением PIL, как CanvasManager.morph_image:
+    изображения не в режиме L приводятся к RGB (альфа-канал отбрасывается).
+    Большие изображения обрабатываются по плиткам на всех ядрах.
+    :return: Новое изображение PIL в режиме L или RGB
+    """
+    if image.mode not in ("L", "RGB"):
+        # Альфа-канал и особые режимы отбрасываются, как в pil_to_cv2
+        image = image.convert("RGB")
+    # Каналы обрабатываются по отдельности, поэтому пиксели берутся в порядке PIL, без перестановки в BGR
+    result = map_tiles(
+        read_pixels(image),
+        lambda tile: morph_array(tile, operation, matrix, iterations),
+        morph_halo(operation, matrix, iterations),
+    )
+    return wrap_pixels(result, image.mode)
@@ -0,0 +1,85 @@
+# preview_scheduler.py
+
+import time
+
+from constants import PREVIEW_FRAME_MS, PREVIEW_SETTLE_MS
+
+
+class PreviewScheduler:
+    def __init__(self, widget, preview, final, frame_ms=PREVIEW_FRAME_MS, settle_ms=PREVIEW_SETTLE_MS, group=None):
+        """
+        Ограничивает частоту предпросмотра при перетаскивании ползунка.
+
+        Все значения, пришедшие за один кадр, схлопываются в одно - последнее.
+        Если предпросмотр рисуется дольше кадра, следующий кадр откладывается
+        на время его отрисовки, поэтому очередь событий Tk не растёт.
+        Точный результат рисуется в finish() (отпускание ползунка) или
+        после settle_ms без новых значений (например, при управлении с клавиатуры).
+        :param widget: Виджет Tk для вызова after()
+        :param preview: Функция (значение) - быстрый предпросмотр
+        :param final: Функция (значение) - точный результат
+        :param frame_ms: Минимальный интервал между кадрами предпросмотра
+        :param settle_ms: Пауза, после которой рисуется точный результат
+        :param group: Общий список планировщиков, которые рисуют в одном месте:
+                      точный результат одного из них заменяет на экране результаты остальных
+        """
+        self.widget = widget
+        self.preview = preview
+        self.final = final
+        self.frame_ms = frame_ms
+        self.settle_ms = settle_ms
+        self.value = None
+        self.final_value = None
+        # Нарисован ли предпросмотр после последнего точного результата
+        self.previewed = False
+        self.group = group if group is not None else []
+        self.group.append(self)
+        self.dirty = False
+        self.frame_job = None
+        self.settle_job = None
+        self.last_frame = 0.0
+        self.frame_cost = 0.0
+
+    def request(self, value):
+        """Новое значение ползунка (подходит как command= для Scale)"""
+        self.value = value
+        self.dirty = True
+        if self.frame_job is None:
+            interval = max(self.frame_ms, self.frame_cost)
+            delay = max(0, self.last_frame + interval - time.perf_counter() * 1000)
+            self.frame_job = self.widget.after(int(delay), self._frame)
+        if self.settle_job is not None:
+            self.widget.after_cancel(self.settle_job)
+        self.settle_job = self.widget.after(self.settle_ms, self.finish)
+
+    def _frame(self):
+        self.frame_job = None
+        if not self.dirty:
+            return
+        self.dirty = False
+        start = time.perf_counter() * 1000
+        self.preview(self.value)
+        self.previewed = True
+        self.last_frame = time.perf_counter() * 1000
+        self.frame_cost = self.last_frame - start
+
+    def finish(self, event=None):
+        """Рисует точный результат для последнего значения (подходит для bind)"""
+        for job in (self.frame_job, self.settle_job):
+            if job is not None:
+                self.widget.after_cancel(job)
+        self.frame_job = self.settle_job = None
+        self.dirty = False
+        # Предпросмотр рисуется в уменьшенном разрешении, поэтому после него точный
+        # результат нужен, даже если ползунок вернулся на прежнее значение
+        if self.value is not None and (self.previewed or self.value != self.final_value):
+            self.final_value = self.value
+            self.previewed = False
+            self.final(self.value)
+            for scheduler in self.group:
+                if scheduler is not self:
+                    scheduler.invalidate()
+
+    def invalidate(self):
+        """Точный результат больше не на экране (изображение изменилось): следующий finish() рисует его заново"""
+        self.final_value = None
@@ -0,0 +1,145 @@
+# processing_executor.py
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import CancelledError
+
+from constants import EXECUTOR_POLL_MS
+
+
+class Job:
+    def __init__(self, func, callback=None, error_callback=None, replaceable=False):
+        """
+        Задача фоновой обработки.
+        :param func: Функция без аргументов, выполняется в рабочем потоке
+        :param callback: Получает результат в потоке интерфейса
+        :param error_callback: Получает исключение в потоке интерфейса
+        :param replaceable: Результат заменяется результатом следующих параметров
+                            (такие задачи отменяет cancel(only_replaceable=True))
+        """
+        self.func = func
+        self.callback = callback
+        self.error_callback = error_callback
+        self.replaceable = replaceable
+        self.cancelled = False
+        self.value = None
+        self.error = None
+        self.finished = threading.Event()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def result(self, timeout=None):
+        """Ждёт завершения задачи и возвращает результат (или поднимает её исключение)"""
+        if not self.finished.wait(timeout):
+            raise TimeoutError("Задача не завершилась")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class ProcessingExecutor:
+    def __init__(self, widget, on_busy=None, poll_ms=EXECUTOR_POLL_MS):
+        """
+        Выполняет обработку изображений в одном рабочем потоке.
+
+        Задачи выполняются по очереди в порядке добавления. Результаты
+        передаются в поток интерфейса через widget.after(), поэтому
+        обработчики могут обращаться к Tk. cancel() отменяет ещё не
+        выполненные задачи и отбрасывает результат текущей - так
+        показывается только результат последнего набора параметров;
+        запросы (цвет пикселя, гистограмма) при этом можно сохранить.
+        :param widget: Виджет Tk для вызова after()
+        :param on_busy: Функция (bool), вызывается при начале и окончании работы
+        :param poll_ms: Период проверки готовых задач
+        """
+        self.widget = widget
+        self.on_busy = on_busy
+        self.poll_ms = poll_ms
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.running = None
+        self.completed = queue.Queue()
+        self.polling = False
+        self.thread = None
+
+    def submit(self, func, callback=None, error_callback=None, replaceable=False):
+        """
+        Добавляет задачу в очередь (вызывать из потока интерфейса).
+        :return: Job
+        """
+        job = Job(func, callback, error_callback, replaceable)
+        with self.condition:
+            self.pending.append(job)
+            self.condition.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._work, daemon=True)
+            self.thread.start()
+        if not self.polling:
+            self.polling = True
+            if self.on_busy:
+                self.on_busy(True)
+            self.widget.after(self.poll_ms, self._poll)
+        return job
+
+    def cancel(self, only_replaceable=False):
+        """
+        Отменяет задачи в очереди и отбрасывает результат выполняемой.
+        :param only_replaceable: Отменить только задачи, созданные с replaceable=True
+        """
+        def selected(job):
+            return job.replaceable or not only_replaceable
+
+        with self.condition:
+            cancelled = [job for job in self.pending if selected(job)]
+            self.pending = deque(job for job in self.pending if not selected(job))
+            if self.running is not None and selected(self.running):
+                self.running.cancelled = True
+        for job in cancelled:
+            job.cancelled = True
+            job.error = CancelledError()
+            job.finished.set()
+
+    def busy(self):
+        """Есть ли задачи в очереди или в работе"""
+        with self.condition:
+            return bool(self.pending) or self.running is not None
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                job = self.running = self.pending.popleft()
+            try:
+                job.value = job.func()
+            except Exception as e:
+                job.error = e
+            job.finished.set()
+            # Сначала в очередь готовых, потом освобождаем поток: _poll
+            # не должен увидеть "не занят" раньше, чем результат
+            self.completed.put(job)
+            with self.condition:
+                self.running = None
+
+    def _poll(self):
+        busy = self.busy()
+        while not self.completed.empty():
+            job = self.completed.get()
+            if job.cancelled:
+                continue
+            if job.error is not None:
+                if job.error_callback:
+                    job.error_callback(job.error)
+                else:
+                    print(f"Ошибка обработки: {job.error}")
+            elif job.callback:
+                job.callback(job.value)
+
+        if busy or self.busy():
+            self.widget.after(self.poll_ms, self._poll)
+        else:
+            self.polling = False
+            if self.on_busy:
+                self.on_busy(False)
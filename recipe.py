@@ -0,0 +1,399 @@
+# recipe.py
+
+import json
+
+import cv2
+import numpy as np
+
+from enhance_engine import (
+    FUSED_MODES, _apply_mode, _apply_sharpness, apply_matrix, chain_tone_lut, color_matrix,
+    merge_alpha, split_alpha,
+)
+from morphology import morph_array, morph_halo
+from tile_engine import map_tiles
+
+# Версия формата рецепта в JSON
+RECIPE_FORMAT_VERSION = 1
+
+
+def _convex(params):
+    # Множитель 0 ÷ 1 смешивает значения без выхода за 0-255, поэтому шаг
+    # перестановочен с переходом в "L" с точностью до округления
+    return 0.0 <= params["factor"] <= 1.0
+
+
+class Operation:
+    def __init__(self, name, defaults, identity, luma_commutes=None, luma_preserving=None, merge=None):
+        """
+        Описание операции рецепта для планировщика.
+        :param name: Название операции в рецепте
+        :param defaults: Параметры по умолчанию
+        :param identity: Функция (параметры, режим) -> True, если шаг ничего не меняет
+        :param luma_commutes: Функция параметры -> можно ли выполнить шаг после перехода в "L"
+        :param luma_preserving: Функция параметры -> шаг не меняет яркость (L) пикселя
+        :param merge: Функция (параметры первого шага, второго) -> параметры одного шага
+                      с тем же результатом или None, если два шага подряд не сливаются
+        """
+        self.name = name
+        self.defaults = defaults
+        self.identity = identity
+        self.luma_commutes = luma_commutes or (lambda params: False)
+        self.luma_preserving = luma_preserving or (lambda params: False)
+        self.merge = merge or (lambda first, second: None)
+
+
+def _merge_color(first, second):
+    # Обе матрицы смешивают с одним и тем же серым, и множители перемножаются,
+    # если первый шаг не обрезал значения (множитель больше 1 выводит за 0-255)
+    if _convex(first) and _convex(second):
+        return {"factor": first["factor"] * second["factor"]}
+    return None
+
+
+def _merge_morphology(first, second):
+    # Эрозия (дилатация) n раз, затем m раз - то же, что n + m раз
+    if (second["operation"] in ("Erosion", "Dilation") and first["operation"] == second["operation"]
+            and first["kernel"] == second["kernel"]):
+        return {**second, "iterations": first["iterations"] + second["iterations"]}
+    return None
+
+
+OPERATIONS = {}
+
+
+def register_operation(operation):
+    """Добавляет операцию в реестр рецептов"""
+    OPERATIONS[operation.name] = operation
+    return operation
+
+
+register_operation(Operation(
+    "brightness", {"factor": 1.0},
+    identity=lambda params, mode: params["factor"] == 1.0, luma_commutes=_convex,
+))
+register_operation(Operation(
+    # Контраст смешивает с общим для всех каналов средним яркости
+    "contrast", {"factor": 1.0},
+    identity=lambda params, mode: params["factor"] == 1.0, luma_commutes=_convex,
+))
+register_operation(Operation(
+    "color", {"factor": 1.0},
+    identity=lambda params, mode: params["factor"] == 1.0 or mode == "L", luma_preserving=_convex,
+    merge=_merge_color,
+))
+register_operation(Operation(
+    "sharpness", {"factor": 1.0},
+    identity=lambda params, mode: params["factor"] == 1.0, luma_commutes=_convex,
+))
+register_operation(Operation(
+    "mode", {"mode": "RGB"},
+    identity=lambda params, mode: params["mode"] == mode,
+))
+register_operation(Operation(
+    # Порог по яркости: результат в "L" со значениями 0 и 255
+    "threshold", {"level": 128},
+    identity=lambda params, mode: False,
+))
+register_operation(Operation(
+    "morphology", {"operation": "Erosion", "kernel": ((1, 1, 1), (1, 1, 1), (1, 1, 1)), "iterations": 1},
+    identity=lambda params, mode: params["iterations"] == 0, merge=_merge_morphology,
+))
+
+register_operation(Operation(
+    # Правка каналов в цветовой модели (CanvasManager.edit_in_model). Функция правки
+    # в рецепт не попадает: шаг отмечает, что результат не выводится из шагов
+    "model_edit", {"model": "HSV"},
+    identity=lambda params, mode: False,
+))
+
+
+def _freeze(value):
+    # Списки из JSON -> кортежи, чтобы параметры можно было использовать в ключах кэша
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class Step:
+    def __init__(self, op, **params):
+        """
+        Шаг рецепта: операция из OPERATIONS и её параметры.
+        """
+        if op not in OPERATIONS:
+            raise ValueError(f"Операция '{op}' не поддерживается")
+        self.op = op
+        self.params = {**OPERATIONS[op].defaults, **{name: _freeze(value) for name, value in params.items()}}
+
+    @property
+    def operation(self):
+        return OPERATIONS[self.op]
+
+    def key(self):
+        """Параметры шага в виде, пригодном для ключа кэша"""
+        return (self.op,) + tuple(sorted(self.params.items()))
+
+    def to_dict(self):
+        return {"op": self.op, **{name: value for name, value in self.params.items()}}
+
+    def __eq__(self, other):
+        return isinstance(other, Step) and self.key() == other.key()
+
+    def __repr__(self):
+        params = ", ".join(f"{name}={value!r}" for name, value in self.params.items())
+        return f"Step({self.op}, {params})"
+
+
+class Recipe:
+    def __init__(self, steps=()):
+        """
+        Последовательность правок изображения, которую можно сохранить в JSON
+        и выполнить заново (в интерфейсе или в batch.py).
+        :param steps: Список Step
+        """
+        self.steps = list(steps)
+
+    @classmethod
+    def adjustments(cls, brightness=1.0, contrast=1.0, color=1.0, sharpness=1.0, mode="RGB"):
+        """Рецепт CanvasManager.change_image: яркость, контраст, насыщенность, резкость и режим"""
+        return cls([
+            Step("brightness", factor=brightness),
+            Step("contrast", factor=contrast),
+            Step("color", factor=color),
+            Step("sharpness", factor=sharpness),
+            Step("mode", mode=mode),
+        ])
+
+    def then(self, step):
+        """Новый рецепт с ещё одним шагом в конце"""
+        return Recipe(self.steps + [step])
+
+    def to_dict(self):
+        return {"version": RECIPE_FORMAT_VERSION, "steps": [step.to_dict() for step in self.steps]}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version", RECIPE_FORMAT_VERSION) != RECIPE_FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия рецепта: {data.get('version')}")
+        return cls([Step(**step) for step in data["steps"]])
+
+    def save(self, file_path):
+        with open(file_path, "w", encoding="utf-8") as recipe_file:
+            json.dump(self.to_dict(), recipe_file, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, encoding="utf-8") as recipe_file:
+            return cls.from_dict(json.load(recipe_file))
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"Recipe({self.steps!r})"
+
+
+class PlanStep:
+    def __init__(self, name, params, func, drops_alpha=False):
+        """
+        Шаг готового плана.
+        :param name: Название шага (для кэша и отладки)
+        :param params: Хешируемые параметры шага
+        :param func: Функция массива цвета uint8 -> новый массив
+        :param drops_alpha: После шага альфа-канал больше не нужен
+        """
+        self.name = name
+        self.params = params
+        self.func = func
+        self.drops_alpha = drops_alpha
+
+    def __repr__(self):
+        return f"PlanStep({self.name}, {self.params!r})"
+
+
+def _histograms(array):
+    return [
+        cv2.calcHist([array], [channel], None, [256], [0, 256]).ravel()
+        for channel in range(1 if array.ndim == 2 else array.shape[2])
+    ]
+
+
+def _tone_func(steps):
+    need_histograms = any(kind == "contrast" for kind, _ in steps)
+
+    def func(array):
+        histograms = _histograms(array) if need_histograms else None
+        return cv2.LUT(array, chain_tone_lut(histograms, steps))
+    return func
+
+
+def _mode_func(mode):
+    def func(array):
+        if mode == "L":
+            return _apply_mode(array, "L")
+        if array.ndim == 2:
+            return np.dstack([array] * 3)
+        return array
+    return func
+
+
+def _threshold_func(level):
+    def func(array):
+        return (_apply_mode(array, "L") >= level) * np.uint8(255)
+    return func
+
+
+def _morph_func(params):
+    matrix = np.array(params["kernel"], dtype=np.uint8)
+    halo = morph_halo(params["operation"], matrix, params["iterations"])
+    return lambda array: map_tiles(
+        array, lambda tile: morph_array(tile, params["operation"], matrix, params["iterations"]), halo
+    )
+
+
+def _model_edit_func(model):
+    def func(array):
+        raise ValueError(f"Правка в модели {model} не сохраняется в рецепте и не может быть повторена")
+    return func
+
+
+def _step_mode(step, mode):
+    # Режим изображения после шага (как в plan)
+    if step.op == "mode":
+        return step.params["mode"]
+    if step.op == "threshold":
+        return "L"
+    if step.op in ("morphology", "model_edit") and mode != "L":
+        return "RGB"
+    return mode
+
+
+def _drop_identities(steps, mode):
+    result = []
+    for step in steps:
+        if not step.operation.identity(step.params, mode):
+            result.append(step)
+            mode = _step_mode(step, mode)
+    return result
+
+
+def _merge_steps(steps):
+    """Сливает подряд идущие шаги одной операции, которые её merge объединяет в один"""
+    result = []
+    for step in steps:
+        previous = result[-1] if result else None
+        merged = previous.operation.merge(previous.params, step.params) \
+            if previous is not None and previous.op == step.op else None
+        if merged is not None:
+            result[-1] = Step(step.op, **merged)
+        else:
+            result.append(step)
+    return result
+
+
+def _hoist_luma(steps):
+    """
+    Переносит шаги перед переходом в "L" за него, где это не меняет результат:
+    после перехода они обрабатывают один канал вместо трёх. Шаги, которые
+    не меняют яркость пикселя, перед переходом в "L" не нужны вовсе.
+    """
+    result = []
+    for step in steps:
+        if step.op != "mode" or step.params["mode"] != "L":
+            result.append(step)
+            continue
+        moved = []
+        while result:
+            previous = result[-1]
+            if previous.operation.luma_preserving(previous.params):
+                pass
+            elif previous.operation.luma_commutes(previous.params):
+                moved.insert(0, previous)
+            else:
+                break
+            result.pop()
+        result += [step] + moved
+    return result
+
+
+def plan(recipe, mode):
+    """
+    Составляет план выполнения рецепта для изображения в режиме mode.
+
+    Шаги, которые ничего не меняют, отбрасываются; шаги, перестановочные с
+    переходом в "L", переносятся за него; подряд идущие шаги одной операции
+    сливаются по её merge (насыщенность 0-1 - в одну матрицу, эрозии и
+    дилатации с одним ядром - в одну операцию), а яркость и контраст -
+    в одну таблицу.
+    :param recipe: Recipe
+    :param mode: Режим исходного изображения (RGB, RGBA или L)
+    :return: (список PlanStep, режим результата)
+    """
+    steps = _drop_identities(recipe.steps, mode)
+    steps = _merge_steps(_drop_identities(_hoist_luma(steps), mode))
+
+    plan_steps = []
+    for step in steps:
+        params = step.params
+        previous = plan_steps[-1] if plan_steps else None
+        if step.op in ("brightness", "contrast"):
+            if previous is not None and previous.name == "tone":
+                tone = previous.params + ((step.op, params["factor"]),)
+                plan_steps[-1] = PlanStep("tone", tone, _tone_func(tone))
+            else:
+                tone = ((step.op, params["factor"]),)
+                plan_steps.append(PlanStep("tone", tone, _tone_func(tone)))
+        elif step.op == "color":
+            factor = params["factor"]
+            matrix = color_matrix(factor)
+            plan_steps.append(PlanStep(
+                "color", (factor,),
+                lambda array, matrix=matrix: array if array.ndim == 2 else apply_matrix(array, matrix)
+            ))
+        elif step.op == "sharpness":
+            plan_steps.append(PlanStep(
+                "sharpen", (params["factor"],),
+                lambda array, factor=params["factor"]: _apply_sharpness(array, factor)
+            ))
+        elif step.op == "mode":
+            plan_steps.append(PlanStep("mode", (params["mode"],), _mode_func(params["mode"]),
+                                       drops_alpha=params["mode"] != "RGBA"))
+            mode = params["mode"]
+        elif step.op == "threshold":
+            plan_steps.append(PlanStep("threshold", (params["level"],), _threshold_func(params["level"]),
+                                       drops_alpha=True))
+            mode = "L"
+        elif step.op == "morphology":
+            # Как CanvasManager.morph_image: изображение не в "L" приводится к RGB
+            plan_steps.append(PlanStep("morphology", tuple(sorted(params.items())), _morph_func(params),
+                                       drops_alpha=True))
+            if mode != "L":
+                mode = "RGB"
+        elif step.op == "model_edit":
+            # Как CanvasManager._edit_planes: результат в "L" или RGB
+            plan_steps.append(PlanStep("model_edit", (params["model"],), _model_edit_func(params["model"]),
+                                       drops_alpha=True))
+            if mode != "L":
+                mode = "RGB"
+    return plan_steps, mode
+
+
+def plan_stages(recipe, mode):
+    """План в виде списка (название, параметры, функция), как enhance_stages"""
+    steps, _ = plan(recipe, mode)
+    return [(step.name, step.params, step.func) for step in steps]
+
+
+def execute(recipe, image):
+    """
+    Выполняет рецепт над изображением PIL по оптимизированному плану.
+    :return: Новое изображение PIL
+    """
+    if image.mode not in FUSED_MODES:
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    steps, mode = plan(recipe, image.mode)
+    array, alpha = split_alpha(image)
+    for step in steps:
+        array = step.func(array)
+        if step.drops_alpha:
+            alpha = None
+    return merge_alpha(array, alpha, mode)
@@ -0,0 +1,83 @@
+# stage_cache.py
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from constants import STAGE_CACHE_BYTES
+
+
+class StageCache:
+    def __init__(self, max_bytes=STAGE_CACHE_BYTES):
+        """
+        Кэш промежуточных результатов обработки с вытеснением LRU по объёму.
+
+        Ключ - (версия исходного изображения, шаг, параметры этого и всех
+        предыдущих шагов), поэтому при изменении параметра пересчитываются
+        только шаги после него.
+        :param max_bytes: Максимальный объём кэша в байтах
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        # Кэш используют и интерфейс, и фоновая обработка полного разрешения
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        return value.width * value.height * len(value.getbands())
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _drop(self, key):
+        self.total_bytes -= self._size(self.entries.pop(key))
+
+    def get(self, key, compute):
+        """
+        Возвращает значение по ключу, вычисляя его при отсутствии.
+        :param compute: Функция без аргументов, вычисляющая значение
+        """
+        value = self.lookup(key)
+        if value is not None:
+            return value
+        # Вычисление идёт без блокировки, чтобы не задерживать другой поток
+        return self.put(key, compute())
+
+    def lookup(self, key):
+        """Возвращает значение по ключу или None, если его нет"""
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        """Запоминает значение и возвращает его"""
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = value
+            self.total_bytes += self._size(value)
+            # Вытесняем самые старые записи, но последнюю оставляем всегда
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                self._drop(next(iter(self.entries)))
+        return value
+
+    def discard(self, predicate):
+        """Удаляет записи, ключи которых удовлетворяют predicate"""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                self._drop(key)
+
+    def clear(self):
+        """Удаляет все записи"""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
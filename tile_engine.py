@@ -0,0 +1,92 @@
+# tile_engine.py
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from constants import PARALLEL_MIN_PIXELS, PARALLEL_TILE_SIZE
+
+# Число потоков обработки плиток
+WORKERS = os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+# Отмечает потоки пула: внутри них обработка идёт без разбиения на плитки
+_worker = threading.local()
+
+
+def _mark_worker():
+    _worker.active = True
+
+
+def get_pool():
+    """Общий пул потоков по числу ядер (создаётся при первом обращении)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=WORKERS, thread_name_prefix="tile", initializer=_mark_worker
+            )
+        return _pool
+
+
+def tile_boxes(width, height, tile_size=PARALLEL_TILE_SIZE):
+    """Плитки (left, top, right, bottom), покрывающие изображение без перекрытия"""
+    return [
+        (left, top, min(left + tile_size, width), min(top + tile_size, height))
+        for top in range(0, height, tile_size)
+        for left in range(0, width, tile_size)
+    ]
+
+
+def _run_tile(func, array, out, box, halo):
+    left, top, right, bottom = box
+    height, width = array.shape[:2]
+    # Плитка читается вместе с полосой соседних пикселей шириной halo
+    outer_left, outer_top = max(0, left - halo), max(0, top - halo)
+    outer_right, outer_bottom = min(width, right + halo), min(height, bottom + halo)
+    result = func(array[outer_top:outer_bottom, outer_left:outer_right])
+    out[top:bottom, left:right] = result[top - outer_top:bottom - outer_top, left - outer_left:right - outer_left]
+
+
+def tiles_enabled(array, halo=0, tile_size=PARALLEL_TILE_SIZE, min_pixels=PARALLEL_MIN_PIXELS):
+    """Разобьёт ли map_tiles массив на плитки (иначе func вызывается один раз для всего массива)"""
+    height, width = array.shape[:2]
+    return not (height <= tile_size and width <= tile_size or width * height < min_pixels or halo >= tile_size
+                or WORKERS < 2 or getattr(_worker, "active", False))
+
+
+def map_tiles(array, func, halo=0, tile_size=PARALLEL_TILE_SIZE, min_pixels=PARALLEL_MIN_PIXELS, out=None):
+    """
+    Применяет операцию над окрестностью пикселя к массиву по плиткам на всех ядрах.
+
+    NumPy и OpenCV отпускают GIL, поэтому плитки обрабатываются потоками
+    параллельно. Каждая плитка читается с перекрытием halo, а края
+    изображения остаются краями и у плиток, поэтому результат совпадает
+    с func(array) до бита.
+    :param array: Массив (H, W) или (H, W, C)
+    :param func: Функция массива -> массив того же размера и типа
+    :param halo: Радиус окрестности, от которой зависит результат в пикселе
+    :param min_pixels: Меньшие массивы обрабатываются одним вызовом
+                       (как и при halo не меньше плитки: перекрытия дали бы больше лишней работы, чем выигрыш)
+    :param out: Массив для результата (например, из пула image_buffer.py); по умолчанию - новый
+    :return: Результат (out, если он задан)
+    """
+    if not tiles_enabled(array, halo, tile_size, min_pixels):
+        if out is None:
+            return func(array)
+        np.copyto(out, func(array))
+        return out
+
+    height, width = array.shape[:2]
+    boxes = tile_boxes(width, height, tile_size)
+    if out is None:
+        out = np.empty_like(array)
+    pool = get_pool()
+    futures = [pool.submit(_run_tile, func, array, out, box, halo) for box in boxes]
+    for future in futures:
+        # Поднимает исключение плитки, если оно было
+        future.result()
+    return out
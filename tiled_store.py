@@ -0,0 +1,449 @@
+# tiled_store.py
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import weakref
+
+import numpy as np
+from PIL import Image
+
+from constants import OUT_OF_CORE_BUDGET, TILE_SIZE, TILED_STORE_CACHE_BYTES, TILED_STORE_DIR, TILED_STORE_MAX_AGE
+from enhance_engine import enhance_stages
+from image_loader import open_unlimited
+
+# Версия формата хранилища. Увеличивается при изменении раскладки файла -
+# старые хранилища будут построены заново.
+STORE_FORMAT_VERSION = 1
+
+_META_FILE = "meta.json"
+_PIXELS_FILE = "pixels.raw"
+
+# Режимы PIL, которые хранятся как есть, и число их каналов
+STORE_MODES = {"L": 1, "RGB": 3, "RGBA": 4}
+
+# Запас памяти на временные массивы при обработке плитки (float64 и копии)
+_WORK_FACTOR = 16
+
+
+def _as3d(array):
+    return array[:, :, None] if array.ndim == 2 else array
+
+
+def _squeeze(array):
+    return array[:, :, 0] if array.shape[2] == 1 else array
+
+
+def _tile_lengths(tiles, file_size):
+    # Длина данных фрагмента - до начала следующего по смещению (лишние байты декодер не читает)
+    offsets = sorted({tile[2] for tile in tiles}) + [file_size]
+    return {offset: following - offset for offset, following in zip(offsets, offsets[1:])}
+
+
+def _decode_tile(image_file, tile, mode, length):
+    """Декодирует один фрагмент файла через Image.frombytes тем же декодером, что выбрал PIL"""
+    codec, (left, top, right, bottom), offset, args = tile
+    image_file.seek(offset)
+    args = args if isinstance(args, tuple) else (args,)
+    return Image.frombytes(mode, (right - left, bottom - top), image_file.read(length), codec, *args)
+
+
+def _decode_bands(file_path):
+    """
+    Декодирует файл горизонтальными полосами, не держа всё изображение в памяти.
+
+    Полосы берутся из разбиения файла на фрагменты декодера (полосы и плитки
+    TIFF, строки несжатых форматов); каждый фрагмент декодируется отдельно
+    через Image.frombytes. Если формат так не делится (например, JPEG),
+    изображение декодируется целиком один раз.
+    :return: Генератор (верхняя строка, полоса PIL)
+    """
+    with open_unlimited(file_path) as image:
+        width, height = image.size
+        mode = image.mode
+        tiles = list(image.tile)
+
+    if len(tiles) == 1 and tiles[0][0] == "raw" and mode in STORE_MODES:
+        # Несжатые строки: делим один фрагмент на полосы по смещению в файле
+        codec, extents, offset, args = tiles[0]
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3] if isinstance(args, tuple) else (args, 0, 1)
+        if rawmode == mode and orientation == 1 and extents == (0, 0, width, height):
+            stride = stride or width * STORE_MODES[mode]
+            rows = max(1, OUT_OF_CORE_BUDGET // (stride * _WORK_FACTOR))
+            tiles = [
+                (codec, (0, top, width, min(top + rows, height)), offset + top * stride, (rawmode, stride, 1))
+                for top in range(0, height, rows)
+            ]
+
+    if len(tiles) > 1 and all(tile[0] != "libtiff" for tile in tiles):
+        lengths = _tile_lengths(tiles, os.path.getsize(file_path))
+        bands = {}
+        for tile in tiles:
+            bands.setdefault((tile[1][1], tile[1][3]), []).append(tile)
+        with open(file_path, "rb") as image_file:
+            for (top, bottom), band_tiles in sorted(bands.items()):
+                if len(band_tiles) == 1 and band_tiles[0][1][0] == 0 and band_tiles[0][1][2] == width:
+                    yield top, _decode_tile(image_file, band_tiles[0], mode, lengths[band_tiles[0][2]])
+                    continue
+                band = Image.new(mode, (width, bottom - top))
+                for tile in band_tiles:
+                    band.paste(_decode_tile(image_file, tile, mode, lengths[tile[2]]), (tile[1][0], 0))
+                yield top, band
+        return
+
+    with open_unlimited(file_path) as image:
+        image.load()
+        yield 0, image.copy()
+
+
+def prune_cache(cache_dir=TILED_STORE_DIR, max_bytes=TILED_STORE_CACHE_BYTES, max_age=TILED_STORE_MAX_AGE,
+                keep=()):
+    """
+    Удаляет из каталога хранилищ те, что не использовались дольше max_age секунд
+    (в том числе брошенные временные после аварийного завершения), а затем самые
+    давно использованные, пока занятое место больше max_bytes.
+    :param keep: Каталоги, которые не удаляются
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    now = time.time()
+    stores = []
+    for name in os.listdir(cache_dir):
+        directory = os.path.join(cache_dir, name)
+        if directory in keep or not os.path.isdir(directory):
+            continue
+        used = used_bytes = 0
+        for entry in os.scandir(directory):
+            stat = entry.stat()
+            used = max(used, stat.st_mtime)
+            # Файл пикселей разреженный: считается место на диске, а не длина
+            used_bytes += stat.st_blocks * 512
+        if now - used > max_age:
+            shutil.rmtree(directory, True)
+        elif not name.startswith("session-"):
+            # Временные хранилища открытых изображений удаляются при их закрытии
+            stores.append((used, used_bytes, directory))
+    total = sum(used_bytes for _, used_bytes, _ in stores)
+    for _, used_bytes, directory in sorted(stores):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(directory, True)
+        total -= used_bytes
+
+
+class TiledStore:
+    def __init__(self, directory):
+        """
+        Изображение в файле на диске, разбитое на плитки и открываемое через memory map.
+
+        Плитки лежат построчно: (ряды, столбцы, плитка, плитка, каналы), поэтому
+        ряд плиток - непрерывный участок файла. Одновременно отображается только
+        нужная часть файла, и объём обрабатываемых данных ограничен self.budget.
+        :param directory: Каталог с meta.json и pixels.raw
+        """
+        with open(os.path.join(directory, _META_FILE), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        self.directory = directory
+        self.meta = meta
+        self.path = os.path.join(directory, _PIXELS_FILE)
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.mode = meta["mode"]
+        self.channels = meta["channels"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.tile_size = meta["tile_size"]
+        self.format = meta.get("format")
+        self.tiles_x = -(-self.width // self.tile_size)
+        self.tiles_y = -(-self.height // self.tile_size)
+        self.budget = OUT_OF_CORE_BUDGET
+        self.previews = {}
+
+    @classmethod
+    def create(cls, width, height, channels, dtype=np.uint8, mode=None, directory=None,
+               tile_size=TILE_SIZE, **extra):
+        """
+        Создаёт пустое хранилище.
+        :param mode: Режим PIL для uint8 или None (например, для плоскостей float32)
+        :param directory: Каталог; по умолчанию - временный, удаляется вместе с объектом
+        :param extra: Дополнительные поля meta.json
+        """
+        temporary = directory is None
+        if temporary:
+            os.makedirs(TILED_STORE_DIR, exist_ok=True)
+            directory = tempfile.mkdtemp(prefix="session-", dir=TILED_STORE_DIR)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        tiles_x, tiles_y = -(-width // tile_size), -(-height // tile_size)
+        nbytes = tiles_x * tiles_y * tile_size * tile_size * channels * np.dtype(dtype).itemsize
+        with open(os.path.join(directory, _PIXELS_FILE), "wb") as pixels_file:
+            # Файл создаётся разреженным, место занимают только записанные плитки
+            pixels_file.truncate(nbytes)
+
+        meta = {
+            "version": STORE_FORMAT_VERSION,
+            "width": width,
+            "height": height,
+            "mode": mode,
+            "channels": channels,
+            "dtype": np.dtype(dtype).name,
+            "tile_size": tile_size,
+            "complete": temporary,
+            **extra,
+        }
+        with open(os.path.join(directory, _META_FILE), "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+        store = cls(directory)
+        if temporary:
+            weakref.finalize(store, shutil.rmtree, directory, True)
+        return store
+
+    @classmethod
+    def from_file(cls, file_path, cache_dir=TILED_STORE_DIR):
+        """
+        Открывает хранилище для файла изображения, при первом открытии декодирует его.
+        Хранилище остаётся на диске и используется повторно, пока файл не изменится;
+        давно не использованные хранилища удаляются (prune_cache).
+        """
+        stat = os.stat(file_path)
+        key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{STORE_FORMAT_VERSION}|{TILE_SIZE}"
+        directory = os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:20])
+
+        prune_cache(cache_dir, keep=(directory,))
+        meta_path = os.path.join(directory, _META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as meta_file:
+                complete = json.load(meta_file).get("complete")
+            if complete:
+                # Время изменения meta.json - время последнего использования для prune_cache
+                os.utime(meta_path)
+                return cls(directory)
+
+        with open_unlimited(file_path) as header:
+            width, height = header.size
+            image_format = header.format
+            mode = header.mode if header.mode in STORE_MODES else (
+                "RGBA" if "A" in header.getbands() else "RGB")
+
+        store = cls.create(width, height, STORE_MODES[mode], mode=mode, directory=directory,
+                           format=image_format, source=os.path.abspath(file_path))
+        for top, band in _decode_bands(file_path):
+            if band.mode != mode:
+                band = band.convert(mode)
+            store.write_region(0, top, np.asarray(band))
+        store.mark_complete()
+        return store
+
+    def mark_complete(self):
+        """Отмечает, что хранилище полностью записано и его можно использовать повторно"""
+        self.meta["complete"] = True
+        with open(os.path.join(self.directory, _META_FILE), "w", encoding="utf-8") as meta_file:
+            json.dump(self.meta, meta_file, indent=2)
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def loaded(self):
+        return True
+
+    def get(self):
+        """Совместимость с LazyImage: хранилище и есть изображение полного разрешения"""
+        return self
+
+    def _rows(self, first, last, writable=False):
+        """Отображает в память ряды плиток [first, last)"""
+        tile_bytes = self.tile_size * self.tile_size * self.channels * self.dtype.itemsize
+        return np.memmap(
+            self.path, dtype=self.dtype, mode="r+" if writable else "r",
+            offset=first * self.tiles_x * tile_bytes,
+            shape=(last - first, self.tiles_x, self.tile_size, self.tile_size, self.channels),
+        )
+
+    def read_region(self, box):
+        """
+        Читает прямоугольник (left, top, right, bottom) в массив (H, W, C).
+        """
+        left, top, right, bottom = box
+        size = self.tile_size
+        first_y, last_y = top // size, -(-bottom // size)
+        first_x, last_x = left // size, -(-right // size)
+        rows = self._rows(first_y, last_y)
+        block = np.ascontiguousarray(rows[:, first_x:last_x].transpose(0, 2, 1, 3, 4))
+        del rows
+        block = block.reshape((last_y - first_y) * size, (last_x - first_x) * size, self.channels)
+        return block[top - first_y * size:bottom - first_y * size, left - first_x * size:right - first_x * size]
+
+    def write_region(self, left, top, array):
+        """Записывает массив (H, W) или (H, W, C) в хранилище начиная с (left, top)"""
+        array = _as3d(array)
+        right, bottom = left + array.shape[1], top + array.shape[0]
+        size = self.tile_size
+        first_y, last_y = top // size, -(-bottom // size)
+        first_x, last_x = left // size, -(-right // size)
+        rows = self._rows(first_y, last_y, writable=True)
+        for tile_y in range(first_y, last_y):
+            y0, y1 = max(top, tile_y * size), min(bottom, (tile_y + 1) * size)
+            for tile_x in range(first_x, last_x):
+                x0, x1 = max(left, tile_x * size), min(right, (tile_x + 1) * size)
+                rows[tile_y - first_y, tile_x, y0 - tile_y * size:y1 - tile_y * size,
+                     x0 - tile_x * size:x1 - tile_x * size] = array[y0 - top:y1 - top, x0 - left:x1 - left]
+        rows.flush()
+        del rows
+
+    def work_boxes(self, halo=0):
+        """
+        Прямоугольники для обработки по частям: не больше одного ряда плиток
+        и столько плиток, сколько помещается в self.budget вместе с полосой halo.
+        """
+        size = self.tile_size
+        tile_cost = (size + 2 * halo) ** 2 * self.channels * _WORK_FACTOR
+        columns = max(1, self.budget // tile_cost)
+        for tile_y in range(self.tiles_y):
+            for tile_x in range(0, self.tiles_x, columns):
+                yield (
+                    tile_x * size,
+                    tile_y * size,
+                    min(self.width, (tile_x + columns) * size),
+                    min(self.height, (tile_y + 1) * size),
+                )
+
+    def map(self, func, halo=0, channels=None, dtype=None, mode=None):
+        """
+        Применяет func по частям и записывает результат в новое (временное) хранилище.
+        :param func: Функция массива (H, W) или (H, W, C) -> массив того же размера
+        :param halo: Сколько соседних пикселей нужно func для точного результата;
+                     части читаются с этим перекрытием, поэтому швов нет
+        :param channels: Число каналов результата (по умолчанию как у исходного)
+        :param dtype: Тип результата (по умолчанию как у исходного)
+        :param mode: Режим PIL результата (по умолчанию как у исходного при тех же каналах)
+        """
+        channels = channels or self.channels
+        if mode is None and channels == self.channels and dtype is None:
+            mode = self.mode
+        out = TiledStore.create(self.width, self.height, channels, dtype or self.dtype, mode=mode,
+                                tile_size=self.tile_size)
+        out.budget = self.budget
+        for left, top, right, bottom in self.work_boxes(halo):
+            outer = (max(0, left - halo), max(0, top - halo),
+                     min(self.width, right + halo), min(self.height, bottom + halo))
+            result = _as3d(func(_squeeze(self.read_region(outer))))
+            out.write_region(left, top, result[top - outer[1]:bottom - outer[1], left - outer[0]:right - outer[0]])
+        return out
+
+    def histogram(self):
+        """Гистограммы каналов uint8 на 256 значений, по частям"""
+        counts = np.zeros((self.channels, 256), dtype=np.int64)
+        for box in self.work_boxes():
+            region = self.read_region(box)
+            for channel in range(self.channels):
+                counts[channel] += np.bincount(region[:, :, channel].ravel(), minlength=256)
+        return counts
+
+    def reduce(self, factor):
+        """
+        Уменьшает изображение в factor раз усреднением блоков, как Image.reduce.
+        :return: Изображение PIL, если результат помещается в self.budget, иначе TiledStore
+        """
+        width, height = -(-self.width // factor), -(-self.height // factor)
+        if width * height * self.channels * _WORK_FACTOR <= self.budget:
+            out = None
+            result = np.empty((height, width, self.channels), dtype=np.uint8)
+        else:
+            out = TiledStore.create(width, height, self.channels, mode=self.mode, tile_size=self.tile_size)
+            out.budget = self.budget
+
+        # Полосы кратны factor, поэтому блоки не пересекают их границы
+        band = factor * max(1, self.tile_size // factor)
+        columns = max(factor, (self.budget // (band * self.channels * _WORK_FACTOR)) // factor * factor)
+        for top in range(0, self.height, band):
+            for left in range(0, self.width, columns):
+                region = self.read_region((left, top, min(self.width, left + columns), min(self.height, top + band)))
+                reduced = _as3d(np.asarray(Image.fromarray(_squeeze(region), self.mode).reduce(factor)))
+                if out is None:
+                    result[top // factor:top // factor + reduced.shape[0],
+                           left // factor:left // factor + reduced.shape[1]] = reduced
+                else:
+                    out.write_region(left // factor, top // factor, reduced)
+        if out is None:
+            return Image.fromarray(_squeeze(result), self.mode)
+        return out
+
+    def preview(self, size):
+        """Изображение PIL, уменьшенное до size (один раз на размер)"""
+        if size not in self.previews:
+            factor = max(1, min(self.width // size[0], self.height // size[1]))
+            reduced = self.reduce(factor)
+            if isinstance(reduced, TiledStore):
+                # Уменьшенное меньше чем вдвое больше size - его можно прочитать целиком
+                reduced = reduced.crop((0, 0) + reduced.size)
+            self.previews[size] = reduced.resize(size, Image.Resampling.LANCZOS)
+        return self.previews[size]
+
+    def crop(self, box):
+        """Часть изображения в виде изображения PIL"""
+        left, top, right, bottom = box
+        region = self.read_region((max(0, left), max(0, top), min(self.width, right), min(self.height, bottom)))
+        return Image.fromarray(_squeeze(region), self.mode)
+
+    def sample(self, xs, ys):
+        """
+        Значения пикселей в точках (xs[i], ys[i]); отображается только по одному ряду плиток.
+        :return: Массив (N, C)
+        """
+        size = self.tile_size
+        out = np.empty((len(xs), self.channels), dtype=self.dtype)
+        tile_rows = ys // size
+        for tile_y in np.unique(tile_rows):
+            index = np.nonzero(tile_rows == tile_y)[0]
+            rows = self._rows(tile_y, tile_y + 1)
+            out[index] = rows[0, xs[index] // size, ys[index] % size, xs[index] % size]
+            del rows
+        return out
+
+    def getpixel(self, position):
+        """Значение пикселя, как Image.getpixel"""
+        x, y = position
+        value = self.read_region((x, y, x + 1, y + 1))[0, 0]
+        return int(value[0]) if self.channels == 1 else tuple(int(v) for v in value)
+
+
+def enhance_store(store, brightness, contrast, color, sharpness, mode):
+    """
+    Яркость, контраст, насыщенность, резкость и смена режима для хранилища на диске.
+    Результат совпадает с fused_enhance для того же изображения в памяти.
+    :return: Новое временное TiledStore
+    """
+    color_channels = 1 if store.mode == "L" else 3
+    histograms = None
+    if contrast != 1.0:
+        # Среднее для контраста считается по всему изображению - отдельным проходом
+        histograms = list(store.histogram()[:color_channels].astype(np.float64))
+    stages = [func for _, _, func in enhance_stages(brightness, contrast, color, sharpness, mode, histograms)
+              if func is not None]
+
+    out_mode = mode if mode in STORE_MODES else store.mode
+
+    def process(array):
+        alpha = None
+        if store.mode == "RGBA":
+            array, alpha = array[:, :, :3], array[:, :, 3]
+        for func in stages:
+            array = func(array)
+        if out_mode == "L":
+            return array
+        if array.ndim == 2:
+            array = np.dstack([array] * 3)
+        if out_mode == "RGBA":
+            return np.dstack([array, alpha if alpha is not None else np.full(array.shape[:2], 255, np.uint8)])
+        return array
+
+    # Резкости нужен один соседний пиксель; крайние пиксели изображения
+    # остаются краевыми и у частей
+    return store.map(process, halo=1 if sharpness != 1.0 else 0,
+                     channels=STORE_MODES[out_mode], mode=out_mode)